@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     County, InfrastructureService, AgricultureSales,
-    CountyEconomy, CountyDemographics, UserTablePermission, AIPromptConfig
+    CountyEconomy, CountyDemographics, UserTablePermission, AIPromptConfig, AIAnswerCache,
+    ImportManifest, InterruptedQuery, TableVersion
 )
 
 admin.site.register(County)
@@ -19,3 +20,34 @@ class AIPromptConfigAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(AIAnswerCache)
+class AIAnswerCacheAdmin(admin.ModelAdmin):
+    list_display = ['question', 'hit_count', 'created_at', 'last_used_at']
+    search_fields = ['question']
+
+
+@admin.register(ImportManifest)
+class ImportManifestAdmin(admin.ModelAdmin):
+    list_display = ['table_name', 'row_count', 'file_hash', 'imported_at']
+
+
+@admin.register(InterruptedQuery)
+class InterruptedQueryAdmin(admin.ModelAdmin):
+    list_display = ['sql', 'user', 'role', 'reason', 'elapsed_ms', 'steps', 'estimated_cost', 'created_at']
+    list_filter = ['role', 'reason', 'preview']
+    search_fields = ['sql']
+
+
+@admin.register(TableVersion)
+class TableVersionAdmin(admin.ModelAdmin):
+    """只读：版本号由 core.table_versions 维护"""
+    list_display = ['table_name', 'version', 'modified_at', 'source']
+    list_filter = ['source']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,110 @@
+"""
+AI 答案缓存：相同的问题在相同的 Prompt 配置和模型下直接返回上次生成的 (SQL, 解释)
+
+- 缓存键 = 规范化问题文本 + Prompt 指纹（table_schema、system_prompt、
+  user_prompt_template 与模型名的哈希），修改 Prompt 后旧答案自动失效；
+- 条目保存在数据库（AIAnswerCache），超过 AI_ANSWER_CACHE_TTL 秒视为过期，
+  条目数超过 AI_ANSWER_CACHE_MAX_ENTRIES 时按最近使用时间淘汰；
+- 命中 / 未命中次数记在 Django 缓存中，供管理页面展示（默认的 LocMem 后端下是当前进程的计数）。
+"""
+import hashlib
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core.models import AIAnswerCache
+
+AI_ANSWER_CACHE_TTL = getattr(settings, "AI_ANSWER_CACHE_TTL", 7 * 24 * 3600)
+AI_ANSWER_CACHE_MAX_ENTRIES = getattr(settings, "AI_ANSWER_CACHE_MAX_ENTRIES", 5000)
+
+METRIC_HITS = "ai_answer_cache:hits"
+METRIC_MISSES = "ai_answer_cache:misses"
+
+TRAILING_PUNCTUATION = "?？。.!！;；"
+
+
+def normalize_question(question: str):
+    """规范化问题：合并空白、统一小写、去掉末尾标点"""
+    text = re.sub(r"\s+", " ", question).strip().lower()
+    return text.rstrip(TRAILING_PUNCTUATION).strip()
+
+
+def prompt_fingerprint(prompt_config, model):
+    """Prompt 配置与模型名的指纹"""
+    digest = hashlib.sha256()
+    for part in (prompt_config['table_schema'], prompt_config['system_prompt'],
+                 prompt_config['user_prompt_template'], model or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def answer_cache_key(question, fingerprint):
+    return hashlib.sha256(f"{fingerprint}\0{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+
+def _incr(metric):
+    try:
+        cache.incr(metric)
+    except ValueError:
+        cache.set(metric, 1, None)
+
+
+def get_cached_answer(question, fingerprint):
+    """查询缓存，命中返回 (sql, explanation)，否则返回 None"""
+    key = answer_cache_key(question, fingerprint)
+    entry = AIAnswerCache.objects.filter(cache_key=key).first()
+    now = timezone.now()
+    if entry is None or entry.created_at < now - timedelta(seconds=AI_ANSWER_CACHE_TTL):
+        if entry is not None:
+            entry.delete()
+        _incr(METRIC_MISSES)
+        return None
+
+    AIAnswerCache.objects.filter(pk=entry.pk).update(hit_count=F("hit_count") + 1, last_used_at=now)
+    _incr(METRIC_HITS)
+    return entry.sql, entry.explanation
+
+
+def store_answer(question, fingerprint, sql, explanation):
+    """保存答案，并在条目过多时淘汰最久未使用的条目"""
+    key = answer_cache_key(question, fingerprint)
+    now = timezone.now()
+    AIAnswerCache.objects.update_or_create(
+        cache_key=key,
+        defaults={
+            'fingerprint': fingerprint,
+            'question': question,
+            'sql': sql,
+            'explanation': explanation,
+            'hit_count': 0,
+            'created_at': now,
+            'last_used_at': now,
+        }
+    )
+    stale = AIAnswerCache.objects.order_by("-last_used_at").values_list("pk", flat=True)[AI_ANSWER_CACHE_MAX_ENTRIES:]
+    stale_ids = list(stale)
+    if stale_ids:
+        AIAnswerCache.objects.filter(pk__in=stale_ids).delete()
+
+
+def purge_answers(keep_fingerprint=None):
+    """删除缓存条目；传入 keep_fingerprint 时只保留该指纹下的条目"""
+    entries = AIAnswerCache.objects.all()
+    if keep_fingerprint:
+        entries = entries.exclude(fingerprint=keep_fingerprint)
+    entries.delete()
+
+
+def answer_cache_stats():
+    """缓存统计信息（用于管理页面）"""
+    return {
+        'entries': AIAnswerCache.objects.count(),
+        'total_hits': AIAnswerCache.objects.aggregate(s=Sum("hit_count"))["s"] or 0,
+        'hits': cache.get(METRIC_HITS, 0),
+        'misses': cache.get(METRIC_MISSES, 0),
+    }
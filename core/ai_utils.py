@@ -1,4 +1,6 @@
 import os
+import threading
+from string import Formatter
 from django.conf import settings
 
 # 尝试导入新版本OpenAI（1.0+）
@@ -24,6 +26,14 @@ AI_API_KEY = getattr(settings, 'AI_API_KEY', os.getenv('AI_API_KEY') or os.geten
 AI_API_BASE = getattr(settings, 'AI_API_BASE', None)  # 如果为None，使用默认值
 AI_MODEL = getattr(settings, 'AI_MODEL', None)  # 如果为None，使用默认值
 
+# 连接配置：超时（秒）、重试次数、keep-alive 连接池
+AI_TIMEOUT = getattr(settings, 'AI_TIMEOUT', 60.0)
+AI_CONNECT_TIMEOUT = getattr(settings, 'AI_CONNECT_TIMEOUT', 10.0)
+AI_MAX_RETRIES = getattr(settings, 'AI_MAX_RETRIES', 2)
+AI_MAX_CONNECTIONS = getattr(settings, 'AI_MAX_CONNECTIONS', 20)
+AI_MAX_KEEPALIVE_CONNECTIONS = getattr(settings, 'AI_MAX_KEEPALIVE_CONNECTIONS', 10)
+AI_KEEPALIVE_EXPIRY = getattr(settings, 'AI_KEEPALIVE_EXPIRY', 60.0)
+
 def get_ai_config():
     """获取AI配置"""
     service_type = AI_SERVICE_TYPE
@@ -51,8 +61,121 @@ def get_ai_config():
         'model': model
     }
 
+# ================================
+# 进程级 AI 客户端（复用 HTTPS 连接池）
+# ================================
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ai_client(ai_config=None):
+    """
+    获取进程级共享的 OpenAI 客户端，按 (api_base, api_key, model) 懒加载，每组配置只创建一次。
+    底层 httpx 连接池保持 keep-alive，多个线程可以同时使用同一个客户端。
+    旧版本 OpenAI 库没有客户端对象，返回 None。
+    """
+    if not OPENAI_NEW_VERSION:
+        return None
+
+    ai_config = ai_config or get_ai_config()
+    key = (ai_config['api_base'], ai_config['api_key'], ai_config['model'])
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            client = OpenAI(
+                api_key=ai_config['api_key'],
+                base_url=ai_config['api_base'],
+                timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+                max_retries=AI_MAX_RETRIES,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=AI_MAX_CONNECTIONS,
+                        max_keepalive_connections=AI_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=AI_KEEPALIVE_EXPIRY,
+                    ),
+                ),
+            )
+            _clients[key] = client
+    return client
+
+
+# ================================
+# Prompt 配置的进程内缓存
+# ================================
+class CompiledPromptTemplate:
+    """
+    预编译的用户提示词模板：{table_schema} 在编译时替换好，
+    每次请求只需要把 {question} 填进去。
+    """
+
+    def __init__(self, template, table_schema):
+        self.parts = []  # 字符串片段，或 (conversion, format_spec) 表示 question 占位
+        for literal, field_name, format_spec, conversion in Formatter().parse(template):
+            if literal:
+                self.parts.append(literal)
+            if field_name is None:
+                continue
+            if field_name == 'question':
+                self.parts.append((conversion, format_spec))
+            else:
+                # 其余占位符与 str.format 行为一致：只认 table_schema，其他名字报 KeyError
+                placeholder = "{" + field_name
+                placeholder += f"!{conversion}" if conversion else ""
+                placeholder += f":{format_spec}" if format_spec else ""
+                self.parts.append((placeholder + "}").format(table_schema=table_schema))
+
+    def render(self, question):
+        rendered = []
+        for part in self.parts:
+            if isinstance(part, tuple):
+                conversion, format_spec = part
+                value = {'r': repr, 's': str, 'a': ascii}.get(conversion, lambda v: v)(question)
+                rendered.append(format(value, format_spec or ""))
+            else:
+                rendered.append(part)
+        return "".join(rendered)
+
+
+# (版本号, prompt 配置) —— 整体替换，多线程读取无需加锁
+_prompt_cache = (None, None)
+
+
 def get_prompt_config():
-    """从数据库获取prompt配置，如果不存在则使用默认值"""
+    """
+    获取 prompt 配置（进程内缓存）。
+    版本戳是数据库变更日志中 core_aipromptconfig 的版本号（不是 Django 缓存，LocMem 不跨进程）：
+    编辑 Prompt 保存时版本号升级，各个 worker 在下一次请求时发现版本变化才重新读取数据库；
+    读不到版本号时不使用缓存。
+    返回的字典中 'compiled_template' 为预编译的用户提示词模板。
+    """
+    global _prompt_cache
+    from core.table_versions import get_version
+
+    try:
+        version = get_version('core_aipromptconfig')
+    except Exception:
+        version = None
+
+    cached_version, cached_config = _prompt_cache
+    if cached_config is not None and version is not None and cached_version == version:
+        return cached_config
+
+    prompt_config, from_db = _load_prompt_config()
+    prompt_config['compiled_template'] = CompiledPromptTemplate(
+        prompt_config['user_prompt_template'], prompt_config['table_schema']
+    )
+    if from_db and version is not None:
+        _prompt_cache = (version, prompt_config)
+    return prompt_config
+
+
+def _load_prompt_config():
+    """从数据库获取prompt配置，如果不存在则使用默认值；返回 (配置, 是否来自数据库)"""
     try:
         from core.models import AIPromptConfig
         config = AIPromptConfig.get_config()
@@ -60,7 +183,7 @@ def get_prompt_config():
             'table_schema': config.table_schema,
             'system_prompt': config.system_prompt,
             'user_prompt_template': config.user_prompt_template,
-        }
+        }, True
     except Exception:
         # 如果数据库未迁移或出错，使用默认值
         return {
@@ -108,8 +231,16 @@ def get_prompt_config():
 - migrant_workers
 - social_security_rate
 
+6️⃣ core_countyyearpanel（县域年度面板，每个县每年一行，已连接好上面五张表，只读）:
+- county_id, year, name, province, city
+- pct_village_with_hard_road, pct_village_with_electricity, broadband_coverage, water_supply_coverage, sanitation_coverage
+- gdp_total, fiscal_revenue, per_capita_income
+- population_total, urbanization_rate, unemployment_rate, migrant_workers, social_security_rate
+- agri_sales_volume, agri_sales_value（该县该年所有农产品合计）, agri_product_count
+
 ⚠ 注意：
 - 所有表名必须使用 Django ORM 的真实表名，例如 core_county。
+- 同时涉及多张表指标的问题（如 GDP 与人口、宽带覆盖率的关系），优先直接查询 core_countyyearpanel，不要自己连接多张表。
 - SQLite 中不支持 ILIKE。
 - 不要写分号之外的多条 SQL。""",
             'system_prompt': "你是一个专业 SQL 帮助助手。",
@@ -131,7 +262,7 @@ SQL:
 
 Explanation:
 <自然语言说明>""",
-        }
+        }, False
 
 
 def ask_ai_sql(question: str):
@@ -148,19 +279,13 @@ def ask_ai_sql(question: str):
         return "", "AI API密钥未配置，请在settings.py或环境变量中设置AI_API_KEY"
 
     # 使用数据库中的prompt模板
-    user_prompt = prompt_config['user_prompt_template'].format(
-        table_schema=prompt_config['table_schema'],
-        question=question
-    )
+    user_prompt = prompt_config['compiled_template'].render(question)
 
     try:
         # 根据OpenAI版本选择不同的调用方式
         if OPENAI_NEW_VERSION:
-            # 新版本OpenAI API (1.0+)
-            client = OpenAI(
-                api_key=ai_config['api_key'],
-                base_url=ai_config['api_base']
-            )
+            # 新版本OpenAI API (1.0+)，复用进程级客户端
+            client = get_ai_client(ai_config)
             
             response = client.chat.completions.create(
                 model=ai_config['model'],
@@ -173,12 +298,13 @@ def ask_ai_sql(question: str):
             
             text = response.choices[0].message.content
         else:
-            # 旧版本OpenAI API (<1.0)
+            # 旧版本OpenAI API (<1.0)，按请求传入密钥和地址，不修改全局状态
             import openai
-            openai.api_key = ai_config['api_key']
-            openai.api_base = ai_config['api_base']
             
             response = openai.ChatCompletion.create(
+                api_key=ai_config['api_key'],
+                api_base=ai_config['api_base'],
+                request_timeout=(AI_CONNECT_TIMEOUT, AI_TIMEOUT),
                 model=ai_config['model'],
                 messages=[
                     {"role": "system", "content": prompt_config['system_prompt']},
@@ -190,26 +316,150 @@ def ask_ai_sql(question: str):
             text = response["choices"][0]["message"]["content"]
 
         # 解析 SQL 和 Explanation
-        sql = ""
-        explanation = ""
+        return parse_ai_response(text)
+    
+    except Exception as e:
+        return "", describe_ai_error(e)
 
-        if "SQL:" in text:
-            sql = text.split("SQL:")[1].split("Explanation:")[0].strip()
 
-        if "Explanation:" in text:
-            explanation = text.split("Explanation:")[1].strip()
+def parse_ai_response(text: str):
+    """从 AI 回复中解析 (SQL, Explanation)"""
+    sql = ""
+    explanation = ""
 
-        return sql, explanation
-    
+    if "SQL:" in text:
+        sql = text.split("SQL:")[1].split("Explanation:")[0].strip()
+
+    if "Explanation:" in text:
+        explanation = text.split("Explanation:")[1].strip()
+
+    return sql, explanation
+
+
+def describe_ai_error(e):
+    """把 AI 请求异常转换为友好的错误提示"""
+    error_msg = str(e)
+    # 提供更友好的错误提示
+    if "InvalidEndpointOrModel" in error_msg or "404" in error_msg or "does not exist" in error_msg:
+        return f"AI请求失败：模型或endpoint不存在。\n\n请检查：\n1. 在.env文件中设置正确的AI_MODEL（你的endpoint ID）\n2. 确认endpoint在火山方舟控制台中已创建并可用\n3. 检查API密钥是否有访问该endpoint的权限\n\n详细配置请参考：AI_CONFIG.md\n\n原始错误：{error_msg}"
+    elif "401" in error_msg or "Unauthorized" in error_msg or "Invalid API key" in error_msg:
+        return f"AI请求失败：API密钥无效或未授权。\n\n请检查：\n1. 在.env文件中设置正确的AI_API_KEY\n2. 确认API密钥是否有效\n3. 检查API密钥是否有足够的权限\n\n详细配置请参考：AI_CONFIG.md\n\n原始错误：{error_msg}"
+    else:
+        return f"AI请求失败：{error_msg}\n\n请检查API密钥和配置是否正确。详细配置请参考：AI_CONFIG.md"
+
+
+def ask_ai_sql_cached(question: str):
+    """
+    带答案缓存的 ask_ai_sql，返回 (sql, explanation, from_cache)。
+    只缓存成功生成 SQL 的答案；缓存不可用时退回直接请求 AI。
+    """
+    from core.ai_cache import get_cached_answer, prompt_fingerprint, store_answer
+
+    fingerprint = prompt_fingerprint(get_prompt_config(), get_ai_config()['model'])
+    try:
+        cached = get_cached_answer(question, fingerprint)
+    except Exception:
+        cached = None
+    if cached is not None:
+        sql, explanation = cached
+        return sql, explanation, True
+
+    sql, explanation = ask_ai_sql(question)
+    if sql:
+        try:
+            store_answer(question, fingerprint, sql, explanation)
+        except Exception:
+            pass
+    return sql, explanation, False
+
+
+def _iter_ai_tokens(ai_config, prompt_config, question):
+    """以 stream=True 调用 AI，逐个产出文本片段"""
+    messages = [
+        {"role": "system", "content": prompt_config['system_prompt']},
+        {"role": "user", "content": prompt_config['compiled_template'].render(question)},
+    ]
+    if OPENAI_NEW_VERSION:
+        client = get_ai_client(ai_config)
+        stream = client.chat.completions.create(
+            model=ai_config['model'],
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    else:
+        import openai
+        stream = openai.ChatCompletion.create(
+            api_key=ai_config['api_key'],
+            api_base=ai_config['api_base'],
+            request_timeout=(AI_CONNECT_TIMEOUT, AI_TIMEOUT),
+            model=ai_config['model'],
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+        )
+        for chunk in stream:
+            content = chunk["choices"][0]["delta"].get("content")
+            if content:
+                yield content
+
+
+def stream_ai_sql(question: str):
+    """
+    流式请求 AI 生成 SQL，逐个产出 (事件, 数据)：
+    - ("cached", True)：命中答案缓存（随后立即产出 sql 和 explanation）
+    - ("token", 文本片段)：模型新生成的内容
+    - ("sql", SQL)：SQL 段一旦完整（出现 Explanation:）就立即产出，只产出一次
+    - ("explanation", 说明)：回复结束后产出
+    - ("error", 错误信息)
+    """
+    from core.ai_cache import get_cached_answer, prompt_fingerprint, store_answer
+
+    ai_config = get_ai_config()
+    prompt_config = get_prompt_config()
+    fingerprint = prompt_fingerprint(prompt_config, ai_config['model'])
+
+    try:
+        cached = get_cached_answer(question, fingerprint)
+    except Exception:
+        cached = None
+    if cached is not None:
+        yield "cached", True
+        yield "sql", cached[0]
+        yield "explanation", cached[1]
+        return
+
+    if not ai_config['api_key']:
+        yield "error", "AI API密钥未配置，请在settings.py或环境变量中设置AI_API_KEY"
+        return
+
+    text = ""
+    sql_sent = False
+    try:
+        for token in _iter_ai_tokens(ai_config, prompt_config, question):
+            text += token
+            yield "token", token
+            if not sql_sent and "SQL:" in text and "Explanation:" in text.split("SQL:", 1)[1]:
+                sql, _ = parse_ai_response(text)
+                sql_sent = True
+                yield "sql", sql
     except Exception as e:
-        error_msg = str(e)
-        # 提供更友好的错误提示
-        if "InvalidEndpointOrModel" in error_msg or "404" in error_msg or "does not exist" in error_msg:
-            return "", f"AI请求失败：模型或endpoint不存在。\n\n请检查：\n1. 在.env文件中设置正确的AI_MODEL（你的endpoint ID）\n2. 确认endpoint在火山方舟控制台中已创建并可用\n3. 检查API密钥是否有访问该endpoint的权限\n\n详细配置请参考：AI_CONFIG.md\n\n原始错误：{error_msg}"
-        elif "401" in error_msg or "Unauthorized" in error_msg or "Invalid API key" in error_msg:
-            return "", f"AI请求失败：API密钥无效或未授权。\n\n请检查：\n1. 在.env文件中设置正确的AI_API_KEY\n2. 确认API密钥是否有效\n3. 检查API密钥是否有足够的权限\n\n详细配置请参考：AI_CONFIG.md\n\n原始错误：{error_msg}"
-        else:
-            return "", f"AI请求失败：{error_msg}\n\n请检查API密钥和配置是否正确。详细配置请参考：AI_CONFIG.md"
+        yield "error", describe_ai_error(e)
+        return
+
+    sql, explanation = parse_ai_response(text)
+    if not sql_sent:
+        yield "sql", sql
+    yield "explanation", explanation
+
+    if sql:
+        try:
+            store_answer(question, fingerprint, sql, explanation)
+        except Exception:
+            pass
 
 
 def get_full_prompt(question: str):
@@ -217,10 +467,7 @@ def get_full_prompt(question: str):
     prompt_config = get_prompt_config()
     return {
         'system_prompt': prompt_config['system_prompt'],
-        'user_prompt': prompt_config['user_prompt_template'].format(
-            table_schema=prompt_config['table_schema'],
-            question=question
-        ),
+        'user_prompt': prompt_config['compiled_template'].render(question),
         'table_schema': prompt_config['table_schema'],
     }
 
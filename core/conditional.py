@@ -0,0 +1,118 @@
+"""
+页面的 HTTP 条件请求（ETag / Last-Modified）
+
+列表页、首页和数据库详情页的内容只取决于：
+- 页面引用的数据表的版本号（见 core.table_versions）；
+- 当前用户的权限矩阵、用户名和 CSRF 令牌（页面上的按钮、表单随之变化）；
+- 请求的完整路径（分页游标等参数）和代码版本。
+把它们哈希成 ETag，浏览器带着 If-None-Match 再次访问且都没变时直接返回 304：
+只需要会话 / 用户两次查询和一次变更日志查询，不执行视图、不渲染模板。
+
+有待显示的 messages、非 GET / HEAD 请求、未登录用户不做条件处理。
+浏览器同时发送 If-None-Match 和 If-Modified-Since 时以 ETag 为准（权限变化只体现在 ETag 中）。
+"""
+import hashlib
+import json
+import uuid
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core.permissions import get_permission_matrix
+from core.table_versions import get_journal
+
+
+@lru_cache(maxsize=None)
+def page_etag_salt():
+    """
+    ETag 中的代码版本：settings.PAGE_ETAG_SALT（部署时的发布版本号，发布后旧 ETag 全部失效）。
+    未配置时在本进程第一次用到时生成一个随机值，进程重启（包括开发服务器改代码后的自动重启）即失效。
+    """
+    return getattr(settings, "PAGE_ETAG_SALT", None) or uuid.uuid4().hex
+
+
+def permission_fingerprint(user):
+    """用户身份与权限的指纹（权限矩阵来自缓存，通常不查数据库）"""
+    payload = json.dumps(
+        [user.pk, user.get_username(), user.is_superuser, get_permission_matrix(user)],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _conditional_allowed(request):
+    if request.method not in ("GET", "HEAD") or not request.user.is_authenticated:
+        return False
+    # 有待显示的提示消息时必须重新渲染（len 不会把消息标记为已读）
+    return len(messages.get_messages(request)) == 0
+
+
+def page_journal(request, tables):
+    """同一请求中 ETag、Last-Modified 和视图共用一次变更日志查询：{表名: (版本号, 修改时间)}"""
+    memo = getattr(request, "_page_journal", None)
+    if memo is None:
+        memo = request._page_journal = get_journal(tables)
+    return memo
+
+
+def page_etag(request, tables):
+    if not _conditional_allowed(request):
+        return None
+    versions = sorted((name, version) for name, (version, _) in page_journal(request, tables).items())
+    payload = json.dumps([
+        page_etag_salt(),
+        request.get_full_path(),
+        permission_fingerprint(request.user),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        versions,
+    ])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def page_last_modified(request, tables):
+    if not _conditional_allowed(request):
+        return None
+    times = [modified_at for _, modified_at in page_journal(request, tables).values() if modified_at]
+    if not times:
+        return None
+    # 变更日志中是本地时间（USE_TZ = False）
+    return timezone.make_aware(max(times), timezone.get_default_timezone())
+
+
+def conditional_page(tables):
+    """
+    视图装饰器：按 tables（模型或表名列表，或 request -> 列表的函数）生成 ETag / Last-Modified，
+    未变化时返回 304。响应带 Cache-Control: private, no-cache，浏览器每次都会来验证。
+    """
+    def resolve(request):
+        return tables(request) if callable(tables) else tables
+
+    def decorator(view_func):
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: page_etag(request, resolve(request)),
+            last_modified_func=lambda request, *args, **kwargs: page_last_modified(request, resolve(request)),
+        )(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+class ConditionalPageMixin:
+    """类视图版本：page_tables() 返回页面引用的表，GET 请求按 conditional_page 处理"""
+
+    def page_tables(self):
+        return []
+
+    def get(self, request, *args, **kwargs):
+        view = conditional_page(self.page_tables())(super().get)
+        return view(request, *args, **kwargs)
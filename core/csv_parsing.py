@@ -0,0 +1,73 @@
+"""
+CSV 解析（只依赖 pandas，不访问数据库）
+
+并行导入时这些函数在子进程中运行，因此本模块不能导入 Django 模型。
+"""
+import hashlib
+import time
+
+import pandas as pd
+
+# 业务键各列之间的分隔符
+KEY_SEPARATOR = "|"
+
+
+def iter_chunks(path, fields, dtypes, chunk_size, counties=None):
+    """
+    按块读取 CSV，每块产出 (行元组列表, 跳过行数)。
+    NaN / NA 统一转换为 None；第一列为空的行跳过；
+    传入 counties 时，第一列（county_id）不在其中的行也跳过。
+    """
+    reader = pd.read_csv(path, usecols=fields, dtype=dtypes, chunksize=chunk_size)
+    for df in reader:
+        df = df[fields].astype(object).where(df.notna(), None)
+        rows = list(zip(*(df[name].tolist() for name in fields)))
+        valid = [row for row in rows if row[0] is not None and (counties is None or row[0] in counties)]
+        yield valid, len(rows) - len(valid)
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """按块计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_hashed_chunks(path, fields, dtypes, key_fields, chunk_size, counties=None):
+    """
+    与 iter_chunks 相同，但额外向量化地计算每行的业务键字符串和内容哈希，
+    每块产出 (行元组列表, 业务键列表, 行哈希列表, 跳过行数)。
+    """
+    reader = pd.read_csv(path, usecols=fields, dtype=dtypes, chunksize=chunk_size)
+    for df in reader:
+        df = df[fields]
+        total = len(df)
+        mask = df[fields[0]].notna()
+        if counties is not None:
+            mask &= df[fields[0]].isin(counties)
+        df = df[mask]
+
+        key_columns = [df[name].astype(object).where(df[name].notna(), "<NA>").astype(str) for name in key_fields]
+        keys = key_columns[0].str.cat(key_columns[1:], sep=KEY_SEPARATOR) if len(key_columns) > 1 else key_columns[0]
+        hashes = pd.util.hash_pandas_object(df, index=False)
+
+        df = df.astype(object).where(df.notna(), None)
+        rows = list(zip(*(df[name].tolist() for name in fields)))
+        yield rows, keys.tolist(), [format(h, "016x") for h in hashes.tolist()], total - len(rows)
+
+
+def parse_to_queue(key, path, fields, dtypes, chunk_size, counties, queue):
+    """
+    子进程任务：解析并校验一个 CSV，把每块结果放入队列交给写入进程。
+    队列消息为 (key, rows, skipped)；结束时发送 (key, None, 解析用时或异常信息)。
+    """
+    started = time.perf_counter()
+    try:
+        for rows, skipped in iter_chunks(path, fields, dtypes, chunk_size, counties):
+            queue.put((key, rows, skipped))
+    except Exception as e:
+        queue.put((key, None, e))
+        return
+    queue.put((key, None, time.perf_counter() - started))
@@ -0,0 +1,48 @@
+"""
+用户 SQL 的读写分离
+
+首页、SQL 控制台和智能查询中的只读语句走只读别名（settings.READONLY_DB_ALIAS，
+以 mode=ro 打开并设置 PRAGMA query_only），不与录入表单的写入争用 default 连接；
+只有通过编辑权限检查的写语句才会在 default 上执行。
+即使 AI 生成了漏网的写语句，只读连接也会直接拒绝（attempt to write a readonly database）。
+
+ORM（表单、列表页、导入）仍然全部使用 default：同一事务中的读写必须在同一连接上。
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.permissions import has_edit_operation
+
+READONLY_DB_ALIAS = getattr(settings, "READONLY_DB_ALIAS", "readonly")
+
+
+def readonly_alias():
+    """只读别名；未配置时回退到 default"""
+    return READONLY_DB_ALIAS if READONLY_DB_ALIAS in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def alias_for_sql(query):
+    """用户 SQL 使用的数据库别名：写语句走 default，其余走只读别名"""
+    return DEFAULT_DB_ALIAS if has_edit_operation(query) else readonly_alias()
+
+
+def connection_for_sql(query):
+    return connections[alias_for_sql(query)]
+
+
+class ReadOnlyRouter:
+    """只读别名不接受 ORM 写入，也不参与迁移（表结构由 default 建立）"""
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == READONLY_DB_ALIAS:
+            return False
+        return None
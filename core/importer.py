@@ -0,0 +1,404 @@
+"""
+CSV 批量导入
+
+按块读取 CSV（pd.read_csv 的 chunksize + 显式 dtype / usecols），每块向量化地转换为元组后
+用 INSERT ... ON CONFLICT DO UPDATE 批量写入，每块一个事务。
+内存占用只与块大小有关，与文件大小无关。
+
+load_all_parallel 先导入 County，再在进程池中并行解析四张事实表，
+解析好的块经有界队列汇总到当前进程，由唯一的一个 SQLite 连接依次写入。
+data/load_data.py 和 manage.py import_csv 都基于这里的函数。
+"""
+import multiprocessing
+import os
+import queue as queue_module
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import models, transaction
+
+from django.db.models import Q
+
+from core.models import (
+    County, InfrastructureService, AgricultureSales,
+    CountyEconomy, CountyDemographics, ImportManifest, ImportRowHash
+)
+from core.csv_parsing import KEY_SEPARATOR, file_sha256, iter_chunks, iter_hashed_chunks, parse_to_queue
+from core.panel import deferred_refresh, refresh_for_rows
+from core.table_versions import bump_versions
+
+# 每块读取 / 每个事务写入的行数
+CHUNK_SIZE = 5000
+
+
+# ---------------------------
+# 每张表的导入配置
+# ---------------------------
+class TableSpec:
+    def __init__(self, model, filename, fields, key_fields):
+        self.model = model
+        self.filename = filename
+        self.fields = fields            # CSV 中要读取的列（即模型字段的 attname）
+        self.key_fields = key_fields    # 业务键，对应表上的唯一约束
+
+    @property
+    def update_fields(self):
+        return [f for f in self.fields if f not in self.key_fields]
+
+    def field(self, attname):
+        return next(f for f in self.model._meta.concrete_fields if f.attname == attname)
+
+    @property
+    def unique_fields(self):
+        # bulk_create 的 unique_fields 使用字段名（county 而不是 county_id）
+        return [self.field(name).name for name in self.key_fields]
+
+    def dtypes(self):
+        """根据模型字段类型推导 read_csv 的 dtype"""
+        dtypes = {}
+        for name in self.fields:
+            field = self.field(name)
+            if isinstance(field, (models.ForeignKey, models.IntegerField, models.AutoField)):
+                dtypes[name] = "Int64"
+            elif isinstance(field, (models.DecimalField, models.FloatField)):
+                dtypes[name] = "float64"
+            else:
+                dtypes[name] = "string"
+        return dtypes
+
+
+TABLE_SPECS = {
+    'county': TableSpec(
+        County, "county_202511201906.csv",
+        fields=["county_id", "name", "province", "city"],
+        key_fields=["county_id"],
+    ),
+    'infra': TableSpec(
+        InfrastructureService, "infrastructureservice_202511201905.csv",
+        fields=[
+            "county_id", "year",
+            "pct_village_with_hard_road", "pct_village_with_electricity",
+            "broadband_coverage", "water_supply_coverage", "sanitation_coverage",
+        ],
+        key_fields=["county_id", "year"],
+    ),
+    'agri': TableSpec(
+        AgricultureSales, "agriculturesales_202511201906.csv",
+        fields=["county_id", "year", "product_type", "sales_volume", "sales_value"],
+        key_fields=["county_id", "year", "product_type"],
+    ),
+    'economy': TableSpec(
+        CountyEconomy, "countyeconomy_202511201906.csv",
+        fields=["county_id", "year", "gdp_total", "fiscal_revenue", "per_capita_income"],
+        key_fields=["county_id", "year"],
+    ),
+    'demo': TableSpec(
+        CountyDemographics, "countydemographics_202511201906.csv",
+        fields=[
+            "county_id", "year",
+            "population_total", "urbanization_rate", "unemployment_rate",
+            "migrant_workers", "social_security_rate",
+        ],
+        key_fields=["county_id", "year"],
+    ),
+}
+
+
+# ---------------------------
+# 读取与写入
+# ---------------------------
+def county_id_map():
+    """一次查询取出全部县域主键，用于在内存中校验外键"""
+    return set(County.objects.values_list("county_id", flat=True))
+
+
+def bulk_upsert(spec, rows):
+    """
+    把一块行元组以 INSERT ... ON CONFLICT DO UPDATE 写入，并刷新面板中对应的行，一个事务。
+    在 deferred_refresh 中调用时（load_table 等整表导入）只记下键，导入结束后统一刷新一次。
+    """
+    model = spec.model
+    objs = [model(**dict(zip(spec.fields, row))) for row in rows]
+    key_index = [spec.fields.index(name) for name in spec.key_fields]
+    null_keys = {key for key in (tuple(row[i] for i in key_index) for row in rows) if None in key}
+    # 删除旧行触发的刷新与本块的刷新合并为一次
+    with transaction.atomic(), deferred_refresh():
+        if null_keys:
+            # 业务键含 NULL 的行不会触发 ON CONFLICT：同一事务中先删除这些键的旧行再插入，
+            # 导入失败时旧行随事务回滚保留
+            _delete_keys(spec, [dict(zip(spec.key_fields, key)) for key in null_keys])
+        model.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=spec.unique_fields,
+            update_fields=spec.update_fields,
+        )
+        refresh_for_rows(model, spec.fields, rows)
+    return len(objs)
+
+
+@deferred_refresh(flush_on_error=True)
+def load_table(key, data_dir="data", chunk_size=CHUNK_SIZE, counties=None, progress=None):
+    """
+    流式导入一张表，返回 (写入行数, 跳过行数, 用时秒数)。
+    progress(label, written, skipped, elapsed) 在每块写入后调用。
+    """
+    spec = TABLE_SPECS[key]
+    path = os.path.join(data_dir, spec.filename)
+    started = time.perf_counter()
+
+    check_county = spec.model is not County
+    if check_county and counties is None:
+        counties = county_id_map()
+
+    written = skipped = 0
+    for rows, chunk_skipped in iter_chunks(path, spec.fields, spec.dtypes(), chunk_size,
+                                           counties if check_county else None):
+        skipped += chunk_skipped
+        if rows:
+            written += bulk_upsert(spec, rows)
+        if progress:
+            progress(spec.model.__name__, written, skipped, time.perf_counter() - started)
+
+    bump_versions(spec.model, source="import")
+    reset_manifest(key)
+    return written, skipped, time.perf_counter() - started
+
+
+def report(label, written, skipped, elapsed):
+    rate = written / elapsed if elapsed > 0 else 0
+    message = f"{label} 导入完成，共 {written} 条记录，用时 {elapsed:.2f} 秒（{rate:,.0f} 行/秒）"
+    if skipped:
+        message += f"，跳过 {skipped} 条无效或县域不存在的记录"
+    print(message + ".")
+
+
+# ---------------------------
+# 增量导入
+# ---------------------------
+def reset_manifest(key):
+    """全量导入后清除增量清单，下一次增量导入会重新比对所有行"""
+    with transaction.atomic():
+        ImportManifest.objects.filter(table_name=key).delete()
+        ImportRowHash.objects.filter(table_name=key).delete()
+
+
+def _key_values(spec, row_key):
+    """把业务键字符串还原为 {字段: 值}"""
+    values = {}
+    parts = row_key.split(KEY_SEPARATOR, len(spec.key_fields) - 1)
+    for name, part in zip(spec.key_fields, parts):
+        if part == "<NA>":
+            values[name] = None
+        elif isinstance(spec.field(name), (models.ForeignKey, models.IntegerField, models.AutoField)):
+            values[name] = int(part)
+        else:
+            values[name] = part
+    return values
+
+
+def _delete_keys(spec, keys, batch_size=200):
+    """
+    按业务键删除数据行；keys 为 {字段: 值} 列表，值为 None 的字段按 IS NULL 匹配。
+    所有批次的面板刷新合并为一次（调用方负责事务）。
+    """
+    deleted = 0
+    with deferred_refresh():
+        for start in range(0, len(keys), batch_size):
+            condition = Q()
+            for values in keys[start:start + batch_size]:
+                condition |= Q(**{
+                    f"{name}__isnull" if value is None else name: True if value is None else value
+                    for name, value in values.items()
+                })
+            deleted += spec.model.objects.filter(condition).delete()[1].get(spec.model._meta.label, 0)
+    return deleted
+
+
+def _delete_by_keys(spec, row_keys):
+    """按业务键字符串删除数据行"""
+    return _delete_keys(spec, [_key_values(spec, row_key) for row_key in row_keys])
+
+
+@deferred_refresh(flush_on_error=True)
+def load_table_incremental(key, data_dir="data", chunk_size=CHUNK_SIZE, counties=None, progress=None, force=False):
+    """
+    增量导入一张表，只写入变化的部分。返回 {inserted, updated, deleted, unchanged, skipped, elapsed, file_skipped}。
+    - 文件内容哈希与上次导入相同：整个文件跳过（force=True 时仍逐行比较）；
+    - 否则逐行比较业务键和内容哈希，只写入新增 / 修改的行，删除 CSV 中已不存在的行
+      （只删除由导入产生的行；County 不做删除，以免级联删除事实表数据）。
+    """
+    spec = TABLE_SPECS[key]
+    path = os.path.join(data_dir, spec.filename)
+    started = time.perf_counter()
+    result = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0, 'file_skipped': False}
+
+    file_hash = file_sha256(path)
+    manifest = ImportManifest.objects.filter(table_name=key).first()
+    if manifest and manifest.file_hash == file_hash and not force:
+        result['file_skipped'] = True
+        result['unchanged'] = manifest.row_count
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    check_county = spec.model is not County
+    if check_county and counties is None:
+        counties = county_id_map()
+
+    previous = dict(ImportRowHash.objects.filter(table_name=key).values_list("row_key", "row_hash"))
+    seen = set()
+
+    for rows, row_keys, row_hashes, skipped in iter_hashed_chunks(
+            path, spec.fields, spec.dtypes(), spec.key_fields, chunk_size, counties if check_county else None):
+        result['skipped'] += skipped
+        changed_rows = []
+        changed_hashes = []
+        for row, row_key, row_hash in zip(rows, row_keys, row_hashes):
+            seen.add(row_key)
+            old_hash = previous.get(row_key)
+            if old_hash == row_hash:
+                result['unchanged'] += 1
+                continue
+            result['inserted' if old_hash is None else 'updated'] += 1
+            changed_rows.append(row)
+            changed_hashes.append(ImportRowHash(table_name=key, row_key=row_key, row_hash=row_hash))
+
+        if changed_rows:
+            # 业务键含 NULL 的旧行由 bulk_upsert 先删除再插入（不论清单中是否见过）
+            with transaction.atomic():
+                bulk_upsert(spec, changed_rows)
+                ImportRowHash.objects.bulk_create(
+                    changed_hashes, update_conflicts=True,
+                    unique_fields=["table_name", "row_key"], update_fields=["row_hash"],
+                )
+        if progress:
+            progress(spec.model.__name__, result['inserted'] + result['updated'], result['skipped'],
+                     time.perf_counter() - started)
+
+    removed = [row_key for row_key in previous if row_key not in seen]
+    with transaction.atomic():
+        if removed and spec.model is not County:
+            result['deleted'] = _delete_by_keys(spec, removed)
+        for start in range(0, len(removed), 500):
+            ImportRowHash.objects.filter(table_name=key, row_key__in=removed[start:start + 500]).delete()
+        ImportManifest.objects.update_or_create(
+            table_name=key,
+            defaults={'file_path': path, 'file_hash': file_hash, 'row_count': len(seen)},
+        )
+
+    if result['inserted'] or result['updated'] or result['deleted']:
+        bump_versions(spec.model, source="import")
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def load_all_incremental(data_dir="data", chunk_size=CHUNK_SIZE, progress=None, log=print):
+    """按 County -> 事实表的顺序增量导入全部表，返回 {表: 结果}"""
+    results = {}
+    counties = None
+    for key in TABLE_SPECS:
+        if key != 'county' and counties is None:
+            counties = county_id_map()
+        # 新增了县域时，事实表中之前因县域不存在而跳过的行需要重新比对
+        force = key != 'county' and results['county']['inserted'] > 0
+        result = load_table_incremental(key, data_dir, chunk_size=chunk_size, counties=counties,
+                                        progress=progress, force=force)
+        results[key] = result
+        name = TABLE_SPECS[key].model.__name__
+        if result['file_skipped']:
+            log(f"[{name}] 文件未变化，跳过（{result['elapsed']:.3f} 秒）")
+        else:
+            log(f"[{name}] 新增 {result['inserted']}，修改 {result['updated']}，删除 {result['deleted']}，"
+                f"未变 {result['unchanged']}，跳过 {result['skipped']}（{result['elapsed']:.2f} 秒）")
+    return results
+
+
+# ---------------------------
+# 并行导入流水线
+# ---------------------------
+FACT_TABLES = ['infra', 'agri', 'economy', 'demo']
+
+
+@deferred_refresh(flush_on_error=True)
+def load_all_parallel(data_dir="data", chunk_size=CHUNK_SIZE, workers=None, progress=None, log=print):
+    """
+    导入全部表：County -> 并行解析四张事实表 -> 单连接写入。
+    返回各阶段用时 {阶段: 秒数}，并通过 log 输出。
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    # 阶段 1：County（事实表的外键依赖它）
+    written, skipped, elapsed = load_table('county', data_dir, chunk_size=chunk_size, progress=progress)
+    timings['county'] = elapsed
+    log(f"[County] 写入 {written} 行，用时 {elapsed:.2f} 秒")
+    counties = county_id_map()
+
+    # 阶段 2：子进程并行解析，当前进程串行写入
+    workers = workers or min(len(FACT_TABLES), os.cpu_count() or 1)
+    stats = {key: {'written': 0, 'skipped': 0, 'write': 0.0, 'parse': None} for key in FACT_TABLES}
+    stage_started = time.perf_counter()
+
+    with multiprocessing.Manager() as manager:
+        queue = manager.Queue(maxsize=workers * 2)  # 有界队列：解析快于写入时子进程会等待
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    parse_to_queue, key, os.path.join(data_dir, TABLE_SPECS[key].filename),
+                    TABLE_SPECS[key].fields, TABLE_SPECS[key].dtypes(), chunk_size, counties, queue,
+                )
+                for key in FACT_TABLES
+            ]
+            remaining = set(FACT_TABLES)
+            errors = []
+            parsers_done = False
+            while remaining:
+                try:
+                    # 子进程都已结束时不再等待，只取出队列中剩下的消息
+                    key, rows, info = queue.get_nowait() if parsers_done else queue.get(timeout=1)
+                except queue_module.Empty:
+                    if parsers_done:
+                        # 队列已取空，仍有表没有收到结束消息：子进程异常退出
+                        for future in futures:
+                            future.result()
+                        raise RuntimeError(f"解析进程异常退出：{', '.join(sorted(remaining))}")
+                    # 子进程可能在超时之后、检查之前发出结束消息并退出，先把队列取空再下结论
+                    parsers_done = all(future.done() for future in futures)
+                    continue
+                if rows is None:
+                    remaining.discard(key)
+                    if isinstance(info, Exception):
+                        errors.append((key, info))
+                    else:
+                        stats[key]['parse'] = info
+                    continue
+                spec = TABLE_SPECS[key]
+                write_started = time.perf_counter()
+                if rows:
+                    stats[key]['written'] += bulk_upsert(spec, rows)
+                stats[key]['write'] += time.perf_counter() - write_started
+                stats[key]['skipped'] += info
+                if progress:
+                    progress(spec.model.__name__, stats[key]['written'], stats[key]['skipped'],
+                             time.perf_counter() - stage_started)
+            for future in futures:
+                future.result()
+
+    for key in FACT_TABLES:
+        spec = TABLE_SPECS[key]
+        bump_versions(spec.model, source="import")
+        reset_manifest(key)
+        s = stats[key]
+        parse = f"{s['parse']:.2f}" if s['parse'] is not None else "失败"
+        log(f"[{spec.model.__name__}] 写入 {s['written']} 行，跳过 {s['skipped']} 行；"
+            f"解析 {parse} 秒（子进程），写入 {s['write']:.2f} 秒")
+        timings[f"{key}_parse"] = s['parse']
+        timings[f"{key}_write"] = s['write']
+    if errors:
+        raise errors[0][1]
+
+    timings['facts'] = time.perf_counter() - stage_started
+    timings['total'] = time.perf_counter() - started
+    log(f"[事实表] 并行解析 + 写入用时 {timings['facts']:.2f} 秒（{workers} 个解析进程）")
+    log(f"[总计] {timings['total']:.2f} 秒")
+    return timings
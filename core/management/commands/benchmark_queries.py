@@ -0,0 +1,131 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import (
+    County, InfrastructureService, AgricultureSales,
+    CountyEconomy, CountyDemographics,
+)
+from core.stats import MODEL_STATS, compute_aggregates
+
+INDEXED_MODELS = [County, InfrastructureService, AgricultureSales, CountyEconomy, CountyDemographics]
+
+
+def designed_indexes():
+    """模型 Meta.indexes 中设计的索引名（migration 0009）"""
+    return [index.name for model in INDEXED_MODELS for index in model._meta.indexes]
+
+
+def captured_sql(func):
+    """执行 ORM 调用，返回它发出的最后一条 SQL"""
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+    return ctx.captured_queries[-1]["sql"]
+
+
+def sample_values():
+    """基准查询用的参数：最近年份、第一个省份、第一种农产品"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT MAX(year) FROM core_countyeconomy")
+        year = cursor.fetchone()[0]
+        cursor.execute("SELECT province FROM core_county ORDER BY county_id LIMIT 1")
+        province = (cursor.fetchone() or [""])[0]
+        cursor.execute("SELECT product_type FROM core_agriculturesales WHERE product_type IS NOT NULL LIMIT 1")
+        product = (cursor.fetchone() or [""])[0]
+    if year is None:
+        raise CommandError("数据库中没有经济数据，请先导入 CSV（python manage.py import_csv）")
+    return year, province, product
+
+
+def benchmark_queries():
+    """(说明, SQL) 列表：首页统计、列表页分页、常见的 AI 生成查询"""
+    year, province, product = sample_values()
+    queries = [
+        (f"首页统计：{model.__name__}", captured_sql(lambda model=model: compute_aggregates(model)))
+        for model in MODEL_STATS
+    ]
+    for model in (InfrastructureService, CountyEconomy):
+        queries.append((
+            f"列表页：{model.__name__} 游标分页",
+            captured_sql(lambda model=model: list(
+                model.objects.select_related("county").filter(county_id__gt=10)
+                .order_by("county_id", "year", "pk")[:51]
+            )),
+        ))
+    queries += [
+        ("AI：某年 GDP 排名前 10 的县", f"""
+            SELECT c.name, e.gdp_total FROM core_countyeconomy e
+            JOIN core_county c ON c.county_id = e.county_id
+            WHERE e.year = {year} ORDER BY e.gdp_total DESC LIMIT 10"""),
+        ("AI：某省各县某年人均收入", f"""
+            SELECT c.name, e.per_capita_income FROM core_county c
+            JOIN core_countyeconomy e ON e.county_id = c.county_id
+            WHERE c.province = '{province}' AND e.year = {year}"""),
+        ("AI：某年经济与人口连接", f"""
+            SELECT e.county_id, e.gdp_total, d.population_total
+            FROM core_countyeconomy e
+            JOIN core_countydemographics d ON d.county_id = e.county_id AND d.year = e.year
+            WHERE e.year = {year}"""),
+        ("AI：某年总人口", f"SELECT SUM(population_total) FROM core_countydemographics WHERE year = {year}"),
+        ("AI：某农产品逐年销售额", f"""
+            SELECT year, SUM(sales_value) FROM core_agriculturesales
+            WHERE product_type = '{product}' GROUP BY year ORDER BY year"""),
+        ("AI：近三年宽带覆盖率", f"""
+            SELECT county_id, year, broadband_coverage FROM core_infrastructureservice
+            WHERE year BETWEEN {year - 2} AND {year}"""),
+        ("AI：各省县域数量", "SELECT province, COUNT(*) FROM core_county GROUP BY province"),
+    ]
+    return queries
+
+
+def measure(sql, repeat, phase):
+    """返回 (执行计划, 中位耗时毫秒)"""
+    with connection.cursor() as cursor:
+        # EXPLAIN 语句不检查 schema 是否变化，sqlite3 模块缓存的语句会返回旧计划；
+        # 用注释区分两个阶段，避免命中缓存
+        cursor.execute(f"EXPLAIN QUERY PLAN /* {phase} */ " + sql)
+        plan = [row[-1] for row in cursor.fetchall()]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+    return plan, statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = "对比有 / 无复合索引时首页、列表页和常见 AI 查询的执行计划与耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="每条查询执行次数，取中位数（默认 5）")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        if repeat <= 0:
+            raise CommandError("--repeat 必须为正整数")
+
+        queries = benchmark_queries()
+        indexes = designed_indexes()
+        after = {label: measure(sql, repeat, "after") for label, sql in queries}
+
+        # 在事务中临时删除索引得到“之前”的结果，最后回滚（SQLite 的 DDL 可以回滚）
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for name in indexes:
+                    cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+            before = {label: measure(sql, repeat, "before") for label, sql in queries}
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"对比的索引：{', '.join(indexes)}\n")
+        for label, _sql in queries:
+            plan_before, ms_before = before[label]
+            plan_after, ms_after = after[label]
+            speedup = ms_before / ms_after if ms_after > 0 else float("inf")
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f"  之前 {ms_before:8.2f} ms  | " + " / ".join(plan_before))
+            self.stdout.write(f"  之后 {ms_after:8.2f} ms  | " + " / ".join(plan_after))
+            self.stdout.write(f"  加速 {speedup:.1f}x\n")
@@ -0,0 +1,137 @@
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.sqlite_tuning import SQLITE_PRAGMAS, apply_pragmas
+
+# 对比的两组连接参数：SQLite 默认（rollback journal）与 settings.SQLITE_PRAGMAS
+PROFILES = [
+    ("默认（rollback journal）", {"busy_timeout": 5000, "journal_mode": "DELETE", "synchronous": "FULL"}),
+    ("调优（SQLITE_PRAGMAS）", SQLITE_PRAGMAS),
+]
+
+# 读请求：首页统计和常见的单年查询
+READ_QUERIES = [
+    "SELECT COUNT(*), AVG(gdp_total) FROM core_countyeconomy",
+    "SELECT SUM(population_total) FROM core_countydemographics WHERE year = (SELECT MAX(year) FROM core_countydemographics)",
+    "SELECT county_id, gdp_total FROM core_countyeconomy WHERE year = (SELECT MAX(year) FROM core_countyeconomy) ORDER BY gdp_total DESC LIMIT 10",
+]
+
+
+def open_connection(path, pragmas):
+    conn = sqlite3.connect(path, timeout=pragmas.get("busy_timeout", 5000) / 1000, isolation_level=None,
+                           check_same_thread=False)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def writer(path, pragmas, chunk_size, stop, stats):
+    """模拟分块导入：逐块在独立事务中重写经济表的行（与 import_csv 的写入模式相同）"""
+    conn = open_connection(path, pragmas)
+    max_id = conn.execute("SELECT MAX(econ_id) FROM core_countyeconomy").fetchone()[0] or 0
+    start_id = 0
+    while not stop.is_set():
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE core_countyeconomy SET gdp_total = gdp_total WHERE econ_id > ? AND econ_id <= ?",
+                (start_id, start_id + chunk_size),
+            )
+            conn.execute("COMMIT")
+            stats["chunks"] += 1
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            stats["errors"] += 1
+        start_id = start_id + chunk_size if start_id + chunk_size < max_id else 0
+    conn.close()
+
+
+def reader(path, pragmas, stop, latencies, errors):
+    conn = open_connection(path, pragmas)
+    i = 0
+    while not stop.is_set():
+        query = READ_QUERIES[i % len(READ_QUERIES)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.execute(query).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except sqlite3.OperationalError:
+            errors.append(1)
+    conn.close()
+
+
+def run_profile(path, pragmas, readers, seconds, chunk_size):
+    # journal_mode 是数据库文件级别的设置，先单独切换
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f"PRAGMA journal_mode = {pragmas.get('journal_mode', 'DELETE')}")
+    conn.close()
+
+    stop = threading.Event()
+    write_stats = {"chunks": 0, "errors": 0}
+    latencies, errors = [], []
+    threads = [threading.Thread(target=writer, args=(path, pragmas, chunk_size, stop, write_stats))]
+    threads += [threading.Thread(target=reader, args=(path, pragmas, stop, latencies, errors)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "reads": len(latencies) / seconds,
+        "p50": statistics.median(latencies) if latencies else 0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        "read_errors": len(errors),
+        "chunks": write_stats["chunks"] / seconds,
+        "write_errors": write_stats["errors"],
+    }
+
+
+class Command(BaseCommand):
+    help = "在数据库副本上对比默认参数与 SQLITE_PRAGMAS 下，导入进行中时的并发读吞吐"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5, help="每组参数运行的秒数（默认 5）")
+        parser.add_argument("--readers", type=int, default=4, help="并发读线程数（默认 4）")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="写线程每个事务改写的行数（默认 5000）")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("只支持 SQLite 数据库")
+        if options["seconds"] <= 0 or options["readers"] <= 0 or options["chunk_size"] <= 0:
+            raise CommandError("--seconds / --readers / --chunk-size 必须为正数")
+
+        workdir = tempfile.mkdtemp(prefix="sqlite_bench_")
+        path = os.path.join(workdir, "bench.sqlite3")
+        try:
+            # 用 backup API 复制数据库，基准测试不影响正式数据
+            connection.ensure_connection()
+            target = sqlite3.connect(path)
+            connection.connection.backup(target)
+            target.close()
+
+            self.stdout.write(
+                f"{options['readers']} 个读线程 + 1 个写线程（每事务 {options['chunk_size']} 行），"
+                f"每组运行 {options['seconds']} 秒\n"
+            )
+            for label, pragmas in PROFILES:
+                result = run_profile(path, pragmas, options["readers"], options["seconds"], options["chunk_size"])
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(
+                    f"  读：{result['reads']:,.0f} 次/秒，p50 {result['p50']:.2f} ms，p95 {result['p95']:.2f} ms，"
+                    f"失败 {result['read_errors']} 次"
+                )
+                self.stdout.write(f"  写：{result['chunks']:,.1f} 块/秒，失败 {result['write_errors']} 次\n")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,113 @@
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importer import CHUNK_SIZE, TABLE_SPECS, bulk_upsert, reset_manifest
+from core.models import County
+from core.panel import deferred_refresh
+from core.synthetic import SyntheticCounties, column_rows
+from core.table_versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "生成规模测试用的合成数据（同一 seed 结果相同），直接写入数据库或写成 import_csv 可读取的 CSV，"
+        "例如：python manage.py generate_synthetic_data --counties 10000 --years 30 --output-dir /tmp/synthetic"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--counties", type=int, default=832, help="县的数量（默认 832）")
+        parser.add_argument("--years", type=int, default=10, help="年数（默认 10）")
+        parser.add_argument("--start-year", type=int, default=2014, help="起始年份（默认 2014）")
+        parser.add_argument("--products", type=int, default=4, help="每个县最多经营的农产品种类数（默认 4，最多 8）")
+        parser.add_argument("--missing-rate", type=float, default=0.01, help="指标随机缺失的比例（默认 0.01）")
+        parser.add_argument("--seed", type=int, default=0, help="随机种子（默认 0）")
+        parser.add_argument("--first-id", type=int, default=1, help="第一个县的 county_id（默认 1）")
+        parser.add_argument(
+            "--output-dir", default=None,
+            help="写成 CSV 到该目录（文件名与列同 import_csv），不指定则直接批量写入数据库",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"写入数据库时每个事务的行数（默认 {CHUNK_SIZE}）")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="数据库中已有县域数据时仍然写入（county_id 相同的行会被覆盖）",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("counties", "years", "products", "chunk_size"):
+            if options[name] <= 0:
+                raise CommandError(f"--{name.replace('_', '-')} 必须为正整数")
+        if not 0 <= options["missing_rate"] < 1:
+            raise CommandError("--missing-rate 必须在 0 和 1 之间")
+        output_dir = options["output_dir"]
+        if output_dir is None and not options["force"] and County.objects.exists():
+            raise CommandError("数据库中已有县域数据；使用 --force 继续写入，或用 --output-dir 生成 CSV")
+
+        started = time.perf_counter()
+        counties = SyntheticCounties(
+            options["counties"], products=options["products"], seed=options["seed"], first_id=options["first_id"],
+        )
+        years = range(options["start_year"], options["start_year"] + options["years"])
+        self.stdout.write(f"生成 {len(counties)} 个县 × {len(years)} 年的数据 ...")
+
+        if output_dir is None:
+            written = self.write_database(counties, years, options)
+        else:
+            written = self.write_csv(counties, years, options, output_dir)
+
+        elapsed = time.perf_counter() - started
+        for key, count in written.items():
+            self.stdout.write(f"  {TABLE_SPECS[key].model.__name__}: {count} 行")
+        target = output_dir or "数据库"
+        self.stdout.write(self.style.SUCCESS(f"合成数据已写入 {target}，用时 {elapsed:.2f} 秒"))
+
+    @deferred_refresh(flush_on_error=True)
+    def write_database(self, counties, years, options):
+        """与 CSV 导入相同的写入路径：按块 bulk_upsert，面板在全部写完后统一刷新一次，最后登记版本号"""
+        chunk_size = options["chunk_size"]
+        written = dict.fromkeys(TABLE_SPECS, 0)
+
+        def upsert(key, columns):
+            spec = TABLE_SPECS[key]
+            rows = column_rows(columns, spec.fields)
+            for i in range(0, len(rows), chunk_size):
+                written[key] += bulk_upsert(spec, rows[i:i + chunk_size])
+
+        # County 必须先写入，事实表依赖它
+        upsert('county', counties.county_columns())
+        for block in counties.iter_blocks(years, options["missing_rate"]):
+            for key, columns in block:
+                upsert(key, columns)
+            self.stdout.write(f"  已写入 {written['demo']} 个县年 ...")
+
+        for key, spec in TABLE_SPECS.items():
+            bump_versions(spec.model, source="import")
+            reset_manifest(key)
+        return written
+
+    def write_csv(self, counties, years, options, output_dir):
+        """写成与 data/ 下文件同名、同列的 CSV；缺失值写为空"""
+        os.makedirs(output_dir, exist_ok=True)
+        files, writers = {}, {}
+        written = dict.fromkeys(TABLE_SPECS, 0)
+        try:
+            for key, spec in TABLE_SPECS.items():
+                files[key] = open(os.path.join(output_dir, spec.filename), "w", newline="", encoding="utf-8")
+                writers[key] = csv.writer(files[key])
+                writers[key].writerow(spec.fields)
+
+            def write(key, columns):
+                rows = column_rows(columns, TABLE_SPECS[key].fields)
+                writers[key].writerows(rows)
+                written[key] += len(rows)
+
+            write('county', counties.county_columns())
+            for block in counties.iter_blocks(years, options["missing_rate"]):
+                for key, columns in block:
+                    write(key, columns)
+        finally:
+            for f in files.values():
+                f.close()
+        return written
@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importer import (
+    CHUNK_SIZE, TABLE_SPECS, county_id_map, load_all_incremental, load_all_parallel, load_table,
+)
+
+
+class Command(BaseCommand):
+    help = "按块流式导入 CSV 数据（内存占用只与块大小有关），例如：python manage.py import_csv --chunk-size 20000"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tables", nargs="*", metavar="table",
+            help=f"要导入的表（{', '.join(TABLE_SPECS)}），不指定则导入全部",
+        )
+        parser.add_argument("--data-dir", default="data", help="CSV 所在目录（默认 data）")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"每块行数（默认 {CHUNK_SIZE}）")
+        parser.add_argument(
+            "--parallel", action="store_true",
+            help="导入全部表时，先导入 County，再用多进程并行解析四张事实表（写入仍由单一连接完成）",
+        )
+        parser.add_argument(
+            "--incremental", action="store_true",
+            help="增量导入全部表：跳过内容未变化的文件，只写入新增 / 修改 / 删除的行",
+        )
+        parser.add_argument("--workers", type=int, default=None, help="并行解析的进程数（默认 min(4, CPU 核数)）")
+
+    def progress(self, label, written, skipped, elapsed):
+        rate = written / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"  {label}: 已写入 {written} 行，跳过 {skipped} 行，{elapsed:.1f} 秒（{rate:,.0f} 行/秒）")
+
+    def handle(self, *args, **options):
+        tables = options["tables"] or list(TABLE_SPECS)
+        unknown = [t for t in tables if t not in TABLE_SPECS]
+        if unknown:
+            raise CommandError(f"未知的表：{', '.join(unknown)}（可选：{', '.join(TABLE_SPECS)}）")
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size 必须为正整数")
+
+        if options["incremental"]:
+            if options["tables"] or options["parallel"]:
+                raise CommandError("--incremental 只能单独用于导入全部表")
+            started = time.perf_counter()
+            try:
+                load_all_incremental(options["data_dir"], chunk_size=options["chunk_size"],
+                                     progress=self.progress, log=self.stdout.write)
+            except FileNotFoundError as e:
+                raise CommandError(f"找不到 CSV 文件：{e.filename}")
+            self.stdout.write(self.style.SUCCESS(f"增量导入完成，总用时 {time.perf_counter() - started:.2f} 秒"))
+            return
+
+        if options["parallel"]:
+            if options["tables"]:
+                raise CommandError("--parallel 只能在导入全部表时使用")
+            try:
+                load_all_parallel(
+                    options["data_dir"], chunk_size=options["chunk_size"], workers=options["workers"],
+                    progress=self.progress, log=self.stdout.write,
+                )
+            except FileNotFoundError as e:
+                raise CommandError(f"找不到 CSV 文件：{e.filename}")
+            return
+
+        started = time.perf_counter()
+        counties = None
+        # County 必须最先导入，事实表依赖它校验外键
+        for key in sorted(tables, key=lambda k: k != 'county'):
+            if key != 'county' and counties is None:
+                counties = county_id_map()
+            self.stdout.write(f"Loading {TABLE_SPECS[key].model.__name__} ...")
+            try:
+                written, skipped, elapsed = load_table(
+                    key, options["data_dir"], chunk_size=options["chunk_size"],
+                    counties=counties, progress=self.progress,
+                )
+            except FileNotFoundError as e:
+                raise CommandError(f"找不到 CSV 文件：{e.filename}")
+            self.stdout.write(self.style.SUCCESS(
+                f"{TABLE_SPECS[key].model.__name__} 导入完成：{written} 行，跳过 {skipped} 行，用时 {elapsed:.2f} 秒"
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f"全部完成，总用时 {time.perf_counter() - started:.2f} 秒"))
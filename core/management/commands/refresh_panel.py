@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import CountyYearPanel, RollupCell
+from core.panel import refresh_panel
+
+
+class Command(BaseCommand):
+    help = "从 County 和四张事实表整表重建县域年度面板（core_countyyearpanel）及分省汇总立方体（core_rollupcell）"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        refresh_panel()
+        self.stdout.write(self.style.SUCCESS(
+            f"重建完成：面板 {CountyYearPanel.objects.count()} 行，汇总 {RollupCell.objects.count()} 行，"
+            f"用时 {time.perf_counter() - started:.2f} 秒"
+        ))
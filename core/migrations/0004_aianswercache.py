@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_aipromptconfig'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIAnswerCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='规范化问题与 Prompt 指纹的哈希', max_length=64, unique=True)),
+                ('fingerprint', models.CharField(db_index=True, help_text='Prompt 配置与模型名的哈希', max_length=64)),
+                ('question', models.TextField()),
+                ('sql', models.TextField()),
+                ('explanation', models.TextField(blank=True, default='')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'AI 答案缓存',
+                'verbose_name_plural': 'AI 答案缓存',
+            },
+        ),
+    ]
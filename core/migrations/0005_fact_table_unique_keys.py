@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:35
+
+from django.db import migrations
+
+# 新唯一约束的业务键；同一键有多行时保留主键最大（最后录入）的一行
+UNIQUE_KEYS = [
+    ('agriculturesales', ['county_id', 'year', 'product_type']),
+    ('countydemographics', ['county_id', 'year']),
+    ('infrastructureservice', ['county_id', 'year']),
+]
+
+
+def remove_duplicates(apps, schema_editor):
+    """删除违反新唯一约束的重复行（product_type 为 NULL 的行不受约束，不处理）"""
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, key in UNIQUE_KEYS:
+            model = apps.get_model('core', model_name)
+            table, pk = model._meta.db_table, model._meta.pk.column
+            not_null = ' AND '.join(f'{column} IS NOT NULL' for column in key)
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {not_null} AND {pk} NOT IN '
+                f'(SELECT MAX({pk}) FROM {table} WHERE {not_null} GROUP BY {", ".join(key)})'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_aianswercache'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='agriculturesales',
+            unique_together={('county', 'year', 'product_type')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='countydemographics',
+            unique_together={('county', 'year')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='infrastructureservice',
+            unique_together={('county', 'year')},
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_fact_table_unique_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=50, unique=True)),
+                ('file_path', models.CharField(max_length=255)),
+                ('file_hash', models.CharField(max_length=64)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '导入清单',
+                'verbose_name_plural': '导入清单',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRowHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=50)),
+                ('row_key', models.CharField(max_length=255)),
+                ('row_hash', models.CharField(max_length=16)),
+            ],
+            options={
+                'verbose_name': '导入行哈希',
+                'verbose_name_plural': '导入行哈希',
+                'unique_together': {('table_name', 'row_key')},
+            },
+        ),
+    ]
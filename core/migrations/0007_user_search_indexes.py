@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    用户管理页按用户名 / 邮箱前缀搜索（不区分大小写），
+    在 auth_user 上建立 lower() 表达式索引，使范围查询可以走索引。
+    """
+
+    dependencies = [
+        ('core', '0006_import_manifest'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS core_user_username_lower_idx ON auth_user (lower(username));',
+            reverse_sql='DROP INDEX IF EXISTS core_user_username_lower_idx;',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS core_user_email_lower_idx ON auth_user (lower(email));',
+            reverse_sql='DROP INDEX IF EXISTS core_user_email_lower_idx;',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterruptedQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=20)),
+                ('sql', models.TextField()),
+                ('reason', models.CharField(choices=[('time', '超出时间预算'), ('steps', '超出指令数预算')], max_length=10)),
+                ('elapsed_ms', models.PositiveIntegerField(default=0)),
+                ('steps', models.PositiveBigIntegerField(default=0, help_text='中断时已执行的 SQLite 虚拟机指令数（近似）')),
+                ('estimated_cost', models.PositiveBigIntegerField(blank=True, help_text='执行前 EXPLAIN 估算的代价', null=True)),
+                ('preview', models.BooleanField(default=False, help_text='是否为超出代价预算后的预览查询')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='interrupted_queries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '被中断的查询',
+                'verbose_name_plural': '被中断的查询',
+            },
+        ),
+    ]
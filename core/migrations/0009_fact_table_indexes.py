@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_interruptedquery'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agriculturesales',
+            index=models.Index(fields=['year', 'county'], name='agri_year_county_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agriculturesales',
+            index=models.Index(fields=['product_type', 'year', 'sales_value'], name='agri_product_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='county',
+            index=models.Index(fields=['province', 'city'], name='county_province_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='countydemographics',
+            index=models.Index(fields=['year', 'county', 'population_total'], name='demo_year_county_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='countyeconomy',
+            index=models.Index(fields=['year', 'county', 'gdp_total', 'per_capita_income'], name='econ_year_county_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='infrastructureservice',
+            index=models.Index(fields=['year', 'county'], name='infra_year_county_idx'),
+        ),
+    ]
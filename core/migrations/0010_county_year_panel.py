@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PANEL_SCHEMA_SECTION = """6️⃣ core_countyyearpanel（县域年度面板，每个县每年一行，已连接好上面五张表，只读）:
+- county_id, year, name, province, city
+- pct_village_with_hard_road, pct_village_with_electricity, broadband_coverage, water_supply_coverage, sanitation_coverage
+- gdp_total, fiscal_revenue, per_capita_income
+- population_total, urbanization_rate, unemployment_rate, migrant_workers, social_security_rate
+- agri_sales_volume, agri_sales_value（该县该年所有农产品合计）, agri_product_count
+
+"""
+
+
+def add_panel_to_schema(apps, schema_editor):
+    """已保存的 Prompt 配置中补充面板表说明（放在“注意”之前，没有则追加在末尾）"""
+    AIPromptConfig = apps.get_model('core', 'AIPromptConfig')
+    for config in AIPromptConfig.objects.exclude(table_schema__contains='core_countyyearpanel'):
+        schema = config.table_schema
+        marker = schema.find('⚠')
+        if marker >= 0:
+            config.table_schema = schema[:marker] + PANEL_SCHEMA_SECTION + schema[marker:]
+        else:
+            config.table_schema = schema.rstrip() + '\n\n' + PANEL_SCHEMA_SECTION.rstrip()
+        config.save(update_fields=['table_schema'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_fact_table_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountyYearPanel',
+            fields=[
+                ('panel_id', models.AutoField(primary_key=True, serialize=False)),
+                ('year', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('province', models.CharField(max_length=50)),
+                ('city', models.CharField(blank=True, max_length=100, null=True)),
+                ('pct_village_with_hard_road', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('pct_village_with_electricity', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('broadband_coverage', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('water_supply_coverage', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('sanitation_coverage', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('gdp_total', models.DecimalField(decimal_places=2, max_digits=18, null=True)),
+                ('fiscal_revenue', models.DecimalField(decimal_places=2, max_digits=18, null=True)),
+                ('per_capita_income', models.DecimalField(decimal_places=2, max_digits=18, null=True)),
+                ('population_total', models.BigIntegerField(null=True)),
+                ('urbanization_rate', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('unemployment_rate', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('migrant_workers', models.BigIntegerField(null=True)),
+                ('social_security_rate', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('agri_sales_volume', models.DecimalField(decimal_places=2, max_digits=20, null=True)),
+                ('agri_sales_value', models.DecimalField(decimal_places=2, max_digits=20, null=True)),
+                ('agri_product_count', models.PositiveIntegerField(default=0)),
+                ('county', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.county')),
+            ],
+            options={
+                'verbose_name': '县域年度面板',
+                'verbose_name_plural': '县域年度面板',
+                'indexes': [models.Index(fields=['year', 'province'], name='panel_year_province_idx')],
+                'unique_together': {('county', 'year')},
+            },
+        ),
+        migrations.RunPython(add_panel_to_schema, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_county_year_panel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('year', '全国×年'), ('province', '省×年'), ('city', '省×市×年')], max_length=10)),
+                ('province', models.CharField(blank=True, default='', max_length=50)),
+                ('city', models.CharField(blank=True, default='', max_length=100)),
+                ('year', models.PositiveIntegerField()),
+                ('indicator', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum', models.FloatField(null=True)),
+                ('min', models.FloatField(null=True)),
+                ('max', models.FloatField(null=True)),
+                ('weighted_sum', models.FloatField(null=True)),
+                ('weight', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name': '汇总立方体单元',
+                'verbose_name_plural': '汇总立方体单元',
+                'indexes': [models.Index(fields=['level', 'indicator', 'year'], name='rollup_level_indicator_idx')],
+                'unique_together': {('level', 'province', 'city', 'year', 'indicator')},
+            },
+        ),
+    ]
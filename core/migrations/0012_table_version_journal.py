@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_rollup_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('table_name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+                ('modified_at', models.DateTimeField()),
+                ('source', models.CharField(blank=True, choices=[('orm', '表单 / ORM'), ('sql', 'SQL 写语句'), ('import', '批量导入'), ('derived', '派生表刷新')], max_length=10)),
+            ],
+            options={
+                'verbose_name': '表版本',
+                'verbose_name_plural': '表版本',
+            },
+        ),
+    ]
@@ -1,8 +1,43 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 
-class County(models.Model):
+# ---------------------------
+# 面板源表（County + 四张事实表）的公共部分
+# ---------------------------
+
+class PanelSourceQuerySet(models.QuerySet):
+    def delete(self):
+        """批量删除（含级联）时面板刷新和版本号升级合并为一次，见 core.panel.deferred_refresh"""
+        from core.panel import deferred_refresh
+        with transaction.atomic(using=self.db), deferred_refresh():
+            return super().delete()
+
+
+class PanelSource(models.Model):
+    """
+    面板源表的抽象基类：
+    - 删除时合并刷新面板（级联删除一个县不会逐行刷新）；
+    - 从数据库读取时记下 (county_id, year)，保存时据此刷新旧键，不必再查一次原值。
+    """
+    objects = PanelSourceQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._panel_loaded_key = (instance.__dict__.get("county_id"), instance.__dict__.get("year"))
+        return instance
+
+    def delete(self, *args, **kwargs):
+        from core.panel import deferred_refresh
+        with transaction.atomic(using=kwargs.get("using") or self._state.db), deferred_refresh():
+            return super().delete(*args, **kwargs)
+
+
+class County(PanelSource):
     county_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     province = models.CharField(max_length=50)
@@ -10,12 +45,21 @@ class County(models.Model):
 
     class Meta:
         unique_together = ('name', 'province')
+        indexes = [
+            # 按省份（及地市）筛选县域
+            models.Index(fields=['province', 'city'], name='county_province_city_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.name}（{self.city or self.province}）"
+        return self.format_label(self.name, self.city, self.province)
 
+    @staticmethod
+    def format_label(name, city, province):
+        """县域显示名称（列表页按列取值时复用，避免实例化 County）"""
+        return f"{name}（{city or province}）"
 
-class InfrastructureService(models.Model):
+
+class InfrastructureService(PanelSource):
     infra_id = models.AutoField(primary_key=True)
     county = models.ForeignKey(County, on_delete=models.CASCADE)
     year = models.PositiveIntegerField()
@@ -26,11 +70,18 @@ class InfrastructureService(models.Model):
     water_supply_coverage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     sanitation_coverage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
 
+    class Meta:
+        unique_together = ('county', 'year')
+        indexes = [
+            # 横截面查询（某一年的所有县）；(county, year) 由 unique_together 的索引覆盖
+            models.Index(fields=['year', 'county'], name='infra_year_county_idx'),
+        ]
+
     def __str__(self):
         return f"{self.county.name} 基础设施 {self.year}"
 
 
-class AgricultureSales(models.Model):
+class AgricultureSales(PanelSource):
     sale_id = models.AutoField(primary_key=True)
     county = models.ForeignKey(County, on_delete=models.CASCADE)
     year = models.PositiveIntegerField()
@@ -39,11 +90,19 @@ class AgricultureSales(models.Model):
     sales_volume = models.DecimalField(max_digits=18, decimal_places=2, null=True)
     sales_value = models.DecimalField(max_digits=18, decimal_places=2, null=True)
 
+    class Meta:
+        unique_together = ('county', 'year', 'product_type')
+        indexes = [
+            models.Index(fields=['year', 'county'], name='agri_year_county_idx'),
+            # 覆盖索引：按农产品类型筛选、按年汇总某类产品的销售额（产品种类少，回表代价高于全表扫描）
+            models.Index(fields=['product_type', 'year', 'sales_value'], name='agri_product_year_idx'),
+        ]
+
     def __str__(self):
         return f"{self.county.name} 农业销售 {self.year}"
 
 
-class CountyEconomy(models.Model):
+class CountyEconomy(PanelSource):
     econ_id = models.AutoField(primary_key=True)
     county = models.ForeignKey(County, on_delete=models.CASCADE)
     year = models.PositiveIntegerField()
@@ -54,12 +113,16 @@ class CountyEconomy(models.Model):
 
     class Meta:
         unique_together = ('county', 'year')
+        indexes = [
+            # 覆盖索引：某年各县 GDP / 人均收入的排名、汇总只读索引，不回表
+            models.Index(fields=['year', 'county', 'gdp_total', 'per_capita_income'], name='econ_year_county_idx'),
+        ]
 
     def __str__(self):
         return f"{self.county.name} 经济指标 {self.year}"
 
 
-class CountyDemographics(models.Model):
+class CountyDemographics(PanelSource):
     demo_id = models.AutoField(primary_key=True)
     county = models.ForeignKey(County, on_delete=models.CASCADE)
     year = models.PositiveIntegerField()
@@ -70,10 +133,134 @@ class CountyDemographics(models.Model):
     migrant_workers = models.BigIntegerField(null=True)
     social_security_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True)
 
+    class Meta:
+        unique_together = ('county', 'year')
+        indexes = [
+            # 覆盖索引：某年人口合计、以人口为权重的均值只读索引，不回表
+            models.Index(fields=['year', 'county', 'population_total'], name='demo_year_county_idx'),
+        ]
+
     def __str__(self):
         return f"{self.county.name} 人口结构 {self.year}"
 
 
+class CountyYearPanel(models.Model):
+    """
+    县域-年度面板：每个 (县, 年) 一行，汇总 County 与四张事实表的全部指标（派生表，由 core.panel 维护）。
+    多指标分析直接查这张表，不需要再做四表连接；不要手工修改。
+    """
+    panel_id = models.AutoField(primary_key=True)
+    # 行由 core.panel 随县域一起删除，不使用数据库外键和 ORM 级联
+    county = models.ForeignKey(County, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    year = models.PositiveIntegerField()
+
+    name = models.CharField(max_length=100)
+    province = models.CharField(max_length=50)
+    city = models.CharField(max_length=100, null=True, blank=True)
+
+    # InfrastructureService
+    pct_village_with_hard_road = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    pct_village_with_electricity = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    broadband_coverage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    water_supply_coverage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    sanitation_coverage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+
+    # CountyEconomy
+    gdp_total = models.DecimalField(max_digits=18, decimal_places=2, null=True)
+    fiscal_revenue = models.DecimalField(max_digits=18, decimal_places=2, null=True)
+    per_capita_income = models.DecimalField(max_digits=18, decimal_places=2, null=True)
+
+    # CountyDemographics
+    population_total = models.BigIntegerField(null=True)
+    urbanization_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    unemployment_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    migrant_workers = models.BigIntegerField(null=True)
+    social_security_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+
+    # AgricultureSales（按县、年汇总所有产品）
+    agri_sales_volume = models.DecimalField(max_digits=20, decimal_places=2, null=True)
+    agri_sales_value = models.DecimalField(max_digits=20, decimal_places=2, null=True)
+    agri_product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # (county, year)：单个县的时间序列
+        unique_together = ('county', 'year')
+        indexes = [
+            # 横截面查询：某一年的全部县 / 某省的县
+            models.Index(fields=['year', 'province'], name='panel_year_province_idx'),
+        ]
+        verbose_name = '县域年度面板'
+        verbose_name_plural = '县域年度面板'
+
+    def __str__(self):
+        return f"{self.name} 面板 {self.year}"
+
+
+class RollupCell(models.Model):
+    """
+    汇总立方体的一个单元：某一层级的一个分组（年 / 省×年 / 省×市×年）在某个指标上的汇总值。
+    由 core.rollups 从县域年度面板生成和维护，不要手工修改。
+    """
+    LEVEL_CHOICES = [
+        ('year', '全国×年'),
+        ('province', '省×年'),
+        ('city', '省×市×年'),
+    ]
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    province = models.CharField(max_length=50, blank=True, default='')   # year 层级为空
+    city = models.CharField(max_length=100, blank=True, default='')      # 非 city 层级、或县域没有地市时为空
+    year = models.PositiveIntegerField()
+    indicator = models.CharField(max_length=50)   # 面板中的指标列名
+
+    count = models.PositiveIntegerField(default=0)   # 该指标非空的县数
+    sum = models.FloatField(null=True)
+    min = models.FloatField(null=True)
+    max = models.FloatField(null=True)
+    # 人口加权：weighted_sum = Σ 指标 × 人口，weight = Σ 人口（只计指标和人口都非空的县）
+    weighted_sum = models.FloatField(null=True)
+    weight = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('level', 'province', 'city', 'year', 'indicator')
+        indexes = [
+            models.Index(fields=['level', 'indicator', 'year'], name='rollup_level_indicator_idx'),
+        ]
+        verbose_name = '汇总立方体单元'
+        verbose_name_plural = '汇总立方体单元'
+
+    def __str__(self):
+        return f"{self.get_level_display()} {self.province}{self.city} {self.year} {self.indicator}"
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count and self.sum is not None else None
+
+    @property
+    def weighted_mean(self):
+        return self.weighted_sum / self.weight if self.weight and self.weighted_sum is not None else None
+
+
+class TableVersion(models.Model):
+    """数据表变更日志：每张 core 表的版本号、最后修改时间和最近一次写入的来源（由 core.table_versions 维护）"""
+    SOURCE_CHOICES = [
+        ('orm', '表单 / ORM'),
+        ('sql', 'SQL 写语句'),
+        ('import', '批量导入'),
+        ('derived', '派生表刷新'),
+    ]
+    table_name = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+    modified_at = models.DateTimeField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, blank=True)
+
+    class Meta:
+        verbose_name = '表版本'
+        verbose_name_plural = '表版本'
+
+    def __str__(self):
+        return f"{self.table_name} v{self.version} ({self.modified_at})"
+
+
 class UserTablePermission(models.Model):
     """用户对每张表的细粒度权限"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='table_permissions')
@@ -176,9 +363,91 @@ Explanation:
 - migrant_workers
 - social_security_rate
 
+6️⃣ core_countyyearpanel（县域年度面板，每个县每年一行，已连接好上面五张表，只读）:
+- county_id, year, name, province, city
+- pct_village_with_hard_road, pct_village_with_electricity, broadband_coverage, water_supply_coverage, sanitation_coverage
+- gdp_total, fiscal_revenue, per_capita_income
+- population_total, urbanization_rate, unemployment_rate, migrant_workers, social_security_rate
+- agri_sales_volume, agri_sales_value（该县该年所有农产品合计）, agri_product_count
+
 ⚠ 注意：
 - 所有表名必须使用 Django ORM 的真实表名，例如 core_county。
+- 同时涉及多张表指标的问题（如 GDP 与人口、宽带覆盖率的关系），优先直接查询 core_countyyearpanel，不要自己连接多张表。
 - SQLite 中不支持 ILIKE。
 - 不要写分号之外的多条 SQL。"""
             )
         return config
+
+
+class AIAnswerCache(models.Model):
+    """自然语言问题 -> (SQL, 解释) 的答案缓存"""
+    cache_key = models.CharField(max_length=64, unique=True, help_text="规范化问题与 Prompt 指纹的哈希")
+    fingerprint = models.CharField(max_length=64, db_index=True, help_text="Prompt 配置与模型名的哈希")
+    question = models.TextField()
+    sql = models.TextField()
+    explanation = models.TextField(blank=True, default="")
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'AI 答案缓存'
+        verbose_name_plural = 'AI 答案缓存'
+
+    def __str__(self):
+        return f"{self.question[:30]} (命中 {self.hit_count} 次)"
+
+
+class ImportManifest(models.Model):
+    """CSV 导入清单：记录每张表最近一次导入的文件哈希"""
+    table_name = models.CharField(max_length=50, unique=True)  # 'county', 'infra', 'agri', 'economy', 'demo'
+    file_path = models.CharField(max_length=255)
+    file_hash = models.CharField(max_length=64)
+    row_count = models.PositiveIntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '导入清单'
+        verbose_name_plural = '导入清单'
+
+    def __str__(self):
+        return f"{self.table_name} ({self.row_count} 行, {self.imported_at})"
+
+
+class ImportRowHash(models.Model):
+    """增量导入用的行哈希：业务键 -> 该行内容的哈希"""
+    table_name = models.CharField(max_length=50)
+    row_key = models.CharField(max_length=255)
+    row_hash = models.CharField(max_length=16)
+
+    class Meta:
+        unique_together = ('table_name', 'row_key')
+        verbose_name = '导入行哈希'
+        verbose_name_plural = '导入行哈希'
+
+    def __str__(self):
+        return f"{self.table_name}:{self.row_key}"
+
+
+class InterruptedQuery(models.Model):
+    """超出执行预算而被中断的用户 SQL，供后续调优（加索引、改写 Prompt）参考"""
+    REASON_CHOICES = [
+        ('time', '超出时间预算'),
+        ('steps', '超出指令数预算'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='interrupted_queries')
+    role = models.CharField(max_length=20)  # 'superuser', 'data_entry', 'analyst', 'default'
+    sql = models.TextField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    elapsed_ms = models.PositiveIntegerField(default=0)
+    steps = models.PositiveBigIntegerField(default=0, help_text="中断时已执行的 SQLite 虚拟机指令数（近似）")
+    estimated_cost = models.PositiveBigIntegerField(null=True, blank=True, help_text="执行前 EXPLAIN 估算的代价")
+    preview = models.BooleanField(default=False, help_text="是否为超出代价预算后的预览查询")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = '被中断的查询'
+        verbose_name_plural = '被中断的查询'
+
+    def __str__(self):
+        return f"{self.sql[:30]} ({self.get_reason_display()}, {self.elapsed_ms} ms)"
@@ -0,0 +1,275 @@
+"""
+县域-年度面板（core_countyyearpanel）的维护
+
+面板表把 County 和四张事实表按 (county_id, year) 预先连接好，每个县每年一行。
+刷新方式是“先删后插”：删除受影响键的面板行，再用一条 INSERT ... SELECT 从源表重新生成，
+因此只需要知道哪些 (县, 年) 变了：
+
+- 表单保存 / 删除：信号处理函数按单行的键刷新（见 core.signals）；
+  批量删除、级联删除县域时在 deferred_refresh 中收集所有键，结束时合并刷新一次；
+- CSV 导入：整次导入收集各块的键，导入结束后合并刷新一次（见 core.importer）；
+- SQL 控制台的写语句：执行期间用临时触发器记下改动的键（capture_changes），执行后按键刷新（见 core.sql_utils）；
+- python manage.py refresh_panel：手动整表重建。
+
+面板行变化时，汇总立方体中受影响的分组随之重算（见 core.rollups）。
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core.models import (
+    County, InfrastructureService, AgricultureSales,
+    CountyEconomy, CountyDemographics, CountyYearPanel
+)
+from core.rollups import panel_groups, rebuild_rollups
+from core.table_versions import bump_versions
+
+# 按 (county_id, year) 一对一连接的事实表及其指标列（面板中同名）
+PANEL_FACT_COLUMNS = [
+    (InfrastructureService, [
+        "pct_village_with_hard_road", "pct_village_with_electricity",
+        "broadband_coverage", "water_supply_coverage", "sanitation_coverage",
+    ]),
+    (CountyEconomy, ["gdp_total", "fiscal_revenue", "per_capita_income"]),
+    (CountyDemographics, [
+        "population_total", "urbanization_rate", "unemployment_rate",
+        "migrant_workers", "social_security_rate",
+    ]),
+]
+
+# 变化后需要刷新面板的表
+PANEL_SOURCES = (County, InfrastructureService, AgricultureSales, CountyEconomy, CountyDemographics)
+PANEL_SOURCE_TABLES = {model._meta.db_table for model in PANEL_SOURCES}
+
+# 每条语句最多携带的 (county_id, year) 键数（每个键两个参数）
+KEY_BATCH_SIZE = 2000
+
+# 当前线程中 deferred_refresh 收集的待刷新范围
+_deferred = threading.local()
+
+
+def _scope(keys=None, county_ids=None):
+    """
+    把键或县域范围转成 (WITH 子句, WHERE 条件, 参数)：范围只在 WITH scope(...) 中出现一次，
+    各源表的条件都引用 scope，参数个数与源表数量无关。
+    """
+    if keys is not None:
+        values = ", ".join(["(%s, %s)"] * len(keys))
+        return (f"WITH scope(county_id, year) AS (VALUES {values})\n",
+                "(county_id, year) IN (SELECT county_id, year FROM scope)",
+                [v for key in keys for v in key])
+    if county_ids is not None:
+        values = ", ".join(["(%s)"] * len(county_ids))
+        return (f"WITH scope(county_id) AS (VALUES {values})\n",
+                "county_id IN (SELECT county_id FROM scope)",
+                list(county_ids))
+    return "", "1 = 1", []
+
+
+def _insert_sql(where, cte=""):
+    """从源表生成面板行的 INSERT ... SELECT（where 作用于各源表的 county_id / year）"""
+    panel = CountyYearPanel._meta.db_table
+    county = County._meta.db_table
+    agri = AgricultureSales._meta.db_table
+
+    # 有任一事实表数据的 (县, 年)
+    key_sources = [model._meta.db_table for model, _ in PANEL_FACT_COLUMNS] + [agri]
+    keys = "\n    UNION\n    ".join(f"SELECT county_id, year FROM {table} WHERE {where}" for table in key_sources)
+
+    columns = ["county_id", "year", "name", "province", "city"]
+    select = ["k.county_id", "k.year", "c.name", "c.province", "c.city"]
+    joins = []
+    for i, (model, fields) in enumerate(PANEL_FACT_COLUMNS):
+        columns += fields
+        select += [f"f{i}.{field}" for field in fields]
+        joins.append(f"LEFT JOIN {model._meta.db_table} f{i} ON f{i}.county_id = k.county_id AND f{i}.year = k.year")
+    columns += ["agri_sales_volume", "agri_sales_value", "agri_product_count"]
+    select += ["a.sales_volume", "a.sales_value", "COALESCE(a.product_count, 0)"]
+    joins.append(
+        f"LEFT JOIN (SELECT county_id, year, SUM(sales_volume) AS sales_volume, SUM(sales_value) AS sales_value, "
+        f"COUNT(*) AS product_count FROM {agri} WHERE {where} GROUP BY county_id, year) a "
+        f"ON a.county_id = k.county_id AND a.year = k.year"
+    )
+    newline = "\n"
+    return (
+        f"{cte}INSERT INTO {panel} ({', '.join(columns)})\n"
+        f"SELECT {', '.join(select)}\n"
+        f"FROM (\n    {keys}\n) k\n"
+        f"JOIN {county} c ON c.county_id = k.county_id\n"
+        f"{newline.join(joins)}"
+    )
+
+
+def _refresh(cursor, keys=None, county_ids=None):
+    """刷新面板行，返回刷新前后这些行所属的汇总分组（整表重建时返回 None）"""
+    cte, where, params = _scope(keys, county_ids)
+    scoped = keys is not None or county_ids is not None
+    groups = panel_groups(cursor, cte, where, params) if scoped else None
+    cursor.execute(f"{cte}DELETE FROM {CountyYearPanel._meta.db_table} WHERE {where}", params)
+    cursor.execute(_insert_sql(where, cte), params)
+    if scoped:
+        groups |= panel_groups(cursor, cte, where, params)
+    return groups
+
+
+def refresh_panel(keys=None, county_ids=None, using=DEFAULT_DB_ALIAS):
+    """
+    刷新面板：keys 为 (county_id, year) 列表时只刷新这些行，county_ids 为县域 id 列表时刷新这些县的全部年份
+    （两者可以同时传），都不传时整表重建。所有批次在同一个事务中完成，
+    最后对所有批次涉及的分组只重算一次汇总立方体（见 core.rollups）。
+    在 deferred_refresh 块中调用时只记下范围，块结束时合并刷新。
+    """
+    pending = getattr(_deferred, "pending", None)
+    if pending is not None and using == DEFAULT_DB_ALIAS:
+        if keys is None and county_ids is None:
+            pending["full"] = True
+        pending["keys"].update(keys or ())
+        pending["county_ids"].update(county_ids or ())
+        return
+
+    if keys is None and county_ids is None:
+        batches = [{}]
+    else:
+        ids = sorted({int(c) for c in county_ids or () if c is not None})
+        # 已按县域整体刷新的键不必再刷新
+        keys = sorted({(int(c), int(y)) for c, y in keys or ()
+                       if c is not None and y is not None and int(c) not in ids})
+        batches = [dict(county_ids=ids[i:i + KEY_BATCH_SIZE * 2]) for i in range(0, len(ids), KEY_BATCH_SIZE * 2)]
+        batches += [dict(keys=keys[i:i + KEY_BATCH_SIZE]) for i in range(0, len(keys), KEY_BATCH_SIZE)]
+        if not batches:
+            return
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        groups = set()
+        for batch in batches:
+            batch_groups = _refresh(cursor, **batch)
+            groups = None if batch_groups is None else groups | batch_groups
+        rebuild_rollups(groups, cursor)
+    bump_versions(CountyYearPanel, source="derived")
+
+
+@contextmanager
+def deferred_refresh(flush_on_error=False):
+    """
+    块中的面板刷新和 ORM 信号的版本号升级先收集起来，块结束时各合并执行一次
+    （级联删除县域、批量删除源表行、CSV 导入时，避免逐行 / 逐块刷新面板、重算汇总和写变更日志）。
+    块内抛出异常时默认不刷新（调用方应把整个块放在事务中）；
+    flush_on_error=True 用于分块提交的导入：已提交的块仍需刷新。可以嵌套，由最外层统一刷新。
+    也可以用作装饰器。
+    """
+    if getattr(_deferred, "pending", None) is not None:
+        yield
+        return
+    pending = _deferred.pending = {"keys": set(), "county_ids": set(), "full": False, "tables": set()}
+    try:
+        yield
+    except BaseException:
+        _deferred.pending = None
+        if flush_on_error:
+            _flush(pending)
+        raise
+    _deferred.pending = None
+    _flush(pending)
+
+
+def _flush(pending):
+    if pending["tables"]:
+        bump_versions(*pending["tables"], source="orm")
+    if pending["full"]:
+        refresh_panel()
+    elif pending["keys"] or pending["county_ids"]:
+        refresh_panel(keys=pending["keys"], county_ids=pending["county_ids"])
+
+
+def defer_version_bump(table):
+    """在 deferred_refresh 块中时记下要升级版本号的表并返回 True，否则返回 False"""
+    pending = getattr(_deferred, "pending", None)
+    if pending is None:
+        return False
+    pending["tables"].add(table)
+    return True
+
+
+# 临时触发器记录的改动键：事实表记 (county_id, year)，County 记 (county_id, NULL)
+# （触发器中不能写 temp. 前缀；不带前缀的表名先在 temp 库中查找）
+CHANGES_TABLE = "panel_changed_keys"
+# 非空时触发器才记录：触发器每个连接只建一次，平时 ORM 写入只多一次空表检查
+CAPTURE_FLAG_TABLE = "panel_capture_active"
+
+
+def _capture_ddl():
+    """建临时表和各源表 INSERT / UPDATE / DELETE 触发器的语句"""
+    statements = [
+        f"CREATE TEMP TABLE IF NOT EXISTS {CHANGES_TABLE} (county_id, year)",
+        f"CREATE TEMP TABLE IF NOT EXISTS {CAPTURE_FLAG_TABLE} (active)",
+    ]
+    for model in PANEL_SOURCES:
+        table = model._meta.db_table
+        year = "NULL" if model is County else "{row}.year"
+        for event, rows in (("INSERT", ["NEW"]), ("UPDATE", ["OLD", "NEW"]), ("DELETE", ["OLD"])):
+            values = ", ".join(f"({row}.county_id, {year.format(row=row)})" for row in rows)
+            statements.append(
+                f"CREATE TEMP TRIGGER IF NOT EXISTS panel_capture_{table}_{event.lower()} AFTER {event} ON {table} "
+                f"WHEN EXISTS (SELECT 1 FROM {CAPTURE_FLAG_TABLE}) "
+                f"BEGIN INSERT INTO {CHANGES_TABLE} VALUES {values}; END"
+            )
+    return statements
+
+
+class ChangeCapture:
+    """capture_changes 的结果：keys 为改动的 (县, 年)，county_ids 为改动的县"""
+
+    def __init__(self):
+        self.keys = set()
+        self.county_ids = set()
+
+    def refresh(self):
+        """只刷新记录到的范围（一次面板刷新和一次汇总重算）"""
+        if self.keys or self.county_ids:
+            refresh_panel(keys=self.keys, county_ids=self.county_ids)
+
+
+@contextmanager
+def capture_changes(using=DEFAULT_DB_ALIAS):
+    """
+    在 with 块中用临时触发器记下该连接对面板源表的改动（SQL 控制台的写语句不经过 ORM 信号），
+    返回的 ChangeCapture 在块结束后填入改动的键。临时表和触发器只属于当前连接。
+    """
+    capture = ChangeCapture()
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_temp_master WHERE name = %s", [CAPTURE_FLAG_TABLE])
+        if cursor.fetchone() is None:
+            for sql in _capture_ddl():
+                cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {CAPTURE_FLAG_TABLE} VALUES (1)")
+        try:
+            yield capture
+        finally:
+            cursor.execute(f"DELETE FROM {CAPTURE_FLAG_TABLE}")
+            cursor.execute(f"SELECT DISTINCT county_id, year FROM {CHANGES_TABLE}")
+            for county_id, year in cursor.fetchall():
+                if county_id is None:
+                    continue
+                if year is None:
+                    capture.county_ids.add(county_id)
+                else:
+                    capture.keys.add((county_id, year))
+            cursor.execute(f"DELETE FROM {CHANGES_TABLE}")
+
+
+def panel_keys(fields, rows):
+    """导入块中的 (county_id, year) 键；fields 为行元组对应的字段名"""
+    if "county_id" not in fields or "year" not in fields:
+        return []
+    c, y = fields.index("county_id"), fields.index("year")
+    return [(row[c], row[y]) for row in rows]
+
+
+def refresh_for_rows(model, fields, rows):
+    """一块源表行写入后刷新面板（County 按县域刷新，事实表按 (县, 年) 刷新）"""
+    if model is County:
+        refresh_panel(county_ids=[row[fields.index("county_id")] for row in rows])
+    elif model in PANEL_SOURCES:
+        refresh_panel(keys=panel_keys(fields, rows))
+
@@ -1,14 +1,17 @@
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
-from core.models import UserTablePermission
+from django.core.cache import cache
+
+from core.table_versions import AUTH_TABLES, bump_versions, get_versions
 
 def admin_required(view_func):
     return user_passes_test(lambda u: u.is_superuser)(view_func)
 
 def data_entry_required(view_func):
-    return user_passes_test(lambda u: u.groups.filter(name="data_entry").exists())(view_func)
+    return user_passes_test(lambda u: user_in_group(u, "data_entry"))(view_func)
 
 def analyst_required(view_func):
-    return user_passes_test(lambda u: u.groups.filter(name="analyst").exists())(view_func)
+    return user_passes_test(lambda u: user_in_group(u, "analyst"))(view_func)
 
 
 # ---------------------------
@@ -33,21 +36,87 @@ TABLE_DISPLAY_NAMES = {
 }
 
 
+# ---------------------------
+# 用户权限矩阵（请求内记忆 + 跨请求缓存）
+# ---------------------------
+
+# 权限矩阵依赖的表：缓存键包含它们在变更日志中的版本号（见 core.table_versions），
+# 任一表变化后所有工作进程都会换用新键，不依赖缓存后端是否跨进程共享
+PERMISSION_TABLES = ("core_usertablepermission", *sorted(AUTH_TABLES))
+PERMISSION_CACHE_PREFIX = "perm_matrix:"
+PERMISSION_CACHE_TIMEOUT = getattr(settings, "PERMISSION_CACHE_TIMEOUT", 3600)
+
+
+def _permission_cache_key(user):
+    versions = get_versions(PERMISSION_TABLES)
+    generation = ".".join(str(versions[name]) for name in sorted(versions))
+    return f"{PERMISSION_CACHE_PREFIX}{generation}:{user.pk}:{int(user.is_superuser)}"
+
+
+def resolve_permission_matrix(user):
+    """
+    计算用户的权限矩阵（最多两条查询：用户特定权限 + 用户所在组）。
+    如果 user 已经 prefetch_related('table_permissions', 'groups')，则不发查询。
+    返回 {'groups': [组名], 'tables': {表: {'name', 'view', 'edit', 'source'}}}
+    """
+    custom = {perm.table_name: perm for perm in user.table_permissions.all()}
+    groups = [group.name for group in user.groups.all()]
+    is_data_entry = "data_entry" in groups
+
+    tables = {}
+    for table_key, table_display in TABLE_DISPLAY_NAMES.items():
+        user_perm = custom.get(table_key)
+        if user_perm:
+            # 使用用户特定权限
+            view_perm, edit_perm, source = user_perm.can_view, user_perm.can_edit, 'custom'
+        else:
+            # 使用角色权限：所有登录用户都可以查看；管理员和 data_entry 组可以编辑
+            view_perm, edit_perm, source = True, user.is_superuser or is_data_entry, 'role'
+        tables[table_key] = {
+            'name': table_display,
+            'view': view_perm,
+            'edit': edit_perm,
+            'source': source,  # 权限来源：'custom' 或 'role'
+        }
+    return {'groups': groups, 'tables': tables}
+
+
+def get_permission_matrix(user):
+    """获取用户的权限矩阵：先看本次请求内的记忆，再看缓存，最后才查数据库"""
+    matrix = getattr(user, "_permission_matrix", None)
+    if matrix is not None:
+        return matrix
+
+    key = _permission_cache_key(user)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = resolve_permission_matrix(user)
+        cache.set(key, matrix, PERMISSION_CACHE_TIMEOUT)
+    user._permission_matrix = matrix
+    return matrix
+
+
+def invalidate_permissions(*tables):
+    """权限相关的表变化后升级其版本号，所有进程中旧的权限矩阵缓存随之失效"""
+    bump_versions(*(tables or PERMISSION_TABLES), source="orm")
+
+
+def user_in_group(user, group_name):
+    """检查用户是否在指定的组中（使用权限矩阵中的组信息）"""
+    if not user or not user.is_authenticated:
+        return False
+    return group_name in get_permission_matrix(user)['groups']
+
+
 def has_table_view_permission(user, table_name):
     """检查用户是否有查看表的权限（优先检查用户特定权限，然后回退到角色权限）"""
     if not user or not user.is_authenticated:
         return False
     if user.is_superuser:
         return True
-    
-    # 优先检查用户特定权限
-    try:
-        user_perm = UserTablePermission.objects.get(user=user, table_name=table_name)
-        return user_perm.can_view
-    except UserTablePermission.DoesNotExist:
-        # 如果没有特定权限，回退到角色权限
-        # 所有登录用户都可以查看
-        return True
+    perm = get_permission_matrix(user)['tables'].get(table_name)
+    # 未知的表名回退到角色权限：所有登录用户都可以查看
+    return perm['view'] if perm else True
 
 
 def has_table_edit_permission(user, table_name):
@@ -56,47 +125,26 @@ def has_table_edit_permission(user, table_name):
         return False
     if user.is_superuser:
         return True
-    
-    # 优先检查用户特定权限
-    try:
-        user_perm = UserTablePermission.objects.get(user=user, table_name=table_name)
-        return user_perm.can_edit
-    except UserTablePermission.DoesNotExist:
-        # 如果没有特定权限，回退到角色权限
-        # data_entry 组有编辑权限
-        if user.groups.filter(name="data_entry").exists():
-            return True
-        # analyst 组只有查看权限
-        return False
+    perm = get_permission_matrix(user)['tables'].get(table_name)
+    if perm:
+        return perm['edit']
+    # 未知的表名回退到角色权限：data_entry 组有编辑权限
+    return user_in_group(user, "data_entry")
 
 
 def get_user_permissions(user):
     """获取用户对所有表的权限（包括用户特定权限和角色权限）"""
-    permissions = {}
-    # 获取用户的所有特定权限
-    user_perms = {perm.table_name: perm for perm in UserTablePermission.objects.filter(user=user)}
-    
-    for table_key, table_display in TABLE_DISPLAY_NAMES.items():
-        # 检查是否有用户特定权限
-        user_perm = user_perms.get(table_key)
-        if user_perm:
-            # 使用用户特定权限
-            view_perm = user_perm.can_view
-            edit_perm = user_perm.can_edit
-            source = 'custom'  # 标记为自定义权限
-        else:
-            # 使用角色权限
-            view_perm = has_table_view_permission(user, table_key)
-            edit_perm = has_table_edit_permission(user, table_key)
-            source = 'role'  # 标记为角色权限
-        
-        permissions[table_key] = {
-            'name': table_display,
-            'view': view_perm,
-            'edit': edit_perm,
-            'source': source,  # 权限来源：'custom' 或 'role'
-        }
-    return permissions
+    return {key: dict(perm) for key, perm in get_permission_matrix(user)['tables'].items()}
+
+
+# 视为编辑操作的 SQL 关键字
+EDIT_KEYWORDS = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'TRUNCATE']
+
+
+def has_edit_operation(sql_query):
+    """SQL 中是否包含编辑操作关键字"""
+    sql_upper = sql_query.strip().upper()
+    return any(keyword in sql_upper for keyword in EDIT_KEYWORDS)
 
 
 def can_execute_sql(user, sql_query):
@@ -104,23 +152,14 @@ def can_execute_sql(user, sql_query):
     if not user or not user.is_authenticated:
         return False, "未登录用户不能执行SQL"
     
-    sql_upper = sql_query.strip().upper()
-    
     # 检查是否包含编辑操作
-    edit_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'TRUNCATE']
-    has_edit_operation = any(keyword in sql_upper for keyword in edit_keywords)
-    
-    if has_edit_operation:
+    if has_edit_operation(sql_query):
         # 检查用户是否有任何表的编辑权限
         if user.is_superuser:
             return True, None
         
-        # 检查用户是否有任何表的编辑权限（通过特定权限或角色）
-        has_any_edit = False
-        for table_name in TABLE_DISPLAY_NAMES.keys():
-            if has_table_edit_permission(user, table_name):
-                has_any_edit = True
-                break
+        # 检查用户是否有任何表的编辑权限（通过特定权限或角色，只查一次权限矩阵）
+        has_any_edit = any(perm['edit'] for perm in get_permission_matrix(user)['tables'].values())
         
         if has_any_edit:
             return True, None
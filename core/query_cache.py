@@ -0,0 +1,117 @@
+"""
+只读 SQL 的查询结果缓存
+
+缓存键 = 规范化后的 SQL 文本 + 语句引用到的每张 core 表的版本号。
+写入会升级表版本号（见 core.table_versions），所以命中的结果一定是最新的；
+条目按 LRU 淘汰，同时受条目数和大致字节数两个上限约束。
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from core.permissions import has_edit_operation
+from core.table_versions import get_versions, tracked_tables
+
+QUERY_CACHE_MAX_ENTRIES = getattr(settings, "QUERY_CACHE_MAX_ENTRIES", 256)
+QUERY_CACHE_MAX_BYTES = getattr(settings, "QUERY_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+# 结果随时间或随机变化的函数，含有这些的语句不缓存
+NON_DETERMINISTIC = re.compile(r"\b(random|randomblob|now|current_date|current_time|current_timestamp|changes|last_insert_rowid)\b", re.I)
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# 字符串字面量 / 带引号的标识符 / 其余文本
+TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|[^'\"`\[]+")
+
+
+def normalize_sql(query: str):
+    """规范化 SQL：去掉首尾空白和末尾分号，合并引号外的连续空白，引号外统一小写"""
+    parts = []
+    for token in TOKEN.findall(query.strip().rstrip(";").strip()):
+        if token[0] in "'\"`[":
+            parts.append(token)
+        else:
+            parts.append(re.sub(r"\s+", " ", token).lower())
+    return "".join(parts)
+
+
+_all_tables = None
+
+
+def _database_tables():
+    global _all_tables
+    if _all_tables is None:
+        _all_tables = set(connection.introspection.table_names())
+    return _all_tables
+
+
+def referenced_tables(normalized_sql):
+    """
+    语句引用到的数据库表。
+    如果引用了 core 应用以外的表（如 auth_user），返回 None 表示不可缓存，
+    因为这些表的写入不会升级版本号。
+    """
+    tokens = {t.lower() for t in IDENTIFIER.findall(normalized_sql)}
+    tables = tokens & _database_tables()
+    if tables - tracked_tables():
+        return None
+    return tables
+
+
+class QueryResultCache:
+    """线程安全的 LRU 结果缓存"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, result, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (result, size)
+            self._size += size
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+result_cache = QueryResultCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_MAX_BYTES)
+
+
+def cache_key_for(query: str):
+    """返回查询的缓存键；写语句、不确定性语句或引用了非 core 表的语句返回 None"""
+    if has_edit_operation(query):
+        return None
+    normalized = normalize_sql(query)
+    if not normalized or ";" in normalized or NON_DETERMINISTIC.search(normalized):
+        return None
+    tables = referenced_tables(normalized)
+    if not tables:
+        return None
+    versions = get_versions(sorted(tables))
+    return (normalized, tuple(sorted(versions.items())))
@@ -0,0 +1,202 @@
+"""
+执行前的 SQL 代价估算（基于 SQLite 的 EXPLAIN QUERY PLAN）
+
+控制台 SQL 和 AI 生成的 SQL 在执行前先取执行计划：
+- 识别全表扫描（SCAN）、索引查找（SEARCH）、临时 B 树（排序 / 分组 / 去重）、
+  相关子查询，以及没有索引可用的嵌套循环连接（笛卡尔积的典型形态）；
+- 用各表的行数估算需要访问的行数，作为语句的“代价”；
+- 代价超过 SQL_COST_BUDGET 的语句被拒绝，或降级为只返回少量行的预览（见 core.sql_utils）。
+
+估算是粗略的：只用于拦截明显失控的语句，不追求精确。
+"""
+import math
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.table_versions import get_versions, tracked_tables
+
+SQL_COST_BUDGET = getattr(settings, "SQL_COST_BUDGET", 5_000_000)
+# 超出预算时的处理方式："preview" 降级为预览，"reject" 直接拒绝
+SQL_COST_ACTION = getattr(settings, "SQL_COST_ACTION", "preview")
+
+# 无法得知行数的表（子查询、CTE、非 core 表）按此估计
+DEFAULT_TABLE_ROWS = 1000
+# 走索引的等值查找、范围查找大致命中的比例
+INDEX_EQ_SELECTIVITY = 0.01
+INDEX_RANGE_SELECTIVITY = 0.25
+
+_LOOP_RE = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)")
+
+# 别名后面可能紧跟的关键字（不是别名）
+_NOT_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using",
+    "group", "order", "limit", "union", "intersect", "except", "having", "window", "set",
+    "values", "as", "indexed", "not",
+}
+
+
+def explain(query, using=DEFAULT_DB_ALIAS):
+    """返回 EXPLAIN QUERY PLAN 的 (id, parent, detail) 列表"""
+    with connections[using].cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + query)
+        return [(row[0], row[1], row[-1]) for row in cursor.fetchall()]
+
+
+def table_row_counts(using=DEFAULT_DB_ALIAS):
+    """core 各表的行数（按表版本号缓存，数据未变化时不重复 COUNT）"""
+    versions = get_versions(tracked_tables())
+    keys = {f"rowcount:{table}:{version}": table for table, version in versions.items()}
+    found = cache.get_many(keys)
+    counts = {keys[key]: value for key, value in found.items()}
+    missing = [table for key, table in keys.items() if key not in found]
+    if missing:
+        with connections[using].cursor() as cursor:
+            for table in missing:
+                cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+                counts[table] = cursor.fetchone()[0]
+        cache.set_many({f"rowcount:{table}:{versions[table]}": counts[table] for table in missing}, None)
+    return counts
+
+
+def table_aliases(query, tables):
+    """从 SQL 文本中找出 “表名 [AS] 别名”，返回 {别名: 表名}（新版 SQLite 的计划里只显示别名）"""
+    aliases = {}
+    for table in tables:
+        for match in re.finditer(rf'\b"?{table}"?\s+(?:AS\s+)?"?(\w+)"?', query, re.IGNORECASE):
+            alias = match.group(1)
+            if alias.lower() not in _NOT_ALIAS:
+                aliases[alias] = table
+    return aliases
+
+
+def _loop_rows(kind, detail, table_rows):
+    """估计一个 SCAN / SEARCH 循环每次执行访问的行数"""
+    if kind == "SCAN":
+        if "CONSTANT ROW" in detail:
+            return 1
+        return table_rows
+    if "USING" not in detail:
+        # 没有可用索引的 SEARCH（如相关子查询里的过滤）仍要读整表
+        return table_rows
+    if "PRIMARY KEY" in detail and "=" in detail and ">" not in detail and "<" not in detail:
+        return 1
+    if ">" in detail or "<" in detail:
+        return max(1, table_rows * INDEX_RANGE_SELECTIVITY)
+    return max(1, table_rows * INDEX_EQ_SELECTIVITY)
+
+
+class _Estimator:
+    def __init__(self, steps, counts):
+        self.children = {}
+        for node_id, parent, detail in steps:
+            self.children.setdefault(parent, []).append((node_id, detail))
+        self.counts = counts
+        self.named_rows = {}  # 子查询 / CTE 名 -> 估计产出行数
+        self.findings = []
+
+    def rows_of(self, name):
+        if name in self.counts:
+            return self.counts[name]
+        return self.named_rows.get(name, DEFAULT_TABLE_ROWS)
+
+    def estimate(self, parent=0):
+        """估计 parent 下一层计划的 (产出行数, 代价)；同层的循环按嵌套循环相乘"""
+        rows, cost, loops = 1, 0, 0
+        for node_id, detail in self.children.get(parent, []):
+            match = _LOOP_RE.match(detail)
+            if match:
+                kind, name = match.groups()
+                loops += 1
+                if kind == "SCAN" and loops > 1 and "CONSTANT ROW" not in detail:
+                    self.findings.append(f"连接时对 {name} 全表扫描（没有可用索引，形成嵌套循环 / 笛卡尔积）")
+                elif kind == "SCAN" and "CONSTANT ROW" not in detail:
+                    self.findings.append(f"全表扫描 {name}")
+                table_rows = self.rows_of(name)
+                if "AUTOMATIC" in detail:
+                    # 临时建索引：每次执行都要先读一遍整表
+                    self.findings.append(f"为 {name} 临时创建自动索引（缺少合适的索引）")
+                    cost += table_rows
+                rows *= _loop_rows(kind, detail, table_rows)
+                cost += rows
+            elif "TEMP B-TREE" in detail:
+                self.findings.append(f"使用临时 B 树：{detail}")
+                cost += rows * math.log2(rows + 1)
+            elif detail.startswith("MULTI-INDEX OR"):
+                sub_rows, sub_cost = self._sum_children(node_id)
+                loops += 1
+                rows *= sub_rows
+                cost += rows + sub_cost
+            else:
+                # CO-ROUTINE / MATERIALIZE / 子查询 / 复合查询等容器节点
+                if detail.startswith("COMPOUND"):
+                    sub_rows, sub_cost = self._sum_children(node_id)
+                    rows *= sub_rows
+                else:
+                    sub_rows, sub_cost = self.estimate(node_id)
+                for prefix in ("MATERIALIZE ", "CO-ROUTINE "):
+                    if detail.startswith(prefix):
+                        self.named_rows[detail[len(prefix):]] = sub_rows
+                if "CORRELATED" in detail:
+                    self.findings.append(f"相关子查询：每行执行一次（{detail}）")
+                    cost += sub_cost * rows
+                else:
+                    cost += sub_cost
+        return rows, cost
+
+    def _sum_children(self, parent):
+        total_rows, total_cost = 0, 0
+        for node_id, _detail in self.children.get(parent, []):
+            sub_rows, sub_cost = self.estimate(node_id)
+            total_rows += sub_rows
+            total_cost += sub_cost
+        return total_rows, total_cost
+
+    def lines(self):
+        """按计划树顺序返回缩进后的计划描述，用于页面显示"""
+        lines = []
+
+        def walk(parent, depth):
+            for node_id, detail in self.children.get(parent, []):
+                lines.append("  " * depth + detail)
+                walk(node_id, depth + 1)
+
+        walk(0, 0)
+        return lines
+
+
+def analyze_query(query, budget=None, using=DEFAULT_DB_ALIAS):
+    """
+    取执行计划并估算代价，返回：
+    - steps: 缩进后的计划描述（每步一行）
+    - findings: 识别出的高代价特征（全表扫描、临时 B 树、无索引连接……）
+    - cost: 估计访问的行数
+    - budget / over_budget: 预算及是否超出
+    语句无法 EXPLAIN（如语法错误）时返回 None，交给正常执行去报告错误。
+    """
+    budget = SQL_COST_BUDGET if budget is None else budget
+    try:
+        steps = explain(query, using)
+    except Exception:
+        return None
+
+    counts = table_row_counts(using)
+    for alias, table in table_aliases(query, list(counts)).items():
+        counts.setdefault(alias, counts[table])
+    estimator = _Estimator(steps, counts)
+    _rows, cost = estimator.estimate()
+    cost = int(cost)
+    return {
+        "steps": estimator.lines(),
+        "findings": estimator.findings,
+        "cost": cost,
+        "budget": budget,
+        "over_budget": cost > budget,
+    }
+
+
+def plan_message(plan):
+    """超出预算时的提示文本"""
+    return f"预估代价约 {plan['cost']:,} 行访问，超过预算 {plan['budget']:,}"
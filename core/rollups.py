@@ -0,0 +1,210 @@
+"""
+省×年汇总立方体（core_rollupcell）
+
+在县域年度面板（见 core.panel）之上预先计算三个层级的分组汇总：
+全国×年（year）、省×年（province）、省×市×年（city），
+每个分组、每个指标一行，保存 count / sum / min / max 和以 population_total 为权重的加权和。
+省级报表、下钻页面只读取分组行，代价与分组数有关，与县的数量无关。
+
+只有省×市×年一层直接从面板计算，省×年、全国×年由下一层级的汇总行合并，不再扫描面板。
+面板刷新时记下受影响的 (省, 市, 年)，只重算这些分组（以及它们所属的省×年、年分组），
+面板整表重建时立方体也整表重建。
+"""
+from django.db import connection, transaction
+
+from core.models import CountyYearPanel, RollupCell
+from core.table_versions import bump_versions
+
+# 参与汇总的指标：面板列名 -> 显示名
+ROLLUP_INDICATORS = {
+    "gdp_total": "GDP（亿元）",
+    "fiscal_revenue": "财政收入（亿元）",
+    "per_capita_income": "人均收入（元）",
+    "population_total": "总人口",
+    "urbanization_rate": "城镇化率",
+    "unemployment_rate": "失业率",
+    "migrant_workers": "外出务工人数",
+    "social_security_rate": "社保覆盖率",
+    "pct_village_with_hard_road": "硬化路覆盖率",
+    "pct_village_with_electricity": "通电率",
+    "broadband_coverage": "宽带覆盖率",
+    "water_supply_coverage": "供水覆盖率",
+    "sanitation_coverage": "卫生设施覆盖率",
+    "agri_sales_volume": "农产品销量",
+    "agri_sales_value": "农产品销售额（亿元）",
+}
+
+# 加权平均使用的权重列
+WEIGHT_COLUMN = "population_total"
+
+# 层级 -> (分组表达式, 下钻到的下一层级)
+ROLLUP_LEVELS = {
+    "year": (("''", "''", "year"), "province"),
+    "province": (("province", "''", "year"), "city"),
+    "city": (("province", "COALESCE(city, '')", "year"), None),
+}
+
+# 每条语句最多携带的分组数
+GROUP_BATCH_SIZE = 1000
+
+
+def _level_scope(level, groups):
+    """
+    层级的重算范围 -> (scope 公用表, 面板上的条件, 立方体上的条件, 参数)；groups 为 None 表示全部。
+    groups 为 (省, 市, 年) 列表（市为空字符串表示没有地市）。
+    """
+    if groups is None:
+        return "", "1 = 1", "1 = 1", []
+    if level == "year":
+        keys = sorted({(y,) for _, _, y in groups})
+        columns, panel_columns = ["year"], ["year"]
+    elif level == "province":
+        keys = sorted({(p, y) for p, _, y in groups})
+        columns, panel_columns = ["province", "year"], ["province", "year"]
+    else:
+        keys = sorted(groups)
+        columns, panel_columns = ["province", "city", "year"], ["province", "COALESCE(city, '')", "year"]
+    row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    scope = f"scope({', '.join(columns)}) AS (VALUES {', '.join([row] * len(keys))})"
+    select = f"(SELECT {', '.join(columns)} FROM scope)"
+    return (
+        scope,
+        f"({', '.join(panel_columns)}) IN {select}",
+        f"({', '.join(columns)}) IN {select}",
+        [v for key in keys for v in key],
+    )
+
+
+def _with(*ctes):
+    ctes = [cte for cte in ctes if cte]
+    return f"WITH {', '.join(ctes)}\n" if ctes else ""
+
+
+def _insert_columns():
+    return (f"INSERT INTO {RollupCell._meta.db_table} "
+            f"(level, province, city, year, indicator, count, sum, min, max, weighted_sum, weight)\n")
+
+
+def _city_sql(where, scope=""):
+    """
+    从面板生成省×市×年的汇总行：面板只扫描一遍，分组 g 一次算出所有指标的聚合，
+    再按指标展开成行（g 被引用多次，SQLite 会先物化它，不会重复扫描面板）。
+    """
+    panel = CountyYearPanel._meta.db_table
+    aggregates, branches = [], []
+    for i, column in enumerate(ROLLUP_INDICATORS):
+        aggregates.append(
+            f"COUNT({column}) AS n{i}, SUM({column}) AS s{i}, MIN({column}) AS lo{i}, MAX({column}) AS hi{i}, "
+            f"SUM({column} * {WEIGHT_COLUMN}) AS ws{i}, "
+            f"SUM(CASE WHEN {column} IS NOT NULL THEN {WEIGHT_COLUMN} END) AS w{i}"
+        )
+        branches.append(
+            f"SELECT 'city', province, city, year, '{column}', n{i}, s{i}, lo{i}, hi{i}, ws{i}, w{i} FROM g"
+        )
+    groups = (
+        f"g AS (SELECT province, COALESCE(city, '') AS city, year, {', '.join(aggregates)} "
+        f"FROM {panel} WHERE {where} GROUP BY province, COALESCE(city, ''), year)"
+    )
+    return _with(scope, groups) + _insert_columns() + "\nUNION ALL\n".join(branches)
+
+
+def _parent_sql(level, where, scope=""):
+    """由下一层级的汇总行合并出 省×年 / 全国×年 的汇总行（count、sum、加权和相加，min / max 取极值）"""
+    (province, city, year), child = ROLLUP_LEVELS[level]
+    return (
+        _with(scope) + _insert_columns()
+        + f"SELECT '{level}', {province}, {city}, {year}, indicator, "
+        f"SUM(count), SUM(sum), MIN(min), MAX(max), SUM(weighted_sum), SUM(weight) "
+        f"FROM {RollupCell._meta.db_table} WHERE level = '{child}' AND {where} "
+        f"GROUP BY {province}, {year}, indicator"
+    )
+
+
+def rebuild_rollups(groups=None, cursor=None):
+    """
+    重算受影响分组的汇总行；groups 为 (省, 市, 年) 集合，None 表示整个立方体。
+    cursor 由面板刷新传入，与面板写入处在同一事务中；不传时自行开启事务。
+    """
+    if groups is None:
+        batches = [None]
+    else:
+        groups = sorted({(p, c or "", int(y)) for p, c, y in groups})
+        if not groups:
+            return
+        batches = [groups[i:i + GROUP_BATCH_SIZE] for i in range(0, len(groups), GROUP_BATCH_SIZE)]
+
+    if cursor is None:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _rebuild(cursor, batches)
+    else:
+        _rebuild(cursor, batches)
+    bump_versions(RollupCell, source="derived")
+
+
+def _rebuild(cursor, batches):
+    """
+    自下而上重算：省×市×年从面板生成，省×年、全国×年由下一层级的汇总行合并。
+    每一层级的所有批次完成后再算上一层级，上层分组只重算一次。
+    """
+    for level in ("city", "province", "year"):
+        for batch in batches:
+            scope, panel_where, cube_where, params = _level_scope(level, batch)
+            cursor.execute(
+                f"{_with(scope)}DELETE FROM {RollupCell._meta.db_table} WHERE level = %s AND {cube_where}",
+                params + [level],
+            )
+            if level == "city":
+                cursor.execute(_city_sql(panel_where, scope), params)
+            else:
+                cursor.execute(_parent_sql(level, cube_where, scope), params)
+
+
+def panel_groups(cursor, cte, where, params):
+    """面板中满足条件的行所属的 (省, 市, 年) 分组（刷新前后各取一次，省或市变化时新旧分组都要重算）"""
+    cursor.execute(
+        f"{cte}SELECT DISTINCT province, COALESCE(city, ''), year FROM {CountyYearPanel._meta.db_table} WHERE {where}",
+        params,
+    )
+    return set(cursor.fetchall())
+
+
+# ---------------------------
+# 读取
+# ---------------------------
+
+def _cell_values(cell):
+    return {
+        "count": cell.count,
+        "sum": cell.sum,
+        "min": cell.min,
+        "max": cell.max,
+        "mean": cell.mean,
+        "weighted_mean": cell.weighted_mean,
+    }
+
+
+def get_rollup(level, year=None, province=None, city=None, indicators=None):
+    """
+    读取某一层级的分组汇总，返回 [{province, city, year, indicators: {指标: {count, sum, min, max, mean, weighted_mean}}}]，
+    按 年 / 省 / 市 排序。year / province / city 用于下钻时筛选上一层级选中的分组。
+    """
+    if level not in ROLLUP_LEVELS:
+        raise ValueError(f"未知的汇总层级：{level}")
+    cells = RollupCell.objects.filter(level=level)
+    if indicators:
+        cells = cells.filter(indicator__in=indicators)
+    if year is not None:
+        cells = cells.filter(year=year)
+    if province is not None:
+        cells = cells.filter(province=province)
+    if city is not None:
+        cells = cells.filter(city=city)
+
+    groups = {}
+    for cell in cells.order_by("year", "province", "city"):
+        key = (cell.province, cell.city, cell.year)
+        group = groups.setdefault(key, {
+            "province": cell.province, "city": cell.city, "year": cell.year, "indicators": {},
+        })
+        group["indicators"][cell.indicator] = _cell_values(cell)
+    return list(groups.values())
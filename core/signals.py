@@ -0,0 +1,133 @@
+from django.contrib.auth.models import Group, User
+from django.db.backends.signals import connection_created
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_migrate, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import AIPromptConfig, County, CountyYearPanel, RollupCell
+from core.panel import PANEL_SOURCES, defer_version_bump, refresh_panel
+from core.permissions import invalidate_permissions
+from core.sqlite_tuning import configure_sqlite_connection
+from core.table_versions import bump_versions, tracked_tables
+
+
+# ---------------------------
+# 表数据变更 -> 升级表版本号（统计缓存、查询结果缓存随之失效）
+# ---------------------------
+
+@receiver(post_save)
+@receiver(post_delete)
+def core_table_changed(sender, **kwargs):
+    """
+    数据表的行保存或删除后，升级该表的版本号（批量删除时合并为一次）。
+    只处理参与版本管理的表：AI 答案缓存、中断记录等日志表的写入不写变更日志。
+    """
+    if sender._meta.db_table in tracked_tables():
+        if not defer_version_bump(sender):
+            bump_versions(sender, source="orm")
+
+
+# ---------------------------
+# 源表数据变更 -> 刷新县域年度面板中受影响的行
+# （批量删除、级联删除在 deferred_refresh 中进行，refresh_panel 只收集键，结束时合并刷新）
+# ---------------------------
+
+@receiver(pre_save)
+def remember_panel_key(sender, instance, **kwargs):
+    """
+    事实表的行被修改时需要原来的 (县, 年)：改了县或年份时旧键的面板行也要刷新。
+    从数据库读取的实例已记下原键（见 PanelSource.from_db），只有手工构造或延迟加载了键字段的实例才查询一次。
+    """
+    # 手工构造但带主键的实例 _state.adding 也为 True，保存时可能是更新，因此只按主键判断
+    if sender not in PANEL_SOURCES or sender is County or instance.pk is None:
+        return
+    loaded = getattr(instance, "_panel_loaded_key", None)
+    if loaded is None or None in loaded:
+        instance._panel_loaded_key = (
+            sender.objects.filter(pk=instance.pk).values_list("county_id", "year").first()
+        )
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def panel_source_changed(sender, instance, **kwargs):
+    if sender not in PANEL_SOURCES:
+        return
+    if sender is County:
+        refresh_panel(county_ids=[instance.pk])
+        return
+    key = (instance.county_id, instance.year)
+    keys = [key]
+    previous = getattr(instance, "_panel_loaded_key", None)
+    if previous and previous != key:
+        keys.append(previous)
+    refresh_panel(keys=keys)
+    instance._panel_loaded_key = key
+
+
+@receiver(post_migrate)
+def build_panel_after_migrate(sender, using, **kwargs):
+    """
+    migrate 完成后，面板为空而源表已有数据时（升级到带面板的版本）整表生成面板和汇总立方体。
+    迁移中不调用应用代码，这里运行时表结构已是最新。
+    """
+    if sender.label != "core":
+        return
+    tables = connections[using].introspection.table_names()
+    if CountyYearPanel._meta.db_table not in tables or RollupCell._meta.db_table not in tables:
+        return  # 只迁移到了更早的版本
+    if CountyYearPanel.objects.using(using).exists() or not County.objects.using(using).exists():
+        return
+    refresh_panel(using=using)
+
+
+# ---------------------------
+# Prompt 配置变更 -> 清理旧指纹下的 AI 答案缓存
+# ---------------------------
+
+@receiver(post_save, sender=AIPromptConfig)
+def prompt_config_changed(sender, instance, **kwargs):
+    """保存 Prompt 后，删除不属于新配置指纹的缓存答案"""
+    from core.ai_cache import prompt_fingerprint, purge_answers
+    from core.ai_utils import get_ai_config
+
+    prompt_config = {
+        'table_schema': instance.table_schema,
+        'system_prompt': instance.system_prompt,
+        'user_prompt_template': instance.user_prompt_template,
+    }
+    purge_answers(keep_fingerprint=prompt_fingerprint(prompt_config, get_ai_config()['model']))
+
+
+# ---------------------------
+# 用户权限、角色、管理员身份变更 -> 升级权限相关表的版本号（权限矩阵缓存随之失效）
+# UserTablePermission 是 core 表，由 core_table_changed 升级
+# ---------------------------
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """is_superuser 等字段可能变化；登录时只更新 last_login，不影响权限"""
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_permissions("auth_user")
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, action, **kwargs):
+    """user.groups.add/remove/clear 或 group.user_set.add/remove/clear"""
+    if action.startswith("post_"):
+        invalidate_permissions("auth_user_groups")
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    invalidate_permissions("auth_group")
+
+
+# ---------------------------
+# 新建数据库连接 -> 设置 SQLite 参数（WAL、mmap、页缓存等）
+# ---------------------------
+
+connection_created.connect(configure_sqlite_connection, dispatch_uid="core_sqlite_tuning")
@@ -0,0 +1,143 @@
+"""
+用户 SQL 的执行预算（墙钟时间 + SQLite 虚拟机指令数）
+
+通过 sqlite3 连接的 set_progress_handler 实现：SQLite 每执行 PROGRESS_HANDLER_INTERVAL 条
+虚拟机指令回调一次，超出预算时回调返回非零，SQLite 随即中断当前语句（interrupted），
+语句的修改被回滚，连接可以继续使用。
+
+- 预算按角色配置（settings.SQL_EXECUTION_BUDGETS：superuser / data_entry / analyst / default）；
+- 只统计语句实际在 SQLite 中执行的时间：流式输出时，等待客户端读取的时间不计入；
+- 被中断的语句记录到 InterruptedQuery，供后续加索引或调整 Prompt 时参考。
+"""
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connection as default_connection
+
+from core.models import InterruptedQuery
+from core.permissions import user_in_group
+
+# progress handler 每执行这么多条虚拟机指令回调一次
+PROGRESS_HANDLER_INTERVAL = 1000
+
+DEFAULT_EXECUTION_BUDGETS = {
+    "superuser": {"seconds": 60, "steps": 2_000_000_000},
+    "data_entry": {"seconds": 20, "steps": 500_000_000},
+    "analyst": {"seconds": 10, "steps": 200_000_000},
+    "default": {"seconds": 5, "steps": 100_000_000},
+}
+SQL_EXECUTION_BUDGETS = getattr(settings, "SQL_EXECUTION_BUDGETS", DEFAULT_EXECUTION_BUDGETS)
+
+ROLE_DISPLAY_NAMES = {
+    "superuser": "管理员",
+    "data_entry": "数据录入员",
+    "analyst": "分析师",
+    "default": "普通用户",
+}
+
+
+class ExecutionBudget(NamedTuple):
+    """一条语句的执行预算；seconds / steps 为 None 表示不限制"""
+    role: str
+    seconds: float = None
+    steps: int = None
+
+    def limited(self, steps):
+        """收紧指令数预算（例如降级为预览时）"""
+        return self._replace(steps=steps if self.steps is None else min(self.steps, steps))
+
+
+def user_role(user):
+    """预算所用的角色：管理员 > data_entry > analyst > default"""
+    if user is None or not user.is_authenticated:
+        return "default"
+    if user.is_superuser:
+        return "superuser"
+    for role in ("data_entry", "analyst"):
+        if user_in_group(user, role):
+            return role
+    return "default"
+
+
+def budget_for(user):
+    """用户执行 SQL 的预算"""
+    role = user_role(user)
+    config = SQL_EXECUTION_BUDGETS.get(role) or SQL_EXECUTION_BUDGETS.get("default") or {}
+    return ExecutionBudget(role, config.get("seconds"), config.get("steps"))
+
+
+class QueryInterrupted(Exception):
+    """语句超出执行预算，已被 SQLite 中断"""
+
+    def __init__(self, guard):
+        self.guard = guard
+        budget = guard.budget
+        if guard.reason == "time":
+            limit = f"时间上限 {budget.seconds} 秒"
+        else:
+            limit = f"指令数上限 {budget.steps:,}"
+        super().__init__(
+            f"查询超出{ROLE_DISPLAY_NAMES.get(budget.role, budget.role)}的执行预算（{limit}），已取消："
+            f"已运行 {guard.elapsed:.1f} 秒，约 {guard.steps:,} 条指令。请添加过滤条件或使用索引列"
+        )
+
+
+class BudgetGuard:
+    """
+    progress handler：累计执行时间和指令数，超出预算时中断语句。
+    可以多次进入（例如每次 fetchmany），时间和指令数在多次之间累计。
+    """
+
+    def __init__(self, budget, connection=None):
+        self.budget = budget
+        self.connection = connection or default_connection
+        self.calls = 0
+        self.elapsed = 0.0
+        self.started = None
+        self.reason = None
+
+    @property
+    def steps(self):
+        return self.calls * PROGRESS_HANDLER_INTERVAL
+
+    def __call__(self):
+        self.calls += 1
+        if self.budget.steps is not None and self.steps > self.budget.steps:
+            self.reason = "steps"
+            return 1
+        if self.budget.seconds is not None and self.elapsed + time.monotonic() - self.started > self.budget.seconds:
+            self.reason = "time"
+            return 1
+        return 0
+
+    def __enter__(self):
+        self.connection.ensure_connection()
+        self.connection.connection.set_progress_handler(self, PROGRESS_HANDLER_INTERVAL)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed += time.monotonic() - self.started
+        self.connection.connection.set_progress_handler(None, PROGRESS_HANDLER_INTERVAL)
+        if exc_type is not None and issubclass(exc_type, OperationalError) and self.reason:
+            raise QueryInterrupted(self) from exc
+        return False
+
+
+def record_interrupted(user, query, error, plan=None, preview=False):
+    """记录被中断的语句（记录失败不影响请求本身）"""
+    guard = error.guard
+    try:
+        InterruptedQuery.objects.create(
+            user=user if user is not None and user.is_authenticated else None,
+            role=guard.budget.role,
+            sql=query,
+            reason=guard.reason,
+            elapsed_ms=int(guard.elapsed * 1000),
+            steps=guard.steps,
+            estimated_cost=plan["cost"] if plan else None,
+            preview=preview,
+        )
+    except DatabaseError:
+        pass
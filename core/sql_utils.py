@@ -0,0 +1,313 @@
+"""
+用户 SQL 的统一执行层
+
+首页、SQL 控制台和智能查询都通过这里执行 SQL：
+- 用 fetchmany 分批读取，达到行数上限或字节上限即停止，不会把整张表读进内存；
+- 结果带 truncated 标记，页面据此显示“已截断，N+ 行”；
+- 只读语句的结果进入查询结果缓存（见 core.query_cache），数据未变化时不再访问 SQLite；
+- stream_sql_csv 以 CSV 流的形式输出完整结果，供“下载完整结果”使用；
+- 执行前先用 EXPLAIN QUERY PLAN 估算代价（见 core.query_plan），超出预算的语句
+  被拒绝或降级为预览：只取前 SQL_PREVIEW_ROWS 行，并进一步收紧指令数预算；
+- 每条语句都受执行用户所在角色的时间 / 指令数预算约束（见 core.sql_budget），超出即中断；
+- 只读语句在只读数据库别名上执行，写语句才使用 default（见 core.db_router）。
+"""
+import csv
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db_router import alias_for_sql
+from core.panel import PANEL_SOURCE_TABLES, capture_changes, refresh_panel
+from core.permissions import has_edit_operation
+from core.query_cache import cache_key_for, result_cache
+from core.query_plan import SQL_COST_ACTION, analyze_query, plan_message
+from core.sql_budget import BudgetGuard, QueryInterrupted, budget_for, record_interrupted
+from core.table_versions import SCHEMA_CHANGE, bump_versions, written_tables
+
+SQL_RESULT_MAX_ROWS = getattr(settings, "SQL_RESULT_MAX_ROWS", 1000)
+SQL_RESULT_MAX_BYTES = getattr(settings, "SQL_RESULT_MAX_BYTES", 2 * 1024 * 1024)
+SQL_FETCH_BATCH_SIZE = getattr(settings, "SQL_FETCH_BATCH_SIZE", 500)
+SQL_PREVIEW_ROWS = getattr(settings, "SQL_PREVIEW_ROWS", 100)
+SQL_PREVIEW_MAX_STEPS = getattr(settings, "SQL_PREVIEW_MAX_STEPS", 20_000_000)
+
+class QueryTooExpensive(Exception):
+    """预估代价超出预算且不能降级为预览的语句"""
+
+    def __init__(self, plan):
+        super().__init__(f"{plan_message(plan)}，已拒绝执行")
+        self.plan = plan
+
+
+def is_select(query):
+    return query.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+def guard_query(query, using):
+    """
+    执行前的代价检查，返回 (实际执行的 SQL, 执行计划, 是否为预览)。
+    超出预算时：只读查询在 SQL_COST_ACTION == "preview" 下改写为带 LIMIT 的预览，否则抛出 QueryTooExpensive。
+    """
+    plan = analyze_query(query, using=using)
+    if plan is None or not plan["over_budget"]:
+        return query, plan, False
+    if SQL_COST_ACTION == "preview" and is_select(query) and not has_edit_operation(query):
+        body = query.strip().rstrip(";")
+        return f"SELECT * FROM (\n{body}\n) LIMIT {SQL_PREVIEW_ROWS + 1}", plan, True
+    raise QueryTooExpensive(plan)
+
+
+def _budget(user, preview):
+    """用户的执行预算；预览查询的指令数进一步收紧到 SQL_PREVIEW_MAX_STEPS"""
+    budget = budget_for(user)
+    return budget.limited(SQL_PREVIEW_MAX_STEPS) if preview else budget
+
+
+def _write_capture(query, using):
+    """写语句执行期间记下面板源表被改动的键（见 core.panel.capture_changes）；只读语句不需要"""
+    if using == DEFAULT_DB_ALIAS and has_edit_operation(query):
+        return capture_changes(using)
+    return nullcontext()
+
+
+def _after_write(query, changes=None):
+    """
+    SQL 写语句执行（并已提交）后：按语句的目标表升级版本号（认不出目标表时升级全部表）；
+    写入了面板源表时按 changes 中记下的键刷新面板，没有记录或改了表结构时整表重建。
+    必须在执行预算（BudgetGuard）之外调用：面板刷新不是用户语句的一部分，不能被预算中断。
+    """
+    tables = written_tables(query)
+    if tables:
+        bump_versions(*tables, source="sql")
+    if tables & PANEL_SOURCE_TABLES:
+        if changes is None or SCHEMA_CHANGE.search(query):
+            refresh_panel()
+        else:
+            changes.refresh()
+
+
+def _row_size(row):
+    """粗略估计一行在页面上占用的字节数"""
+    return sum(len(str(value)) for value in row)
+
+
+def _fetch_limited(cursor, max_rows, max_bytes):
+    """分批读取结果，达到行数或字节上限即停止；返回 (列名, 行, 字节数, 是否截断)"""
+    columns = [c[0] for c in cursor.description]
+    rows = []
+    size = 0
+    truncated = False
+    while not truncated:
+        batch = cursor.fetchmany(min(SQL_FETCH_BATCH_SIZE, max_rows - len(rows) + 1))
+        if not batch:
+            break
+        for row in batch:
+            size += _row_size(row)
+            if len(rows) >= max_rows or (rows and size > max_bytes):
+                truncated = True
+                break
+            rows.append(row)
+    return columns, rows, size, truncated
+
+
+def execute_sql(query: str, max_rows=None, max_bytes=None, use_cache=True, cost_guard=True, user=None):
+    """
+    执行 SQL，返回：
+    - columns: 列名（写操作为空列表）
+    - rows: 行数据（最多 max_rows 行 / max_bytes 字节）
+    - error: 错误信息（如有）
+    - rowcount: 返回的行数，或写操作受影响的行数
+    - truncated: 结果是否被截断（实际行数多于 rowcount）
+    - is_query: 是否为有结果集的查询语句
+    - cached: 结果是否来自查询结果缓存
+    - plan: 执行计划与代价估算（cost_guard=False 或无法 EXPLAIN 时为 None）
+    - preview: 是否因代价超出预算而降级为预览
+    执行受 user 所在角色的执行预算约束，超出时返回错误并记录到 InterruptedQuery。
+    """
+    max_rows = SQL_RESULT_MAX_ROWS if max_rows is None else max_rows
+    max_bytes = SQL_RESULT_MAX_BYTES if max_bytes is None else max_bytes
+
+    key = cache_key_for(query) if use_cache else None
+    if key is not None:
+        key += (max_rows, max_bytes)
+        cached = result_cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    using = alias_for_sql(query)
+    sql, plan, preview = query, None, False
+    try:
+        if cost_guard:
+            sql, plan, preview = guard_query(query, using)
+            if preview:
+                max_rows = min(max_rows, SQL_PREVIEW_ROWS)
+
+        conn = connections[using]
+        with _write_capture(query, using) as changes:
+            with conn.cursor() as cursor, BudgetGuard(_budget(user, preview), conn):
+                cursor.execute(sql)
+                is_query = bool(cursor.description)
+                if is_query:
+                    columns, rows, size, truncated = _fetch_limited(cursor, max_rows, max_bytes)
+                else:
+                    rowcount = cursor.rowcount
+
+        # 无查询结果（如 UPDATE, INSERT, DELETE）：语句已提交，
+        # 写操作绕过了 ORM 信号，需要手动升级表版本号、刷新面板（不计入执行预算）
+        if not is_query:
+            _after_write(query, changes)
+            return {"columns": [], "rows": [], "error": None, "rowcount": rowcount,
+                    "truncated": False, "is_query": False, "cached": False,
+                    "plan": plan, "preview": False}
+
+        result = {"columns": columns, "rows": rows, "error": None, "rowcount": len(rows),
+                  "truncated": truncated, "is_query": True, "cached": False,
+                  "plan": plan, "preview": preview}
+        if key is not None:
+            result_cache.set(key, result, size)
+        return result
+
+    except QueryTooExpensive as e:
+        return {"columns": [], "rows": [], "error": str(e), "rowcount": 0,
+                "truncated": False, "is_query": False, "cached": False,
+                "plan": e.plan, "preview": False}
+    except QueryInterrupted as e:
+        record_interrupted(user, query, e, plan, preview)
+        return {"columns": [], "rows": [], "error": str(e), "rowcount": 0,
+                "truncated": False, "is_query": False, "cached": False,
+                "plan": plan, "preview": False}
+    except Exception as e:
+        return {"columns": [], "rows": [], "error": str(e), "rowcount": 0,
+                "truncated": False, "is_query": False, "cached": False,
+                "plan": plan, "preview": False}
+
+
+def iter_sql_batches(query: str, max_rows=None, max_bytes=None, user=None):
+    """
+    执行 SQL 并逐批产出结果（供流式页面使用，受同样的行数 / 字节上限约束）：
+    - ("columns", 列名)，之后每批 ("rows", 行列表)，被截断时最后产出 ("truncated", 已返回行数)
+    - 写操作只产出 ("rowcount", 受影响行数)
+    - 代价超出预算时先产出 ("plan", 执行计划)；降级为预览时结果最多 SQL_PREVIEW_ROWS 行
+    SQL 错误直接抛出；超出代价预算且不能预览时抛出 QueryTooExpensive，
+    超出执行预算时抛出 QueryInterrupted（等待客户端读取的时间不计入预算）。
+    """
+    max_rows = SQL_RESULT_MAX_ROWS if max_rows is None else max_rows
+    max_bytes = SQL_RESULT_MAX_BYTES if max_bytes is None else max_bytes
+
+    using = alias_for_sql(query)
+    try:
+        sql, plan, preview = guard_query(query, using)
+    except QueryTooExpensive as e:
+        yield "plan", e.plan
+        raise
+    if plan and plan["over_budget"]:
+        yield "plan", plan
+    if preview:
+        max_rows = min(max_rows, SQL_PREVIEW_ROWS)
+
+    conn = connections[using]
+    guard = BudgetGuard(_budget(user, preview), conn)
+    try:
+        yield from _iter_batches(conn, sql, guard, max_rows, max_bytes)
+    except QueryInterrupted as e:
+        record_interrupted(user, query, e, plan, preview)
+        raise
+
+
+def _iter_batches(conn, sql, guard, max_rows, max_bytes):
+    with conn.cursor() as cursor:
+        with _write_capture(sql, conn.alias) as changes:
+            with guard:
+                cursor.execute(sql)
+        if not cursor.description:
+            # 语句已提交；版本号和面板在预算之外更新
+            _after_write(sql, changes)
+            yield "rowcount", cursor.rowcount
+            return
+
+        yield "columns", [c[0] for c in cursor.description]
+        sent = 0
+        size = 0
+        while True:
+            with guard:
+                batch = cursor.fetchmany(min(SQL_FETCH_BATCH_SIZE, max_rows - sent + 1))
+            if not batch:
+                return
+            rows = []
+            for row in batch:
+                size += _row_size(row)
+                if sent + len(rows) >= max_rows or (sent + len(rows) and size > max_bytes):
+                    if rows:
+                        yield "rows", rows
+                    yield "truncated", sent + len(rows)
+                    return
+                rows.append(row)
+            sent += len(rows)
+            yield "rows", rows
+
+
+class _Echo:
+    """csv.writer 的伪文件对象：write 直接返回写入内容"""
+
+    def write(self, value):
+        return value
+
+
+def stream_sql_csv(query: str, user=None):
+    """
+    执行查询并返回逐批生成 CSV 文本的迭代器（不在内存中保存完整结果）。
+    SQL 在调用时立即执行，语法错误等会在返回响应之前抛出。
+    下载的是完整结果，不做预览降级：预估代价超出预算时抛出 QueryTooExpensive。
+    执行同样受执行预算约束；下载中途超出预算时，CSV 末尾追加一行说明结果不完整。
+    """
+    conn = connections[alias_for_sql(query)]
+    plan = analyze_query(query, using=conn.alias)
+    if plan is not None and plan["over_budget"]:
+        raise QueryTooExpensive(plan)
+    guard = BudgetGuard(budget_for(user), conn)
+    cursor = conn.cursor()
+    try:
+        with guard:
+            cursor.execute(query)
+    except QueryInterrupted as e:
+        cursor.close()
+        record_interrupted(user, query, e, plan)
+        raise
+    except Exception:
+        cursor.close()
+        raise
+    if not cursor.description:
+        cursor.close()
+        raise ValueError("只有查询语句（SELECT）可以下载结果")
+    return _iter_csv(cursor, guard, query, user, plan)
+
+
+def _iter_csv(cursor, guard, query, user, plan):
+    writer = csv.writer(_Echo())
+    try:
+        # 带 BOM，方便 Excel 正确识别中文
+        yield "\ufeff" + writer.writerow([c[0] for c in cursor.description])
+        while True:
+            with guard:
+                batch = cursor.fetchmany(SQL_FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            yield "".join(writer.writerow(row) for row in batch)
+    except QueryInterrupted as e:
+        record_interrupted(user, query, e, plan)
+        yield writer.writerow([f"# 结果不完整：{e}"])
+    finally:
+        cursor.close()
+
+
+def result_message(result):
+    """查询成功后的提示文本中的行数部分"""
+    if result.get("preview"):
+        message = f"预估代价超出预算，已降级为预览：仅显示前 {result['rowcount']} 行"
+    elif result.get("truncated"):
+        message = f"仅显示前 {result['rowcount']} 行（结果已截断，共 {result['rowcount']}+ 行）"
+    else:
+        message = f"返回 {result['rowcount']} 行数据"
+    if result.get("cached"):
+        message += "（来自缓存）"
+    return message
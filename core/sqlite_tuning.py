@@ -0,0 +1,44 @@
+"""
+SQLite 连接参数（每个新连接建立时通过 connection_created 信号设置，见 core.signals）
+
+- journal_mode=WAL：写入（如 CSV 导入）不再阻塞读请求，读也不阻塞写；
+- synchronous=NORMAL：WAL 模式下足够安全，提交时少一次 fsync；
+- mmap_size / cache_size：用内存映射和更大的页缓存减少系统调用和重复读盘；
+- temp_store=MEMORY：排序、分组用的临时 B 树放在内存中；
+- busy_timeout：遇到写锁时等待而不是立即报 database is locked。
+
+具体数值来自 settings.SQLITE_PRAGMAS，某个别名需要不同参数时（如只读别名）在
+settings.SQLITE_ALIAS_PRAGMAS 中单独配置；连接复用由 DATABASES 的 CONN_MAX_AGE 控制。
+"""
+from django.conf import settings
+
+DEFAULT_SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,          # 毫秒
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,      # 负数表示 KiB，即 64 MB
+    "temp_store": "MEMORY",
+}
+SQLITE_PRAGMAS = getattr(settings, "SQLITE_PRAGMAS", DEFAULT_SQLITE_PRAGMAS)
+SQLITE_ALIAS_PRAGMAS = getattr(settings, "SQLITE_ALIAS_PRAGMAS", {})
+
+
+def pragma_statements(pragmas):
+    """把 {名称: 值} 转成 PRAGMA 语句（busy_timeout 放在最前，切换 journal_mode 时可以等待锁）"""
+    names = sorted(pragmas, key=lambda name: name != "busy_timeout")
+    return [f"PRAGMA {name} = {pragmas[name]}" for name in names]
+
+
+def apply_pragmas(cursor, pragmas=None):
+    """在 DB-API 游标（或 sqlite3 连接）上执行 PRAGMA"""
+    for statement in pragma_statements(SQLITE_PRAGMAS if pragmas is None else pragmas):
+        cursor.execute(statement)
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created 信号处理函数：只处理 SQLite 连接"""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, SQLITE_ALIAS_PRAGMAS.get(connection.alias, SQLITE_PRAGMAS))
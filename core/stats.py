@@ -0,0 +1,114 @@
+"""
+统计卡片计算与缓存
+
+每张表的全部卡片用一条 aggregate() 查询算出，结果放进 Django 缓存。
+缓存键里带着该表的版本号（见 core.table_versions），ORM 信号、SQL 写语句和
+批量导入都会升级版本号，因此在数据没有变化时，列表页和首页的统计卡片不再访问数据库；
+版本号变化后只重新执行一次 aggregate()，不在进程内另存整表副本。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Sum
+
+from core.models import (
+    County, InfrastructureService, AgricultureSales,
+    CountyEconomy, CountyDemographics
+)
+from core.table_versions import get_versions
+
+STATS_CACHE_PREFIX = "stats:"
+STATS_CACHE_TIMEOUT = getattr(settings, "STATS_CACHE_TIMEOUT", None)  # None 表示不过期，只靠版本号失效
+
+
+# ---------------------------
+# 每张表的统计项：key -> (聚合表达式, 卡片标题, 保留小数位)
+# 小数位为 None 表示不取整（计数、求和）
+# ---------------------------
+MODEL_STATS = {
+    County: {
+        "county_count": (Count("pk"), "县域数量", None),
+        "province_count": (Count("province", distinct=True), "省份数量", None),
+    },
+    CountyEconomy: {
+        "avg_gdp": (Avg("gdp_total"), "平均 GDP（亿元）", 2),
+        "avg_fiscal_revenue": (Avg("fiscal_revenue"), "平均财政收入（亿元）", 2),
+        "avg_per_capita_income": (Avg("per_capita_income"), "平均人均收入（元）", 2),
+    },
+    InfrastructureService: {
+        "avg_hard_road": (Avg("pct_village_with_hard_road"), "平均硬化路覆盖率", 2),
+        "avg_broadband": (Avg("broadband_coverage"), "平均宽带覆盖率", 2),
+    },
+    CountyDemographics: {
+        "population_sum": (Sum("population_total"), "总人口数", None),
+        "avg_urbanization": (Avg("urbanization_rate"), "平均城镇化率", 2),
+    },
+    AgricultureSales: {
+        "sales_value_sum": (Sum("sales_value"), "总销售额（亿元）", 2),
+    },
+}
+
+# 首页 Dashboard 卡片：(模型, 统计项 key, 卡片标题)
+HOME_STATS = [
+    (County, "county_count", "县域数量"),
+    (CountyEconomy, "avg_gdp", "平均 GDP（亿元）"),
+    (CountyDemographics, "population_sum", "总人口数"),
+    (InfrastructureService, "avg_broadband", "平均宽带覆盖率（%）"),
+]
+
+
+# 首页统计卡片用到的表
+HOME_STATS_MODELS = sorted({model for model, _, _ in HOME_STATS}, key=lambda model: model._meta.db_table)
+
+
+def _cache_key(model, version):
+    return f"{STATS_CACHE_PREFIX}{model._meta.db_table}:{version}"
+
+
+def compute_aggregates(model):
+    """一次 aggregate() 算出该表所有统计项（不走缓存）"""
+    spec = MODEL_STATS.get(model)
+    if not spec:
+        return {}
+    raw = model.objects.aggregate(**{key: expr for key, (expr, _, _) in spec.items()})
+    values = {}
+    for key, (_, _, digits) in spec.items():
+        value = raw[key] or 0
+        values[key] = round(value, digits) if digits is not None else value
+    return values
+
+
+def get_aggregates(model):
+    """读取统计项，缓存未命中时计算并写回缓存"""
+    return get_aggregates_many([model])[model]
+
+
+def get_aggregates_many(models):
+    """批量读取多张表的统计项，只对未命中的表发查询"""
+    versions = get_versions(models)
+    keys = {model: _cache_key(model, versions[model._meta.db_table]) for model in models}
+    cached = cache.get_many(list(keys.values()))
+    result = {}
+    missing = {}
+    for model, key in keys.items():
+        if key in cached:
+            result[model] = cached[key]
+        else:
+            result[model] = missing[key] = compute_aggregates(model)
+    if missing:
+        cache.set_many(missing, STATS_CACHE_TIMEOUT)
+    return result
+
+
+def stats_for_model(model):
+    """根据不同模型生成统计卡片"""
+    spec = MODEL_STATS.get(model)
+    if not spec:
+        return []
+    values = get_aggregates(model)
+    return [{"label": label, "value": values[key]} for key, (_, label, _) in spec.items()]
+
+
+def home_stats():
+    """首页 Dashboard 统计卡片"""
+    values = get_aggregates_many(HOME_STATS_MODELS)
+    return [{"label": label, "value": values[model][key]} for model, key, label in HOME_STATS]
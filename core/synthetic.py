@@ -0,0 +1,197 @@
+"""
+合成数据生成（规模测试用）
+
+按给定的县数、年数生成五张表的模拟数据，分布大致贴近真实的脱贫县数据：
+- 县按 22 个省份的脱贫县数量比例分配，每省若干地市，少数县为省直管（city 为空）；
+- 人口、GDP 服从对数正态分布，人均收入逐年增长，财政收入约为 GDP 的百分之几；
+- 城镇化率、社保覆盖率、基础设施覆盖率随年份上升并截断在 0~100；
+- 每个县固定经营 1~N 种农产品，每种农产品每年一行（product_type 不同）。
+
+同一 seed 生成的数据完全相同：县级属性用 seed 一次生成，
+年度数据按固定大小的县块生成，每块使用 (seed, 块号) 派生的随机数流，与写入方式、块大小无关。
+本模块只依赖 numpy，不访问数据库；产出的每一块是 {列名: 值列表}，列名与 core.importer.TABLE_SPECS 一致。
+"""
+import numpy as np
+
+# 省份及其脱贫县数量（用作分配比例）
+PROVINCES = {
+    "河北": 45, "山西": 36, "内蒙古": 31, "吉林": 8, "黑龙江": 20, "安徽": 20,
+    "江西": 24, "河南": 38, "湖北": 28, "湖南": 40, "广西": 33, "海南": 5,
+    "重庆": 14, "四川": 66, "贵州": 66, "云南": 88, "西藏": 74, "陕西": 56,
+    "甘肃": 58, "青海": 42, "宁夏": 8, "新疆": 32,
+}
+
+# 农产品类型 -> 单价（万元 / 吨）
+PRODUCT_PRICES = {
+    "粮食": 0.25, "蔬菜": 0.3, "水果": 0.5, "茶叶": 5.0,
+    "畜牧": 2.5, "水产": 1.5, "中药材": 3.0, "食用菌": 1.2,
+}
+
+# 县名、地市名用字
+NAME_CHARS = "安平宁和兴隆丰泰永昌德清新华阳山河源江云石金城东西南北长广武定嘉乐福临康文白青"
+
+# 每块包含的县数（决定随机数流的划分，改变它会改变生成结果）
+BLOCK_SIZE = 500
+
+# 县均地市数：每省地市数约为 县数 / COUNTIES_PER_CITY
+COUNTIES_PER_CITY = 8
+
+
+def _place_name(rng, suffix, used):
+    """两字地名 + 后缀，重名时追加序号"""
+    a, b = rng.integers(0, len(NAME_CHARS), size=2)
+    name = f"{NAME_CHARS[a]}{NAME_CHARS[b]}{suffix}"
+    if name in used:
+        name = f"{NAME_CHARS[a]}{NAME_CHARS[b]}{len(used)}{suffix}"
+    used.add(name)
+    return name
+
+
+def _with_missing(rng, values, missing_rate, digits=2):
+    """四舍五入后转为 Python 列表，按 missing_rate 随机置空"""
+    values = np.round(values, digits) if digits else np.rint(values).astype(np.int64)
+    result = values.tolist()
+    if missing_rate > 0:
+        for i in np.flatnonzero(rng.random(len(result)) < missing_rate):
+            result[i] = None
+    return result
+
+
+class SyntheticCounties:
+    """县级（不随年份变化的）属性：名称、省市、人口基数、发展水平、经营的农产品"""
+
+    def __init__(self, counties, products=4, seed=0, first_id=1):
+        rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.ids = np.arange(first_id, first_id + counties)
+
+        # 按比例分配省份，余数给比例最大的省
+        names = list(PROVINCES)
+        weights = np.array(list(PROVINCES.values()), dtype=float)
+        counts = np.floor(weights / weights.sum() * counties).astype(int)
+        counts[np.argmax(weights)] += counties - counts.sum()
+        self.province = np.repeat(names, counts)
+        province_effect = dict(zip(names, rng.normal(0, 0.3, len(names))))
+
+        self.name, self.city = [], []
+        for province, count in zip(names, counts):
+            used_counties, used_cities = set(), set()
+            cities = [_place_name(rng, "市", used_cities) for _ in range(max(1, round(count / COUNTIES_PER_CITY)))]
+            for _ in range(count):
+                self.name.append(_place_name(rng, "县", used_counties))
+                # 约 5% 的县为省直管
+                self.city.append(None if rng.random() < 0.05 else cities[rng.integers(len(cities))])
+
+        # 发展水平：省份效应 + 县效应
+        self.development = np.array([province_effect[p] for p in self.province]) + rng.normal(0, 0.5, counties)
+        self.population = np.clip(rng.lognormal(np.log(300_000), 0.6, counties), 5_000, 2_500_000)
+        self.population_growth = rng.normal(0.002, 0.006, counties)
+
+        # 每个县经营的农产品（1 ~ products 种）及各自的基础销量（吨）
+        kinds = list(PRODUCT_PRICES)
+        self.products = []
+        for _ in range(counties):
+            n = int(min(len(kinds), max(1, products), 1 + rng.poisson(max(products - 1, 0) * 0.75)))
+            chosen = rng.choice(len(kinds), size=n, replace=False)
+            self.products.append([(kinds[k], rng.lognormal(np.log(20_000), 1.0)) for k in sorted(chosen)])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def county_columns(self):
+        return {
+            "county_id": self.ids.tolist(),
+            "name": self.name,
+            "province": self.province.tolist(),
+            "city": self.city,
+        }
+
+    def iter_blocks(self, years, missing_rate=0.01):
+        """逐块产出四张事实表的列：[(表键, {列名: 值列表}), ...]"""
+        years = np.asarray(list(years))
+        for number, start in enumerate(range(0, len(self), BLOCK_SIZE)):
+            rng = np.random.default_rng([self.seed, number])
+            yield self._block(rng, slice(start, start + BLOCK_SIZE), years, missing_rate)
+
+    def _block(self, rng, block, years, missing_rate):
+        ids = self.ids[block]
+        n, t = len(ids), len(years)
+        # 县 × 年 网格，县在外层
+        county = np.repeat(ids, t)
+        year = np.tile(years, n)
+        step = np.tile(np.arange(t), n)
+        dev = np.repeat(self.development[block], t)
+        size = n * t
+
+        def noise(sigma):
+            return rng.lognormal(0, sigma, size)
+
+        # 人口结构
+        population = np.repeat(self.population[block], t) * (1 + np.repeat(self.population_growth[block], t)) ** step
+        population = population * noise(0.01)
+        demo = {
+            "county_id": county.tolist(),
+            "year": year.tolist(),
+            "population_total": _with_missing(rng, population, missing_rate, digits=0),
+            "urbanization_rate": _with_missing(
+                rng, np.clip(28 + 8 * dev + 1.2 * step + rng.normal(0, 3, size), 5, 95), missing_rate),
+            "unemployment_rate": _with_missing(
+                rng, np.clip(rng.normal(4.5 - 0.4 * dev, 1.2, size), 0.5, 15), missing_rate),
+            "migrant_workers": _with_missing(
+                rng, population * np.clip(rng.normal(0.18, 0.06, size), 0.02, 0.5), missing_rate, digits=0),
+            "social_security_rate": _with_missing(
+                rng, np.clip(62 + 5 * dev + 1.5 * step + rng.normal(0, 4, size), 20, 100), missing_rate),
+        }
+
+        # 经济指标：人均收入年增约 8%，人均 GDP 约为人均收入的 2~3 倍
+        income = 6_000 * np.exp(0.35 * dev) * 1.08 ** step * noise(0.05)
+        gdp = population * income * 2.4 * noise(0.15) / 1e8
+        economy = {
+            "county_id": demo["county_id"],
+            "year": demo["year"],
+            "gdp_total": _with_missing(rng, gdp, missing_rate),
+            "fiscal_revenue": _with_missing(rng, gdp * rng.beta(2, 25, size), missing_rate),
+            "per_capita_income": _with_missing(rng, income, missing_rate),
+        }
+
+        # 基础设施：覆盖率沿逻辑斯蒂曲线逐年上升
+        def coverage(start, speed):
+            logit = start + 0.5 * dev + speed * step + rng.normal(0, 0.3, size)
+            return np.clip(100 / (1 + np.exp(-logit)), 0, 100)
+
+        infra = {
+            "county_id": demo["county_id"],
+            "year": demo["year"],
+            "pct_village_with_hard_road": _with_missing(rng, coverage(0.5, 0.35), missing_rate),
+            "pct_village_with_electricity": _with_missing(rng, coverage(3.0, 0.3), missing_rate),
+            "broadband_coverage": _with_missing(rng, coverage(-1.5, 0.5), missing_rate),
+            "water_supply_coverage": _with_missing(rng, coverage(0.8, 0.25), missing_rate),
+            "sanitation_coverage": _with_missing(rng, coverage(-0.5, 0.3), missing_rate),
+        }
+
+        # 农业销售：每个县、每年、每种农产品一行
+        agri_county, agri_year, agri_type, base = [], [], [], []
+        for county_id, products in zip(ids.tolist(), self.products[block]):
+            for y in years.tolist():
+                for kind, volume in products:
+                    agri_county.append(county_id)
+                    agri_year.append(y)
+                    agri_type.append(kind)
+                    base.append(volume)
+        agri_step = np.asarray(agri_year) - years[0] if agri_year else np.zeros(0)
+        volume = np.asarray(base) * 1.03 ** agri_step * rng.lognormal(0, 0.2, len(base))
+        price = np.array([PRODUCT_PRICES[kind] for kind in agri_type]) * 1.02 ** agri_step
+        agri = {
+            "county_id": agri_county,
+            "year": agri_year,
+            "product_type": agri_type,
+            "sales_volume": _with_missing(rng, volume, missing_rate),
+            "sales_value": _with_missing(rng, volume * price / 1e4, missing_rate),
+        }
+
+        return [("infra", infra), ("agri", agri), ("economy", economy), ("demo", demo)]
+
+
+def column_rows(columns, fields):
+    """{列名: 值列表} -> 按 fields 顺序排列的行元组列表"""
+    return list(zip(*(columns[name] for name in fields)))
@@ -0,0 +1,177 @@
+"""
+数据表变更日志：每张表的版本号与最后修改时间
+
+每张被缓存读取的 core 表（见 TRACKED_TABLES，以及权限相关的 auth 表）在 core_tableversion 中有一行：单调递增的版本号、最后修改时间和最近一次写入的来源。
+任何写入都会让相关表的版本号加一：
+- ORM 信号（表单保存、删除，见 core.signals），来源 "orm"；
+- SQL 控制台 / 首页 / 智能查询的写语句，按语句的目标表归类（见 written_tables），来源 "sql"；
+- CSV 批量导入、面板与汇总表刷新，来源 "import" / "derived"。
+缓存层把版本号拼进缓存键，版本一变旧缓存自然失效，不需要逐个删除。
+
+版本号存放在数据库中而不是进程内缓存里，所有工作进程看到的是同一份；
+get_versions 是一次按主键的查询，足够在每次读缓存前检查数据是否变化。
+"""
+import re
+import time
+from datetime import datetime
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+# 参与版本管理的 core 表：查询结果缓存、统计卡片、面板 / 汇总、条件请求、权限矩阵和 Prompt 配置缓存读取的表。
+# 变更日志本身、AI 答案缓存、中断记录和导入清单不登记：没有缓存以它们的版本号为键，
+# 逐行写入时再升级版本号只是多一次写事务；引用它们的只读 SQL 也因此不进入查询结果缓存
+TRACKED_TABLES = frozenset({
+    "core_county", "core_infrastructureservice", "core_agriculturesales",
+    "core_countyeconomy", "core_countydemographics",
+    "core_countyyearpanel", "core_rollupcell",
+    "core_usertablepermission", "core_aipromptconfig",
+})
+
+# core 之外也记录版本号的表：权限矩阵缓存以它们的版本号为键（见 core.permissions）
+AUTH_TABLES = {"auth_user", "auth_group", "auth_user_groups"}
+
+# 写语句的目标表：INSERT [OR ...] INTO t / REPLACE INTO t / UPDATE [OR ...] t / DELETE FROM t
+_NAME = r"""("(?:[^"]|"")+"|`[^`]+`|\[[^\]]+\]|[A-Za-z_][A-Za-z0-9_.]*)"""
+WRITE_TARGET = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|DELETE\s+FROM|UPDATE(?:\s+OR\s+\w+)?)\s+" + _NAME,
+    re.I,
+)
+# 无法确定影响范围的语句（改表结构等），按“全部表都变了”处理
+SCHEMA_CHANGE = re.compile(r"\b(?:DROP|ALTER|CREATE|TRUNCATE)\b", re.I)
+
+
+def _table_name(table):
+    """接受模型类或表名，统一返回表名"""
+    return table._meta.db_table if hasattr(table, "_meta") else table
+
+
+def tracked_tables():
+    """参与版本管理的 core 表（见 TRACKED_TABLES）"""
+    return set(TRACKED_TABLES)
+
+
+def written_tables(query):
+    """
+    写语句修改的 core 表和权限相关的 auth 表（按 INSERT / UPDATE / DELETE 的目标表归类）。
+    改表结构的语句或认不出目标表的写语句返回全部这些表。
+    """
+    tracked = tracked_tables() | AUTH_TABLES
+    if SCHEMA_CHANGE.search(query):
+        return tracked
+    targets = set()
+    for name in WRITE_TARGET.findall(query):
+        name = name.strip('"`[]').split(".")[-1].lower()
+        if name != "set":  # ON CONFLICT ... DO UPDATE SET
+            targets.add(name)
+    if not targets:
+        return tracked
+    return targets & tracked
+
+
+def _journal_table():
+    from core.models import TableVersion
+    return TableVersion._meta.db_table
+
+
+def _journal_missing(connection):
+    """变更日志表还不存在（迁移建表之前的数据迁移中）"""
+    return _journal_table() not in connection.introspection.table_names()
+
+
+def _read(names):
+    connection = connections[DEFAULT_DB_ALIAS]
+    placeholders = ", ".join(["%s"] * len(names))
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT table_name, version, modified_at FROM {_journal_table()} WHERE table_name IN ({placeholders})",
+                names,
+            )
+            return {name: (version, modified_at) for name, version, modified_at in cursor.fetchall()}
+    except DatabaseError:
+        if not _journal_missing(connection):
+            raise
+        return {}
+
+
+def _initial_version():
+    # 表第一次登记时用当前时间起步：数据库重建后也不会与外部缓存中的旧版本号重复
+    return time.time_ns()
+
+
+def get_versions(tables):
+    """批量读取版本号（一次查询），返回 {表名: 版本号}；尚未登记的表先登记"""
+    names = sorted({_table_name(t) for t in tables})
+    if not names:
+        return {}
+    found = _read(names)
+    missing = [name for name in names if name not in found]
+    if missing:
+        _register(missing)
+        found.update(_read(missing))
+    return {name: found[name][0] if name in found else 0 for name in names}
+
+
+def get_version(table):
+    return get_versions([table])[_table_name(table)]
+
+
+def get_last_modified(tables):
+    """批量读取最后修改时间，返回 {表名: datetime 或 None}"""
+    return {name: modified_at for name, (_, modified_at) in get_journal(tables).items()}
+
+
+def get_journal(tables):
+    """一次查询同时读取版本号和最后修改时间，返回 {表名: (版本号, datetime)}；未登记的表为 (0, None)"""
+    names = sorted({_table_name(t) for t in tables})
+    if not names:
+        return {}
+    found = _read(names)
+    return {
+        name: (found[name][0], _as_datetime(found[name][1])) if name in found else (0, None)
+        for name in names
+    }
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _write(sql, params):
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    except DatabaseError:
+        if not _journal_missing(connection):
+            raise
+
+
+def _now():
+    return datetime.now().isoformat(sep=" ")
+
+
+def _register(names):
+    """登记新表（已存在的行不变）"""
+    now = _now()
+    values = ", ".join(["(%s, %s, %s, '')"] * len(names))
+    _write(
+        f"INSERT INTO {_journal_table()} (table_name, version, modified_at, source) VALUES {values} "
+        f"ON CONFLICT (table_name) DO NOTHING",
+        [v for name in names for v in (name, _initial_version(), now)],
+    )
+
+
+def bump_versions(*tables, source=""):
+    """让指定表（不传则全部参与版本管理的 core 表）的版本号加一，并记录修改时间和来源"""
+    names = sorted({_table_name(t) for t in tables} or tracked_tables())
+    now = _now()
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(names))
+    _write(
+        f"INSERT INTO {_journal_table()} (table_name, version, modified_at, source) VALUES {values} "
+        f"ON CONFLICT (table_name) DO UPDATE SET "
+        f"version = {_journal_table()}.version + 1, modified_at = excluded.modified_at, source = excluded.source",
+        [v for name in names for v in (name, _initial_version(), now, source)],
+    )
@@ -1,4 +1,5 @@
 from django import template
+from core.permissions import user_in_group
 register = template.Library()
 
 @register.filter
@@ -8,6 +9,4 @@ def attr(obj, attr_name):
 @register.filter
 def in_group(user, group_name):
     """检查用户是否在指定的组中"""
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name=group_name).exists()
\ No newline at end of file
+    return user_in_group(user, group_name)
\ No newline at end of file
@@ -0,0 +1,377 @@
+import csv
+import os
+import shutil
+import tempfile
+
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core import query_plan, sql_budget, sql_utils
+from core.conditional import page_etag_salt
+from core.importer import TABLE_SPECS, load_table, load_table_incremental
+from core.models import (
+    AgricultureSales, County, CountyEconomy, CountyYearPanel, InterruptedQuery, TableVersion,
+    UserTablePermission,
+)
+from core.panel import refresh_panel
+from core.permissions import PERMISSION_TABLES, get_permission_matrix
+from core.query_cache import cache_key_for, normalize_sql, result_cache
+from core.sql_utils import execute_sql
+from core.table_versions import bump_versions, get_versions
+from core.views.generic_views import AgriListView
+
+
+def write_csv(data_dir, key, rows):
+    spec = TABLE_SPECS[key]
+    with open(os.path.join(data_dir, spec.filename), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(spec.fields)
+        writer.writerows(rows)
+
+
+class IncrementalImportTests(TestCase):
+    """增量导入：业务键含 NULL 的农业销售行"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        write_csv(self.data_dir, "county", [(1, "甲县", "甲省", "甲市"), (2, "乙县", "甲省", None)])
+        write_csv(self.data_dir, "agri", [
+            (1, 2019, "粮食", 100, 10),
+            (1, 2019, None, 5, 1),       # product_type 为空
+            (2, 2019, None, 7, 2),
+        ])
+        load_table("county", self.data_dir)
+
+    def null_rows(self):
+        return AgricultureSales.objects.filter(product_type__isnull=True).count()
+
+    def test_incremental_after_full_import_does_not_duplicate_null_keys(self):
+        load_table("agri", self.data_dir)
+        self.assertEqual(AgricultureSales.objects.count(), 3)
+
+        # 全量导入会清空增量清单，下一次增量导入把所有行都当作新增
+        result = load_table_incremental("agri", self.data_dir)
+        self.assertEqual(result["inserted"], 3)
+        self.assertEqual(AgricultureSales.objects.count(), 3)
+        self.assertEqual(self.null_rows(), 2)
+
+        panel = CountyYearPanel.objects.get(county_id=1, year=2019)
+        self.assertEqual(panel.agri_product_count, 2)
+        self.assertEqual(panel.agri_sales_value, 11)
+
+    def test_repeated_incremental_import_keeps_null_keys_unique(self):
+        load_table_incremental("agri", self.data_dir)
+        load_table_incremental("agri", self.data_dir, force=True)
+        self.assertEqual(self.null_rows(), 2)
+
+        # 修改含 NULL 键的行：替换旧行而不是追加
+        write_csv(self.data_dir, "agri", [(1, 2019, "粮食", 100, 10), (1, 2019, None, 6, 3)])
+        result = load_table_incremental("agri", self.data_dir)
+        self.assertEqual((result["updated"], result["deleted"]), (1, 1))
+        self.assertEqual(list(AgricultureSales.objects.filter(product_type__isnull=True)
+                              .values_list("county_id", "sales_value")), [(1, 3)])
+        self.assertEqual(County.objects.count(), 2)
+
+
+class FullImportNullKeyTests(TestCase):
+    """全量导入只替换 CSV 中出现的 NULL 键，失败时不丢失旧行"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        write_csv(self.data_dir, "county", [(1, "甲县", "甲省", "甲市"), (2, "乙县", "甲省", None)])
+        load_table("county", self.data_dir)
+        # 手工录入的行，CSV 中没有
+        AgricultureSales.objects.create(county_id=2, year=2018, product_type=None, sales_value=9)
+
+    def test_only_reimported_null_keys_are_replaced(self):
+        write_csv(self.data_dir, "agri", [(1, 2019, None, 5, 1)])
+        load_table("agri", self.data_dir)
+        load_table("agri", self.data_dir)
+        self.assertEqual(sorted(AgricultureSales.objects.values_list("county_id", "year", "sales_value")),
+                         [(1, 2019, 1), (2, 2018, 9)])
+
+    def test_failed_import_keeps_existing_rows(self):
+        write_csv(self.data_dir, "agri", [(2, 2018, None, 5, 1), (2, 2019, "粮食", 5, "not a number")])
+        with self.assertRaises(ValueError):
+            load_table("agri", self.data_dir)
+        self.assertEqual(list(AgricultureSales.objects.values_list("county_id", "year", "sales_value")),
+                         [(2, 2018, 9)])
+
+
+class SqlBudgetTests(TransactionTestCase):
+    """
+    用户 SQL 的执行预算与代价估算。只读语句走只读别名（另一个连接），
+    数据必须真正提交才能被它读到，所以用 TransactionTestCase。
+    """
+    databases = {"default", "readonly"}
+
+    def setUp(self):
+        result_cache.clear()
+        self.addCleanup(result_cache.clear)
+        County.objects.bulk_create([County(county_id=i, name=f"县{i}", province="甲省", city="甲市") for i in range(1, 61)])
+        CountyEconomy.objects.bulk_create([CountyEconomy(county_id=i, year=2019, gdp_total=i) for i in range(1, 61)])
+        refresh_panel()
+
+    def budget(self, steps):
+        return mock.patch.dict(sql_budget.SQL_EXECUTION_BUDGETS, {"default": {"seconds": 5, "steps": steps}})
+
+    def test_runaway_recursive_cte_is_interrupted_and_logged(self):
+        query = "WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT COUNT(*) FROM r"
+        with self.budget(100_000):
+            result = execute_sql(query)
+        self.assertIn("已取消", result["error"])
+        self.assertEqual(result["rows"], [])
+        logged = InterruptedQuery.objects.get()
+        self.assertEqual((logged.sql, logged.role, logged.reason), (query, "default", "steps"))
+        self.assertGreater(logged.steps, 100_000)
+
+    def test_cartesian_join_is_refused_by_cost_estimate(self):
+        query = "SELECT a.name, b.name, c.name FROM core_county a, core_county b, core_county c"
+        with mock.patch.object(query_plan, "SQL_COST_BUDGET", 10_000):
+            # 默认降级为预览：只取前 SQL_PREVIEW_ROWS 行
+            preview = execute_sql(query, use_cache=False)
+            self.assertTrue(preview["preview"])
+            self.assertTrue(preview["plan"]["over_budget"])
+            self.assertTrue(any("笛卡尔积" in finding for finding in preview["plan"]["findings"]))
+            self.assertEqual(preview["rowcount"], sql_utils.SQL_PREVIEW_ROWS)
+
+            with mock.patch.object(sql_utils, "SQL_COST_ACTION", "reject"):
+                rejected = execute_sql(query, use_cache=False)
+            self.assertIn("已拒绝执行", rejected["error"])
+            self.assertEqual(rejected["rows"], [])
+
+            # 写语句不能降级为预览，直接拒绝，且没有写入
+            write = execute_sql(
+                "INSERT INTO core_countyeconomy (county_id, year, gdp_total) "
+                "SELECT a.county_id, 1000 + b.county_id + c.county_id, 0 FROM core_county a, core_county b, core_county c"
+            )
+            self.assertIn("已拒绝执行", write["error"])
+        self.assertEqual(CountyEconomy.objects.count(), 60)
+        self.assertFalse(InterruptedQuery.objects.exists())
+
+    def test_committed_write_is_not_reported_as_cancelled(self):
+        # 预算够执行 UPDATE 本身，但不够随后的面板刷新；刷新在预算之外，语句不应报告为已取消
+        with self.budget(5_000):
+            result = execute_sql("UPDATE core_countyeconomy SET gdp_total = 1000 WHERE county_id = 5 AND year = 2019")
+        self.assertIsNone(result["error"])
+        self.assertEqual(result["rowcount"], 1)
+        self.assertFalse(InterruptedQuery.objects.exists())
+        self.assertEqual(CountyEconomy.objects.get(county_id=5).gdp_total, 1000)
+        self.assertEqual(CountyYearPanel.objects.get(county_id=5, year=2019).gdp_total, 1000)
+
+
+class QueryCacheTests(TransactionTestCase):
+    """只读 SQL 的结果缓存：规范化后的 SQL 命中同一条目，表版本号变化后失效"""
+    databases = {"default", "readonly"}
+
+    def setUp(self):
+        result_cache.clear()
+        self.addCleanup(result_cache.clear)
+        County.objects.bulk_create([County(county_id=i, name=f"县{i}", province="甲省") for i in range(1, 4)])
+
+    def test_normalized_sql_hits_the_same_entry(self):
+        self.assertEqual(normalize_sql("  SELECT  name\nFROM Core_County ;"), "select name from core_county")
+        # 引号内的内容保持原样
+        self.assertNotEqual(cache_key_for("SELECT name FROM core_county WHERE name = '县1'"),
+                            cache_key_for("SELECT name FROM core_county WHERE name = '县1 '"))
+
+        first = execute_sql("SELECT county_id FROM core_county ORDER BY county_id")
+        second = execute_sql("select   county_id\n  from CORE_COUNTY order by county_id;")
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["rows"], [(1,), (2,), (3,)])
+
+    def test_uncacheable_statements(self):
+        self.assertIsNone(cache_key_for("SELECT random() FROM core_county"))
+        self.assertIsNone(cache_key_for("SELECT * FROM auth_user"))
+        self.assertIsNone(cache_key_for("DELETE FROM core_county"))
+
+    def test_version_bump_invalidates(self):
+        query = "SELECT COUNT(*) FROM core_county"
+        execute_sql(query)
+        self.assertTrue(execute_sql(query)["cached"])
+
+        # 绕过 ORM 与控制台的写入（如批量导入）登记版本号后，缓存失效
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM core_county WHERE county_id = 3")
+        bump_versions(County, source="import")
+        result = execute_sql(query)
+        self.assertFalse(result["cached"])
+        self.assertEqual(result["rows"], [(2,)])
+
+    def test_execute_sql_write_invalidates_cached_select(self):
+        query = "SELECT name FROM core_county WHERE county_id = 1"
+        execute_sql(query)
+        self.assertTrue(execute_sql(query)["cached"])
+
+        # 写其他表不影响该条目
+        execute_sql("INSERT INTO core_countyeconomy (county_id, year, gdp_total) VALUES (1, 2019, 1)")
+        self.assertTrue(execute_sql(query)["cached"])
+
+        write = execute_sql("UPDATE core_county SET name = '新县名' WHERE county_id = 1")
+        self.assertIsNone(write["error"])
+        result = execute_sql(query)
+        self.assertFalse(result["cached"])
+        self.assertEqual(result["rows"], [("新县名",)])
+
+
+class KeysetPaginationTests(TestCase):
+    """列表页的游标分页：逐页前进 / 后退的结果与按偏移量分页一致"""
+    page_size = 3
+
+    def setUp(self):
+        County.objects.bulk_create([County(county_id=i, name=f"县{i}", province="甲省") for i in range(1, 5)])
+        # 同一 (县, 年) 有多种农产品：排序键相同，只能靠 pk 区分；插入顺序打乱，pk 与键的顺序不一致
+        rows = [(c, y, p) for p in ("粮食", "蔬菜") for y in (2019, 2018) for c in (3, 1, 4, 2)]
+        AgricultureSales.objects.bulk_create([
+            AgricultureSales(county_id=c, year=y, product_type=p, sales_value=1) for c, y, p in rows
+        ])
+        self.expected = list(AgricultureSales.objects.order_by("county_id", "year", "pk").values_list("pk", flat=True))
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        patcher = mock.patch.object(AgriListView, "page_size", self.page_size)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def page(self, **params):
+        response = self.client.get("/agri/", params)
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        return [pk for pk, _ in context["rows"]], context["prev_cursor"], context["next_cursor"]
+
+    def offset_page(self, number):
+        return self.expected[number * self.page_size:(number + 1) * self.page_size]
+
+    def test_forward_and_backward_match_offset_pages(self):
+        pages, cursors = [], []
+        pks, prev_cursor, next_cursor = self.page()
+        self.assertEqual(prev_cursor, "")
+        while True:
+            pages.append(pks)
+            cursors.append(prev_cursor)
+            if not next_cursor:
+                break
+            pks, prev_cursor, next_cursor = self.page(after=next_cursor)
+
+        count = -(-len(self.expected) // self.page_size)
+        self.assertEqual(pages, [self.offset_page(n) for n in range(count)])
+        # 最后一页不满一页，且没有下一页
+        self.assertEqual(len(pages[-1]), len(self.expected) % self.page_size)
+
+        # 从最后一页沿 prev 游标后退，逐页与偏移量分页一致，回到第一页时没有上一页
+        prev_cursor = cursors[-1]
+        for number in range(count - 2, -1, -1):
+            pks, prev_cursor, next_cursor = self.page(before=prev_cursor)
+            self.assertEqual(pks, self.offset_page(number))
+            self.assertTrue(next_cursor)
+        self.assertEqual(prev_cursor, "")
+
+    def test_ties_on_sort_key_are_split_by_pk(self):
+        # 游标停在一组相同 (county_id, year) 的中间：下一页从同组剩余的行开始
+        first = AgricultureSales.objects.filter(county_id=1, year=2018).order_by("pk").first()
+        pks, _, _ = self.page(after=f"1.2018.{first.pk}")
+        start = self.expected.index(first.pk) + 1
+        self.assertEqual(pks, self.expected[start:start + self.page_size])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        for cursor in ("abc", "1.2018", "1.2018.x", "1..2", "1.2018.2.5"):
+            with self.subTest(cursor=cursor):
+                pks, prev_cursor, _ = self.page(after=cursor)
+                self.assertEqual(pks, self.offset_page(0))
+                self.assertEqual(prev_cursor, "")
+                self.assertEqual(self.page(before=cursor)[0], self.offset_page(0))
+
+    def test_cursor_past_the_end_is_empty(self):
+        pks, _, next_cursor = self.page(after=f"999.9999.{max(self.expected)}")
+        self.assertEqual(pks, [])
+        self.assertEqual(next_cursor, "")
+
+
+class PermissionCacheTests(TestCase):
+    """权限矩阵缓存：角色、表权限变化后由信号升级版本号，旧缓存不再命中"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("ana", password="pw")
+        self.data_entry = Group.objects.create(name="data_entry")
+
+    def can_edit(self, table="economy"):
+        # 每次重新取用户，模拟新的请求（请求内的记忆不跨请求）
+        return get_permission_matrix(User.objects.get(pk=self.user.pk))["tables"][table]["edit"]
+
+    def test_cached_matrix_is_reused(self):
+        self.assertFalse(self.can_edit())
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):  # 只读版本号
+            get_permission_matrix(user)
+
+    def test_role_change_invalidates(self):
+        self.assertFalse(self.can_edit())
+        self.user.groups.add(self.data_entry)
+        self.assertTrue(self.can_edit())
+        self.data_entry.user_set.remove(self.user)
+        self.assertFalse(self.can_edit())
+
+    def test_table_permission_change_invalidates(self):
+        self.assertFalse(self.can_edit())
+        perm = UserTablePermission.objects.create(user=self.user, table_name="economy", can_edit=True)
+        self.assertTrue(self.can_edit())
+        perm.can_edit = False
+        perm.save()
+        self.assertFalse(self.can_edit())
+        self.user.groups.add(self.data_entry)
+        self.assertFalse(self.can_edit())  # 用户特定权限优先于角色
+        perm.delete()
+        self.assertTrue(self.can_edit())
+
+    def test_superuser_change_invalidates(self):
+        self.assertFalse(self.can_edit())
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertTrue(self.can_edit())
+
+    def test_login_does_not_invalidate(self):
+        versions = get_versions(PERMISSION_TABLES)
+        self.client.login(username="ana", password="pw")
+        self.assertEqual(get_versions(PERMISSION_TABLES), versions)
+
+
+class TableVersionTests(TestCase):
+    """变更日志只记录被缓存读取的表"""
+
+    def test_log_tables_are_not_versioned(self):
+        # 缓存 / 日志表的写入不写变更日志；引用它们的查询也不进入结果缓存
+        before = TableVersion.objects.count()
+        InterruptedQuery.objects.create(role="default", sql="SELECT 1", reason="time", elapsed_ms=1, steps=0)
+        self.assertEqual(TableVersion.objects.count(), before)
+        self.assertFalse(TableVersion.objects.filter(table_name="core_interruptedquery").exists())
+        self.assertIsNone(cache_key_for("SELECT * FROM core_interruptedquery"))
+
+
+class PageEtagTests(TestCase):
+    """页面 ETag 中的代码版本来自 PAGE_ETAG_SALT，不随文件修改时间变化"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.client.get("/county/")  # 先拿到 CSRF cookie（它也是 ETag 的一部分）
+        page_etag_salt.cache_clear()
+        self.addCleanup(page_etag_salt.cache_clear)
+
+    def etag(self):
+        return self.client.get("/county/")["ETag"]
+
+    def test_release_changes_etag(self):
+        with override_settings(PAGE_ETAG_SALT="r1"):
+            etag = self.etag()
+            self.assertEqual(self.client.get("/county/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        page_etag_salt.cache_clear()
+        with override_settings(PAGE_ETAG_SALT="r2"):
+            self.assertNotEqual(self.etag(), etag)
+
+    def test_salt_is_computed_once_per_process(self):
+        with override_settings(PAGE_ETAG_SALT=""):
+            etag = self.etag()
+            self.assertEqual(self.etag(), etag)
@@ -1,7 +1,7 @@
 from django.urls import path
 
 from .views.home import home
-from .views.smart_query import smart_query
+from .views.smart_query import smart_query, smart_query_stream
 from .views.generic_views import (
     CountyListView, CountyCreateView, CountyUpdateView,
     InfraListView, InfraCreateView, InfraUpdateView,
@@ -9,12 +9,13 @@ from .views.generic_views import (
     EconomyListView, EconomyCreateView, EconomyUpdateView,
     DemoListView, DemoCreateView, DemoUpdateView
 )
-from .views.sql_console import sql_console
+from .views.sql_console import sql_console, sql_download
 from .views.auth import user_login, user_logout, user_register
 from .views.user_profile import user_profile, change_role
 from .views.admin_views import user_management, change_user_role, toggle_admin, delete_user, set_user_table_permissions
 from .views.database_info import database_info
 from .views.ai_prompt import view_prompt, edit_prompt
+from .views.rollups import rollup_page, rollup_api
 
 
 urlpatterns = [
@@ -48,13 +49,19 @@ urlpatterns = [
 
     # SQL Console
     path("sql/", sql_console, name="sql_console"),
+    path("sql/download/", sql_download, name="sql_download"),
 
     # Smart Query（大模型）
     path("smart/", smart_query, name="smart_query"),
+    path("smart/stream/", smart_query_stream, name="smart_query_stream"),
     
     # Database Info
     path("database/", database_info, name="database_info"),
     
+    # 分省汇总（下钻页面 + JSON 接口）
+    path("rollup/", rollup_page, name="rollup"),
+    path("rollup/api/", rollup_api, name="rollup_api"),
+
     # AI Prompt
     path("prompt/", view_prompt, name="view_prompt"),
     path("prompt/edit/", edit_prompt, name="edit_prompt"),
@@ -3,9 +3,8 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User, Group
 from django.contrib import messages
 from django.db.models import Q
-from django.core import serializers
-import json
-from core.permissions import get_user_permissions, TABLE_DISPLAY_NAMES
+from django.db.models.functions import Lower
+from core.permissions import resolve_permission_matrix, TABLE_DISPLAY_NAMES
 from core.models import UserTablePermission
 
 def is_admin(user):
@@ -13,49 +12,84 @@ def is_admin(user):
     return user.is_authenticated and user.is_superuser
 
 
+USER_PAGE_SIZE = 50
+
+# 搜索上界：前缀 + 该字符，覆盖所有以前缀开头的字符串
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+def search_users(users, search_query):
+    """
+    按用户名或邮箱前缀搜索（不区分大小写）。
+    使用 lower(username) / lower(email) 上的表达式索引做范围查询，
+    代替 icontains 的全表扫描（索引见迁移 0007）。
+    """
+    prefix = search_query.strip().lower()
+    if not prefix:
+        return users
+    upper = prefix + PREFIX_UPPER_BOUND
+    return users.annotate(
+        username_lower=Lower('username'),
+        email_lower=Lower('email'),
+    ).filter(
+        Q(username_lower__gte=prefix, username_lower__lt=upper) |
+        Q(email_lower__gte=prefix, email_lower__lt=upper)
+    )
+
+
 @login_required
 @user_passes_test(is_admin, login_url="/login/")
 def user_management(request):
-    """用户管理页面 - 查看所有用户"""
+    """用户管理页面 - 分页查看所有用户（按 id 游标分页）"""
     # 搜索功能
     search_query = request.GET.get('search', '')
-    users = User.objects.all()
-    
-    if search_query:
-        users = users.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
-    
-    # 获取每个用户的权限信息
+    users = search_users(User.objects.all(), search_query)
+    total = users.count()
+
+    # 游标分页：?after=<id> 下一页，?before=<id> 上一页
+    after = request.GET.get('after', '')
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        page = list(users.filter(id__lt=int(before)).order_by('-id')
+                    .prefetch_related('groups', 'table_permissions')[:USER_PAGE_SIZE + 1])
+        has_more = len(page) > USER_PAGE_SIZE
+        page = page[:USER_PAGE_SIZE][::-1]
+        has_prev, has_next = has_more, True
+    else:
+        if after.isdigit():
+            users = users.filter(id__gt=int(after))
+        page = list(users.order_by('id')
+                    .prefetch_related('groups', 'table_permissions')[:USER_PAGE_SIZE + 1])
+        has_next = len(page) > USER_PAGE_SIZE
+        page = page[:USER_PAGE_SIZE]
+        has_prev = after.isdigit()
+
+    # 权限在内存中由预取的组和表权限计算，不再逐用户查询
     users_with_permissions = []
-    for user in users:
-        permissions = get_user_permissions(user)
-        # 将权限序列化为 JSON 字符串，方便在模板中使用
-        permissions_json = {}
-        for key, perm in permissions.items():
-            permissions_json[key] = {
-                'name': perm['name'],
-                'view': perm['view'],
-                'edit': perm['edit'],
-                'source': perm.get('source', 'role')
-            }
+    permissions_data = {}
+    for user in page:
+        matrix = resolve_permission_matrix(user)
+        permissions_data[user.id] = matrix['tables']
         users_with_permissions.append({
             'user': user,
-            'permissions': permissions,
-            'permissions_json': json.dumps(permissions_json),
+            'permissions': matrix['tables'],
             'groups': user.groups.all(),
         })
-    
+
     # 获取所有可用的组
     all_groups = Group.objects.all()
-    
+
     context = {
         'users_with_permissions': users_with_permissions,
+        'permissions_data': permissions_data,
         'all_groups': all_groups,
         'search_query': search_query,
+        'total': total,
+        'page_size': USER_PAGE_SIZE,
+        'prev_cursor': page[0].id if page and has_prev else None,
+        'next_cursor': page[-1].id if page and has_next else None,
     }
-    
+
     return render(request, "core/user_management.html", context)
 
 
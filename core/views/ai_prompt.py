@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from core.models import AIPromptConfig
 from core.ai_utils import get_full_prompt
+from core.ai_cache import answer_cache_stats
 
 def is_admin(user):
     """检查用户是否是管理员"""
@@ -39,6 +40,7 @@ def edit_prompt(request):
     
     context = {
         'prompt_config': prompt_config,
+        'answer_cache': answer_cache_stats(),
     }
     
     return render(request, "core/edit_prompt.html", context)
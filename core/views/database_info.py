@@ -3,11 +3,13 @@ from django.contrib.auth.decorators import login_required
 from django.db import connection
 from core.models import (
     County, InfrastructureService, AgricultureSales,
-    CountyEconomy, CountyDemographics
+    CountyEconomy, CountyDemographics, CountyYearPanel
 )
+from core.conditional import conditional_page
 from core.permissions import TABLE_DISPLAY_NAMES
 
 @login_required
+@conditional_page([])
 def database_info(request):
     """数据库详情页，显示每个表的真实表名和列名"""
     
@@ -18,6 +20,11 @@ def database_info(request):
         'agri': AgricultureSales,
         'economy': CountyEconomy,
         'demo': CountyDemographics,
+        'panel': CountyYearPanel,
+    }
+    # 派生表不参与表级权限，单独给出显示名
+    DERIVED_DISPLAY_NAMES = {
+        'panel': '县域年度面板（派生表，只读）',
     }
     
     tables_info = []
@@ -54,7 +61,7 @@ def database_info(request):
         
         tables_info.append({
             'key': table_key,
-            'display_name': TABLE_DISPLAY_NAMES.get(table_key, table_key),
+            'display_name': TABLE_DISPLAY_NAMES.get(table_key) or DERIVED_DISPLAY_NAMES.get(table_key, table_key),
             'table_name': table_name,
             'model_name': model.__name__,
             'fields': fields_info,
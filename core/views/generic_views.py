@@ -3,7 +3,8 @@ from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
 
-from django.db.models import Avg, Sum
+from django.db.models import Q
+from functools import partial
 
 from core.models import (
     County, InfrastructureService, AgricultureSales,
@@ -13,84 +14,164 @@ from core.forms import (
     CountyForm, InfraForm, AgriForm,
     EconomyForm, DemoForm
 )
+from core.conditional import ConditionalPageMixin, page_journal
 from core.permissions import has_table_edit_permission
+from core.stats import stats_for_model
 
 
 # ---------------------------
-# 统计函数：根据模型自动生成统计卡片
+# 表名映射（用于权限检查）
 # ---------------------------
+MODEL_TABLE_MAP = {
+    County: 'county',
+    InfrastructureService: 'infra',
+    AgricultureSales: 'agri',
+    CountyEconomy: 'economy',
+    CountyDemographics: 'demo',
+}
 
-def stats_for_model(model):
-    """根据不同模型生成统计卡片"""
 
-    if model == County:
-        return [
-            {"label": "县域数量", "value": model.objects.count()},
-            {"label": "省份数量", "value": model.objects.values("province").distinct().count()},
-        ]
+# ---------------------------
+# 游标（keyset）分页工具
+# ---------------------------
 
-    elif model == CountyEconomy:
-        qs = model.objects
-        return [
-            {"label": "平均 GDP（亿元）", "value": round(qs.aggregate(Avg("gdp_total"))["gdp_total__avg"] or 0, 2)},
-            {"label": "平均财政收入（亿元）", "value": round(qs.aggregate(Avg("fiscal_revenue"))["fiscal_revenue__avg"] or 0, 2)},
-            {"label": "平均人均收入（元）", "value": round(qs.aggregate(Avg("per_capita_income"))["per_capita_income__avg"] or 0, 2)},
-        ]
+def keyset_fields_for(model):
+    """列表排序/分页所用的键：事实表为 (county_id, year, pk)，County 为 (pk)"""
+    field_names = {field.name for field in model._meta.fields}
+    if {"county", "year"} <= field_names:
+        return ("county_id", "year", "pk")
+    return ("pk",)
 
-    elif model == InfrastructureService:
-        qs = model.objects
-        return [
-            {"label": "平均硬化路覆盖率", "value": round(qs.aggregate(Avg("pct_village_with_hard_road"))["pct_village_with_hard_road__avg"] or 0, 2)},
-            {"label": "平均宽带覆盖率", "value": round(qs.aggregate(Avg("broadband_coverage"))["broadband_coverage__avg"] or 0, 2)},
-        ]
 
-    elif model == CountyDemographics:
-        qs = model.objects
-        return [
-            {"label": "总人口数", "value": qs.aggregate(Sum("population_total"))["population_total__sum"] or 0},
-            {"label": "平均城镇化率", "value": round(qs.aggregate(Avg("urbanization_rate"))["urbanization_rate__avg"] or 0, 2)},
-        ]
+def encode_cursor(values):
+    """把一行的键值编码为 URL 参数，例如 12.2020.345"""
+    return ".".join(str(v) for v in values)
 
-    elif model == AgricultureSales:
-        qs = model.objects
-        return [
-            {"label": "总销售额（亿元）", "value": round(qs.aggregate(Sum("sales_value"))["sales_value__sum"] or 0, 2)},
-        ]
 
-    return []
+def decode_cursor(raw, size):
+    """解析 URL 中的游标，格式不对时返回 None（回到第一页）"""
+    if not raw:
+        return None
+    parts = raw.split(".")
+    if len(parts) != size:
+        return None
+    try:
+        return tuple(int(p) for p in parts)
+    except ValueError:
+        return None
 
 
-# ---------------------------
-# 表名映射（用于权限检查）
-# ---------------------------
-MODEL_TABLE_MAP = {
-    County: 'county',
-    InfrastructureService: 'infra',
-    AgricultureSales: 'agri',
-    CountyEconomy: 'economy',
-    CountyDemographics: 'demo',
-}
+def keyset_filter(fields, values, forward=True):
+    """构造 (a, b, c) > (x, y, z) 的展开条件；forward=False 时为 <"""
+    op = "gt" if forward else "lt"
+    condition = Q()
+    for i, field in enumerate(fields):
+        lookup = dict(zip(fields[:i], values[:i]))
+        lookup[f"{field}__{op}"] = values[i]
+        condition |= Q(**lookup)
+    return condition
 
 
 # ---------------------------
-# 通用列表视图（带统计 + 动态字段）
+# 通用列表视图（带统计 + 动态字段 + 游标分页）
 # ---------------------------
 
-class GenericListView(LoginRequiredMixin, ListView):
+class GenericListView(LoginRequiredMixin, ConditionalPageMixin, ListView):
     template_name = "core/generic_list.html"
     login_url = reverse_lazy("login")
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    page_size = 50
+
+    def page_tables(self):
+        """页面引用的表：本表，外键到 County 时还有 County（显示县名）"""
+        tables = [self.model]
+        if any(field.is_relation and field.related_model is County for field in self.model._meta.fields):
+            tables.append(County)
+        return tables
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        relations = [field.name for field in self.model._meta.fields if field.is_relation]
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset
+
+    def get_headers(self):
+        """自动表头：排除主键字段"""
         model = self.model
-
-        # 自动表头：排除主键字段
-        headers = [
+        return [
             field.name
             for field in model._meta.fields
             if field.name != model._meta.pk.name
         ]
 
+    def get_columns(self, headers):
+        """
+        把表头映射为 values_list 的取值列。
+        外键到 County 时取 name/city/province 三列，在 Python 里拼显示名，
+        这样一页只需一条 JOIN 查询，不会对每行再查一次 County。
+        """
+        columns = []
+        for name in headers:
+            field = self.model._meta.get_field(name)
+            if field.is_relation and field.related_model is County:
+                columns.append((f"{name}__name", f"{name}__city", f"{name}__province"))
+            elif field.is_relation:
+                columns.append((field.attname,))
+            else:
+                columns.append((name,))
+        return columns
+
+    def get_page(self, headers):
+        """按 keyset 取一页数据，返回 (rows, first_key, last_key, has_prev, has_next)"""
+        keys = keyset_fields_for(self.model)
+        columns = self.get_columns(headers)
+        lookups = [lookup for column in columns for lookup in column]
+
+        after = decode_cursor(self.request.GET.get("after"), len(keys))
+        before = decode_cursor(self.request.GET.get("before"), len(keys))
+        forward = before is None
+
+        queryset = self.get_queryset()
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(keys, after, forward=True))
+        elif before is not None:
+            queryset = queryset.filter(keyset_filter(keys, before, forward=False))
+
+        ordering = keys if forward else tuple(f"-{k}" for k in keys)
+        fetched = list(
+            queryset.order_by(*ordering).values_list(*keys, *lookups)[:self.page_size + 1]
+        )
+        has_more = len(fetched) > self.page_size
+        fetched = fetched[:self.page_size]
+        if not forward:
+            fetched.reverse()
+
+        rows = []
+        for record in fetched:
+            values = []
+            offset = len(keys)
+            for column in columns:
+                chunk = record[offset:offset + len(column)]
+                offset += len(column)
+                values.append(County.format_label(*chunk) if len(column) > 1 else chunk[0])
+            # pk 总在键的最后一位
+            rows.append((record[len(keys) - 1], values))
+
+        first_key = fetched[0][:len(keys)] if fetched else None
+        last_key = fetched[-1][:len(keys)] if fetched else None
+        if forward:
+            has_prev, has_next = after is not None, has_more
+        else:
+            has_prev, has_next = has_more, True
+        return rows, first_key, last_key, has_prev, has_next
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        model = self.model
+
+        headers = self.get_headers()
+        rows, first_key, last_key, has_prev, has_next = self.get_page(headers)
+
         # 获取表名用于权限检查
         table_name = MODEL_TABLE_MAP.get(model, '')
         can_edit = has_table_edit_permission(self.request.user, table_name)
@@ -98,7 +179,13 @@ class GenericListView(LoginRequiredMixin, ListView):
         context.update({
             "model_name": model.__name__,
             "headers": headers,
-            "stats": stats_for_model(model),
+            "rows": rows,
+            "page_size": self.page_size,
+            "prev_cursor": encode_cursor(first_key) if has_prev and first_key else "",
+            "next_cursor": encode_cursor(last_key) if has_next and last_key else "",
+            # 统计卡片在模板中按表版本号做片段缓存，片段命中时不会调用 stats_for_model
+            "stats": partial(stats_for_model, model),
+            "stats_version": page_journal(self.request, self.page_tables()).get(model._meta.db_table, (0,))[0],
             "can_edit": can_edit,
         })
         return context
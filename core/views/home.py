@@ -1,31 +1,23 @@
 from django.shortcuts import render
-from django.db import connection
-from django.db.models import Avg, Sum
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from core.models import (
-    County, InfrastructureService, AgricultureSales,
-    CountyEconomy, CountyDemographics
-)
 from core.permissions import can_execute_sql
-from core.ai_utils import ask_ai_sql
+from core.conditional import conditional_page, page_journal
+from core.stats import HOME_STATS_MODELS, home_stats
+from core.sql_utils import execute_sql, result_message
+from core.ai_utils import ask_ai_sql_cached
 
 
-def run_sql(query: str):
-    """执行 SQL 并返回表格格式结果"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            columns = [col[0] for col in cursor.description] if cursor.description else []
-            rows = cursor.fetchall()
-            rowcount = len(rows) if rows else cursor.rowcount
-        return {"columns": columns, "rows": rows, "error": None, "rowcount": rowcount}
-    except Exception as e:
-        return {"columns": ["error"], "rows": [[str(e)]], "error": str(e), "rowcount": 0}
-
+def run_sql(query: str, user=None):
+    """执行 SQL 并返回表格格式结果（行数受 SQL_RESULT_MAX_ROWS / SQL_RESULT_MAX_BYTES 限制，执行受 user 的角色预算限制）"""
+    result = execute_sql(query, user=user)
+    if result["error"]:
+        result.update({"columns": ["error"], "rows": [[result["error"]]]})
+    return result
 
 
 @login_required(login_url="/login/")
+@conditional_page(HOME_STATS_MODELS)
 def home(request):
     sql_query = ""
     ai_query = ""
@@ -46,15 +38,14 @@ def home(request):
                 messages.error(request, f"❌ 权限错误：{perm_error}")
                 result = {"columns": ["错误"], "rows": [[perm_error]], "error": perm_error}
             else:
-                result = run_sql(sql_query)
+                result = run_sql(sql_query, request.user)
                 if result.get("error"):
                     messages.error(request, f"❌ SQL 执行失败：{result['error']}")
                 else:
                     # 判断是查询还是修改操作
                     sql_upper = sql_query.strip().upper()
                     if any(keyword in sql_upper for keyword in ['SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN']):
-                        row_count = result.get("rowcount", len(result.get("rows", [])))
-                        messages.success(request, f"✅ SQL 查询执行成功！返回 {row_count} 行数据")
+                        messages.success(request, f"✅ SQL 查询执行成功！{result_message(result)}")
                     else:
                         row_count = result.get("rowcount", 0)
                         if row_count > 0:
@@ -71,8 +62,11 @@ def home(request):
             messages.warning(request, "查询内容不能为空")
         else:
             # 1. 让 AI 生成 SQL + 解释
-            ai_sql, explanation = ask_ai_sql(ai_query)
+            ai_sql, explanation, from_cache = ask_ai_sql_cached(ai_query)
             
+            if from_cache:
+                messages.info(request, "⚡ 命中 AI 答案缓存，未重新调用大模型")
+
             # 如果 SQL 为空，直接报错
             if not ai_sql:
                 error_msg = explanation or "AI 未能生成有效 SQL，请尝试换一种提问方式。"
@@ -86,13 +80,12 @@ def home(request):
                     result = {"columns": ["错误"], "rows": [[perm_error]], "error": perm_error}
                 else:
                     # 3. 执行 SQL
-                    result = run_sql(ai_sql)
+                    result = run_sql(ai_sql, request.user)
                     
                     if result.get("error"):
                         messages.error(request, f"❌ SQL 执行失败：{result['error']}")
                     else:
-                        row_count = result.get("rowcount", len(result.get("rows", [])))
-                        messages.success(request, f"✅ AI 查询执行成功！返回 {row_count} 行数据")
+                        messages.success(request, f"✅ AI 查询执行成功！{result_message(result)}")
                         if explanation:
                             messages.info(request, f"💡 AI说明：{explanation}")
 
@@ -108,25 +101,14 @@ def home(request):
     ]
 
     # --------------------------
-    # Dashboard 数据统计（使用 Django ORM 正确方式）
+    # Dashboard 数据统计（模板按表版本号缓存卡片片段，片段命中时不会调用 home_stats）
     # --------------------------
-    stats = [
-        {"label": "县域数量", 
-         "value": County.objects.count()},
-
-        {"label": "平均 GDP（亿元）", 
-         "value": round(CountyEconomy.objects.aggregate(avg=Avg("gdp_total"))["avg"] or 0, 2)},
-
-        {"label": "总人口数", 
-         "value": CountyDemographics.objects.aggregate(s=Sum("population_total"))["s"] or 0},
-
-        {"label": "平均宽带覆盖率（%）", 
-         "value": round(InfrastructureService.objects.aggregate(avg=Avg("broadband_coverage"))["avg"] or 0, 2)},
-    ]
+    stats_version = sorted((name, version) for name, (version, _) in page_journal(request, HOME_STATS_MODELS).items())
 
     return render(request, "core/home.html", {
         "quick_links": quick_links,
-        "stats": stats,
+        "stats": home_stats,
+        "stats_version": stats_version,
         "sql_query": sql_query,
         "ai_query": ai_query,
         "ai_sql": ai_sql,  # 传递AI生成的SQL
@@ -0,0 +1,79 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from core.conditional import conditional_page
+from core.models import RollupCell
+from core.rollups import ROLLUP_INDICATORS, ROLLUP_LEVELS, get_rollup
+
+
+def _rollup_params(params):
+    """解析 level / year / province / city 参数；返回 (参数字典, 错误信息)"""
+    level = params.get("level", "year")
+    if level not in ROLLUP_LEVELS:
+        return None, f"level 只能是 {' / '.join(ROLLUP_LEVELS)}"
+    year = params.get("year") or None
+    if year is not None:
+        try:
+            year = int(year)
+        except ValueError:
+            return None, "year 必须是整数"
+    return {
+        "level": level,
+        "year": year,
+        "province": params.get("province") or None,
+        "city": params.get("city") or None,
+    }, None
+
+
+@login_required(login_url="/login/")
+@conditional_page([RollupCell])
+def rollup_api(request):
+    """
+    汇总立方体 JSON 接口，例如 /rollup/api/?level=province&year=2019&indicator=gdp_total,population_total
+    indicator 不传时返回全部指标。
+    """
+    query, error = _rollup_params(request.GET)
+    indicators = [name for name in request.GET.get("indicator", "").split(",") if name]
+    unknown = [name for name in indicators if name not in ROLLUP_INDICATORS]
+    if error or unknown:
+        return JsonResponse({"error": error or f"未知的指标：{', '.join(unknown)}"}, status=400)
+    groups = get_rollup(indicators=indicators or None, **query)
+    return JsonResponse({**query, "groups": groups}, json_dumps_params={"ensure_ascii": False})
+
+
+@login_required(login_url="/login/")
+@conditional_page([RollupCell])
+def rollup_page(request):
+    """下钻页面：全国×年 -> 省×年 -> 省×市×年，每次只显示一个指标"""
+    query, error = _rollup_params(request.GET)
+    if error:
+        query = {"level": "year", "year": None, "province": None, "city": None}
+    indicator = request.GET.get("indicator")
+    if indicator not in ROLLUP_INDICATORS:
+        indicator = next(iter(ROLLUP_INDICATORS))
+
+    rows = []
+    for group in get_rollup(indicators=[indicator], **query):
+        values = group["indicators"].get(indicator)
+        if values:
+            rows.append({**group, **values})
+
+    # 面包屑：从全国逐级回到当前层级
+    breadcrumbs = [{"label": "全国", "level": "year"}]
+    if query["level"] in ("province", "city"):
+        breadcrumbs.append({"label": f"{query['year']} 年各省", "level": "province", "year": query["year"]})
+    if query["level"] == "city":
+        breadcrumbs.append({"label": f"{query['province']} 各地市", "level": "city",
+                            "year": query["year"], "province": query["province"]})
+
+    return render(request, "core/rollup.html", {
+        **query,
+        "error": error,
+        "indicator": indicator,
+        "indicator_label": ROLLUP_INDICATORS[indicator],
+        "indicators": ROLLUP_INDICATORS,
+        "next_level": ROLLUP_LEVELS[query["level"]][1],
+        "rows": rows,
+        "breadcrumbs": breadcrumbs,
+    })
@@ -1,22 +1,12 @@
+import json
+
 from django.shortcuts import render
-from django.db import connection
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from core.ai_utils import ask_ai_sql, get_full_prompt
-from core.permissions import can_execute_sql
-
-def execute_sql(query: str):
-    """执行 SQL 并返回结果"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            columns = [c[0] for c in cursor.description] if cursor.description else []
-            rows = cursor.fetchall()
-            rowcount = len(rows) if rows else cursor.rowcount
-        return {"columns": columns, "rows": rows, "error": None, "rowcount": rowcount}
-    except Exception as e:
-        return {"columns": [], "rows": [], "error": str(e), "rowcount": 0}
-
+from core.ai_utils import ask_ai_sql_cached, get_full_prompt, stream_ai_sql
+from core.permissions import can_execute_sql, has_edit_operation
+from core.sql_utils import execute_sql, iter_sql_batches, result_message
 
 @login_required(login_url="/login/")
 def smart_query(request):
@@ -25,6 +15,7 @@ def smart_query(request):
     result = None
     explanation = ""
     error = None
+    plan = None
 
     if request.method == "POST":
         ai_query = request.POST.get("ai_query", "")
@@ -33,7 +24,10 @@ def smart_query(request):
             messages.warning(request, "查询内容不能为空")
         else:
             # 1. 让 AI 生成 SQL + 解释
-            ai_sql, explanation = ask_ai_sql(ai_query)
+            ai_sql, explanation, from_cache = ask_ai_sql_cached(ai_query)
+
+            if from_cache:
+                messages.info(request, "⚡ 命中 AI 答案缓存，未重新调用大模型")
 
             # 如果 SQL 为空，直接报错
             if not ai_sql:
@@ -47,15 +41,15 @@ def smart_query(request):
                     messages.error(request, f"❌ 权限错误：{perm_error}")
                 else:
                     # 3. 执行 SQL
-                    sql_result = execute_sql(ai_sql)
+                    sql_result = execute_sql(ai_sql, user=request.user)
+                    plan = sql_result["plan"]
 
                     if sql_result["error"]:
                         error = sql_result["error"]
                         messages.error(request, f"❌ SQL 执行失败：{error}")
                     else:
                         result = sql_result
-                        row_count = len(result.get("rows", []))
-                        messages.success(request, f"✅ AI 查询执行成功！返回 {row_count} 行数据")
+                        messages.success(request, f"✅ AI 查询执行成功！{result_message(result)}")
 
     # 获取prompt信息（用于显示）
     prompt_info = None
@@ -69,4 +63,75 @@ def smart_query(request):
         "explanation": explanation,
         "error": error,
         "prompt_info": prompt_info,
+        "plan": plan,
     })
+
+
+# ---------------------------
+# 流式智能查询（Server-Sent Events）
+# ---------------------------
+
+def _sse(event, data):
+    """编码一条 SSE 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _execute_events(user, sql):
+    """检查权限并执行 SQL，把结果逐批编码为 SSE 消息"""
+    # 流式接口是 GET 请求、没有 CSRF 保护，只执行只读语句；修改数据必须走 POST 表单
+    if has_edit_operation(sql):
+        yield _sse("requires_post", {"message": "该查询会修改数据，流式查询只执行只读语句，请通过表单提交执行。"})
+        return
+    can_execute, perm_error = can_execute_sql(user, sql)
+    if not can_execute:
+        yield _sse("sql_error", {"message": f"权限错误：{perm_error}"})
+        return
+    try:
+        for kind, data in iter_sql_batches(sql, user=user):
+            if kind == "rows":
+                data = [list(row) for row in data]
+            elif kind == "plan":
+                data = {key: data[key] for key in ("steps", "findings", "cost", "budget")}
+            yield _sse(kind, {"value": data})
+    except Exception as e:
+        yield _sse("sql_error", {"message": f"SQL 执行失败：{e}"})
+
+
+def _smart_query_events(user, question):
+    # 先发一条消息，让浏览器立刻收到首字节
+    yield _sse("start", {"question": question})
+    for event, data in stream_ai_sql(question):
+        if event == "sql":
+            yield _sse("sql", {"sql": data})
+            if data:
+                # SQL 段一完整就开始执行，此时模型还在继续生成 Explanation
+                yield from _execute_events(user, data)
+            else:
+                yield _sse("sql_error", {"message": "AI 未能生成有效 SQL，请尝试换一种提问方式。"})
+        elif event == "token":
+            yield _sse("token", {"text": data})
+        elif event == "explanation":
+            yield _sse("explanation", {"text": data})
+        elif event == "cached":
+            yield _sse("cached", {})
+        elif event == "error":
+            # 不能叫 error：会与 EventSource 自身的连接错误事件混在一起
+            yield _sse("query_error", {"message": data})
+    yield _sse("done", {})
+
+
+@login_required(login_url="/login/")
+def smart_query_stream(request):
+    """
+    流式智能查询：边生成边推送模型输出，SQL 完整后立即执行并推送结果行。
+    这是 GET 接口（EventSource 只能发 GET），因此只执行只读语句，写语句要求改用 POST 表单。
+    """
+    question = request.GET.get("q", "")
+    if not question.strip():
+        return HttpResponseBadRequest("查询内容不能为空")
+
+    response = StreamingHttpResponse(_smart_query_events(request.user, question),
+                                     content_type="text/event-stream; charset=utf-8")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # 禁止 nginx 缓冲
+    return response
@@ -1,43 +1,17 @@
 from django.shortcuts import render
-from django.db import connection
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-from core.permissions import can_execute_sql
+from core.permissions import can_execute_sql, has_edit_operation
+from core.sql_utils import QueryTooExpensive, execute_sql, stream_sql_csv, result_message
 
-def execute_sql(query: str):
-    """
-    执行 SQL，返回：
-    - columns: 列名
-    - rows: 行数据
-    - error: 错误信息（如有）
-    - rowcount: 受影响的行数（对于UPDATE/INSERT/DELETE）
-    """
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-
-            # 有查询结果
-            if cursor.description:
-                columns = [c[0] for c in cursor.description]
-                rows = cursor.fetchall()
-                return {
-                    "columns": columns, 
-                    "rows": rows, 
-                    "error": None,
-                    "rowcount": len(rows)
-                }
-
-            # 无查询结果（如 UPDATE, INSERT, DELETE）
-            rowcount = cursor.rowcount
-            return {
-                "columns": ["Result"], 
-                "rows": [["SQL 执行成功"]], 
-                "error": None,
-                "rowcount": rowcount
-            }
-
-    except Exception as e:
-        return {"columns": [], "rows": [], "error": str(e), "rowcount": 0}
+def run_console_sql(query: str, user=None):
+    """执行 SQL；写操作没有结果集时显示一行“SQL 执行成功”"""
+    result = execute_sql(query, user=user)
+    if not result["error"] and not result["columns"]:
+        result.update({"columns": ["Result"], "rows": [["SQL 执行成功"]]})
+    return result
 
 
 @login_required(login_url="/login/")
@@ -45,6 +19,7 @@ def sql_console(request):
     sql_query = ""
     result = None
     error = None
+    plan = None
 
     if request.method == "POST":
         sql_query = request.POST.get("sql_query", "")
@@ -58,8 +33,9 @@ def sql_console(request):
                 messages.error(request, f"❌ 权限错误：{perm_error}")
                 error = perm_error
             else:
-                result = execute_sql(sql_query)
+                result = run_console_sql(sql_query, request.user)
                 error = result["error"]
+                plan = result["plan"]
                 
                 if error:
                     messages.error(request, f"❌ SQL 执行失败：{error}")
@@ -67,8 +43,7 @@ def sql_console(request):
                     # 判断是查询还是修改操作
                     sql_upper = sql_query.strip().upper()
                     if any(keyword in sql_upper for keyword in ['SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN']):
-                        row_count = result.get("rowcount", len(result.get("rows", [])))
-                        messages.success(request, f"✅ SQL 查询执行成功！返回 {row_count} 行数据")
+                        messages.success(request, f"✅ SQL 查询执行成功！{result_message(result)}")
                     else:
                         row_count = result.get("rowcount", 0)
                         if row_count > 0:
@@ -80,4 +55,31 @@ def sql_console(request):
         "sql_query": sql_query,
         "result": result if result and not result["error"] else None,
         "error": error,
+        "plan": plan,
     })
+
+
+@login_required(login_url="/login/")
+@require_POST
+def sql_download(request):
+    """以 CSV 流的形式下载查询的完整结果（不受页面行数上限限制）"""
+    sql_query = request.POST.get("sql_query", "")
+    if not sql_query.strip():
+        return HttpResponseBadRequest("SQL 查询不能为空")
+    if has_edit_operation(sql_query):
+        return HttpResponseBadRequest("只有查询语句（SELECT）可以下载结果")
+
+    can_execute, perm_error = can_execute_sql(request.user, sql_query)
+    if not can_execute:
+        return HttpResponseForbidden(perm_error)
+
+    try:
+        rows = stream_sql_csv(sql_query, user=request.user)
+    except QueryTooExpensive as e:
+        return HttpResponseBadRequest(f"{e}，请添加过滤条件后再下载")
+    except Exception as e:
+        return HttpResponseBadRequest(f"SQL 执行失败：{e}")
+
+    response = StreamingHttpResponse(rows, content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = 'attachment; filename="query_result.csv"'
+    return response
@@ -23,6 +23,18 @@ AI_API_BASE = os.getenv("AI_API_BASE", None)
 # AI模型名称/Endpoint（可选，如果不设置则使用默认值）
 AI_MODEL = os.getenv("AI_MODEL", None)
 
+# AI 请求超时（秒）、重试次数和连接池（客户端进程内复用，保持 keep-alive）
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "10"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+AI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+AI_KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_EXPIRY", "60"))
+
+# AI 答案缓存：有效期（秒）和最大条目数
+AI_ANSWER_CACHE_TTL = int(os.getenv("AI_ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+AI_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("AI_ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
 # 向后兼容
 DOUBAO_API_KEY = AI_API_KEY
 
@@ -103,9 +115,91 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / "db.sqlite3",
+        'CONN_MAX_AGE': 600,          # 连接复用（秒），不再每个请求新建连接
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+# 只读别名：首页 / SQL 控制台 / 智能查询中的只读 SQL 在这里执行（见 core/db_router.py）
+# 以 mode=ro 打开同一个数据库文件，写语句会被 SQLite 直接拒绝
+DATABASES['readonly'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'TEST': {'MIRROR': 'default'},
+}
+READONLY_DB_ALIAS = 'readonly'
+DATABASE_ROUTERS = ['core.db_router.ReadOnlyRouter']
+
+# 每个新连接建立时设置的 SQLite PRAGMA（见 core/sqlite_tuning.py）
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,              # 遇到写锁时最多等待的毫秒数
+    "journal_mode": "WAL",             # 写入不阻塞读取
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,    # 内存映射 256 MB
+    "cache_size": -64 * 1024,          # 页缓存 64 MB（负数单位为 KiB）
+    "temp_store": "MEMORY",
+}
+
+# 按别名覆盖的 PRAGMA：只读连接不能切换 journal_mode，另外禁止写入并使用更大的缓存和 mmap
+SQLITE_ALIAS_PRAGMAS = {
+    "readonly": {
+        "busy_timeout": 5000,
+        "query_only": 1,
+        "mmap_size": 1024 * 1024 * 1024,   # 内存映射 1 GB
+        "cache_size": -256 * 1024,         # 页缓存 256 MB
+        "temp_store": "MEMORY",
+    },
+}
+
+
+# ===============================
+# 缓存
+# ===============================
+# 统计卡片、查询结果、权限矩阵、Prompt 配置等缓存的键都包含数据库变更日志中的表版本号（见 core.table_versions），
+# 版本号存放在数据库中，各进程看到的是同一份，因此进程内的 LocMem 也不会读到过期数据，只是每个进程各自预热；
+# 换成共享后端（如 Redis、FileBasedCache）可以在进程间共享已计算的结果。AI 答案缓存的命中计数在 LocMem 下按进程统计。
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'poverty832',
     }
 }
 
+# 统计卡片缓存有效期（秒），None 表示不过期，只在数据变更时失效
+STATS_CACHE_TIMEOUT = None
+
+# 页面 ETag 中的代码版本（见 core/conditional.py）：部署时设置环境变量 APP_RELEASE（如提交号），
+# 发布新版本后旧 ETag 全部失效。未设置时每个进程启动后随机生成，多进程部署下各进程的 ETag 不同，只是 304 命中率降低
+PAGE_ETAG_SALT = os.getenv("APP_RELEASE", "")
+
+
+# ===============================
+# 用户 SQL 结果集上限（首页 / SQL 控制台 / 智能查询）
+# ===============================
+SQL_RESULT_MAX_ROWS = 1000              # 页面最多显示的行数
+SQL_RESULT_MAX_BYTES = 2 * 1024 * 1024  # 页面结果的大致字节上限
+SQL_FETCH_BATCH_SIZE = 500              # fetchmany 每批读取的行数
+
+# 执行前代价检查（EXPLAIN QUERY PLAN 估算的行访问数）
+SQL_COST_BUDGET = 5_000_000             # 超过该代价的语句不按原样执行
+SQL_COST_ACTION = "preview"             # "preview" 降级为预览，"reject" 直接拒绝
+SQL_PREVIEW_ROWS = 100                  # 预览最多返回的行数
+SQL_PREVIEW_MAX_STEPS = 20_000_000      # 预览最多执行的 SQLite 虚拟机指令数
+
+# 用户 SQL 的执行预算（按角色）：墙钟秒数 + SQLite 虚拟机指令数，超出即中断并记录
+SQL_EXECUTION_BUDGETS = {
+    "superuser": {"seconds": 60, "steps": 2_000_000_000},
+    "data_entry": {"seconds": 20, "steps": 500_000_000},
+    "analyst": {"seconds": 10, "steps": 200_000_000},
+    "default": {"seconds": 5, "steps": 100_000_000},
+}
+
+# 只读 SQL 查询结果缓存（进程内 LRU）
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
 
 # ===============================
 # 密码校验（默认即可）